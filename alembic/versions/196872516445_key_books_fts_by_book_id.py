@@ -0,0 +1,31 @@
+"""key books_fts full-text table by book_id
+
+Revision ID: 196872516445
+Revises: f942b10b6471
+Create Date: 2026-10-18 21:32:16.804127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '196872516445'
+down_revision = 'f942b10b6471'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # the implicit rowid of books is not stable, VACUUM may renumber it and leave books_fts pointing at other books
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP TABLE books_fts")
+        op.execute("CREATE VIRTUAL TABLE books_fts USING fts5(book_id UNINDEXED, title, author, tokenize='porter unicode61')")
+        op.execute("INSERT INTO books_fts (book_id, title, author) SELECT book_id, title, author FROM books")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP TABLE books_fts")
+        op.execute("CREATE VIRTUAL TABLE books_fts USING fts5(title, author, tokenize='porter unicode61')")
+        op.execute("INSERT INTO books_fts (rowid, title, author) SELECT rowid, title, author FROM books")
@@ -0,0 +1,44 @@
+"""create book_rating_stats table
+
+Revision ID: 5b7e2c9d41fa
+Revises: 2cb93d1d7ed6
+Create Date: 2026-10-18 10:12:31.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e2c9d41fa'
+down_revision = '2cb93d1d7ed6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create book_rating_stats table
+    op.create_table(
+        'book_rating_stats',
+        sa.Column('book_id', sa.String(50), sa.ForeignKey('books.book_id', ondelete='CASCADE')),
+        sa.Column('rating_count', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('rating_sum', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('rating_min', sa.Integer),
+        sa.Column('rating_max', sa.Integer),
+        *[sa.Column('stars_{}'.format(star), sa.Integer, nullable=False, server_default='0') for star in range(0, 6)],
+        sa.Column('updated_at', sa.DateTime()),
+        sa.PrimaryKeyConstraint("book_id")
+    )
+
+    # backfill the stats of existing ratings
+    op.execute(
+        "INSERT INTO book_rating_stats (book_id, rating_count, rating_sum, rating_min, rating_max, {}, updated_at) "
+        "SELECT book_id, COUNT(*), SUM(rating), MIN(rating), MAX(rating), {}, CURRENT_TIMESTAMP "
+        "FROM book_ratings GROUP BY book_id".format(
+            ", ".join("stars_{}".format(star) for star in range(0, 6)),
+            ", ".join("SUM(CASE WHEN rating = {} THEN 1 ELSE 0 END)".format(star) for star in range(0, 6)),
+        )
+    )
+
+def downgrade() -> None:
+    op.drop_table('book_rating_stats')
@@ -0,0 +1,30 @@
+"""add trigram indexes on title and author to books table
+
+Revision ID: 6f0b2d8e4a17
+Revises: d41e7b3a9c05
+Create Date: 2026-10-18 18:47:30.114926
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f0b2d8e4a17'
+down_revision = 'd41e7b3a9c05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # serve the ILIKE '%prefix%' of GET /v1/books/suggest, SQLite suggests from the books_fts table instead
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX ix_books_title_trgm ON books USING GIN (title gin_trgm_ops)")
+        op.execute("CREATE INDEX ix_books_author_trgm ON books USING GIN (author gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX ix_books_author_trgm")
+        op.execute("DROP INDEX ix_books_title_trgm")
@@ -0,0 +1,25 @@
+"""add status, created_at index to reading_lists table
+
+Revision ID: 9c3f1a7e52b8
+Revises: 5b7e2c9d41fa
+Create Date: 2026-10-18 14:05:47.318265
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3f1a7e52b8'
+down_revision = '5b7e2c9d41fa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # status is the leading column, so status only lookups and GROUP BY status use it too
+    op.create_index('ix_reading_lists_status_created_at', 'reading_lists', ['status', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_reading_lists_status_created_at', table_name='reading_lists')
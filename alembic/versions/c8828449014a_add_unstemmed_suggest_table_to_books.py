@@ -0,0 +1,28 @@
+"""add unstemmed full-text table for suggestions to books
+
+Revision ID: c8828449014a
+Revises: 196872516445
+Create Date: 2026-10-18 21:58:40.519362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8828449014a'
+down_revision = '196872516445'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # the prefixes typed in GET /v1/books/suggest are matched against whole words, books_fts only has their stems
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("CREATE VIRTUAL TABLE books_suggest_fts USING fts5(book_id UNINDEXED, title, author, tokenize='unicode61', prefix='2 3')")
+        op.execute("INSERT INTO books_suggest_fts (book_id, title, author) SELECT book_id, title, author FROM books")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP TABLE books_suggest_fts")
@@ -0,0 +1,38 @@
+"""add full-text search index to books table
+
+Revision ID: d41e7b3a9c05
+Revises: 9c3f1a7e52b8
+Create Date: 2026-10-18 16:22:09.581734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41e7b3a9c05'
+down_revision = '9c3f1a7e52b8'
+branch_labels = None
+depends_on = None
+
+# same document as SEARCH_VECTOR in src/models/books.py, title matches rank above author matches
+SEARCH_VECTOR = "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', author), 'B')"
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        # kept up to date by the Book model, not mapped so it stays out of the API responses
+        op.execute("ALTER TABLE books ADD COLUMN search_vector tsvector")
+        op.execute("UPDATE books SET search_vector = {}".format(SEARCH_VECTOR))
+        op.execute("CREATE INDEX ix_books_search_vector ON books USING GIN (search_vector)")
+    else:
+        op.execute("CREATE VIRTUAL TABLE books_fts USING fts5(title, author, tokenize='porter unicode61')")
+        op.execute("INSERT INTO books_fts (rowid, title, author) SELECT rowid, title, author FROM books")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX ix_books_search_vector")
+        op.execute("ALTER TABLE books DROP COLUMN search_vector")
+    else:
+        op.execute("DROP TABLE books_fts")
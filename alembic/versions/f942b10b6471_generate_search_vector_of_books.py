@@ -0,0 +1,37 @@
+"""generate search_vector of books table from title and author
+
+Revision ID: f942b10b6471
+Revises: 6f0b2d8e4a17
+Create Date: 2026-10-18 21:05:43.270518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f942b10b6471'
+down_revision = '6f0b2d8e4a17'
+branch_labels = None
+depends_on = None
+
+# same document as SEARCH_VECTOR in src/models/books.py, title matches rank above author matches
+SEARCH_VECTOR = "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', author), 'B')"
+
+
+def upgrade() -> None:
+    # computed in the INSERT or UPDATE that writes the row instead of a second UPDATE of the same rows
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX ix_books_search_vector")
+        op.execute("ALTER TABLE books DROP COLUMN search_vector")
+        op.execute("ALTER TABLE books ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({}) STORED".format(SEARCH_VECTOR))
+        op.execute("CREATE INDEX ix_books_search_vector ON books USING GIN (search_vector)")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX ix_books_search_vector")
+        op.execute("ALTER TABLE books DROP COLUMN search_vector")
+        op.execute("ALTER TABLE books ADD COLUMN search_vector tsvector")
+        op.execute("UPDATE books SET search_vector = {}".format(SEARCH_VECTOR))
+        op.execute("CREATE INDEX ix_books_search_vector ON books USING GIN (search_vector)")
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+
+"""
+ASGI entry point, the /v1 routes of src/app.py with their database calls made through asyncpg
+
+  uvicorn asgi:application --host 0.0.0.0 --port 8000
+  ./asgi.py
+"""
+
+import os
+
+from src.app import app, db
+from src.config import config
+from src.libs.asgi_bridge import asgiBridge
+from src.libs.pool_stats import timedAsyncQueuePool
+from src.models.books import suggest_index
+
+# times checkouts for /v1/_internal/pool, like the pool of the sync engine
+engine_options = {**config.SQLALCHEMY_ENGINE_OPTIONS, "poolclass": timedAsyncQueuePool} if config.SQLALCHEMY_ENGINE_OPTIONS else {}
+# the in-process suggest index reads every book, loaded before the first request rather than by one on the event loop
+on_startup = [suggest_index.ensure_loaded] if config.SUGGEST_BACKEND == "memory" else []
+
+application = asgiBridge(app, db, config.ASYNC_DB_URI, engine_options, config.ASGI_MAX_BODY_SIZE, on_startup)
+
+if __name__ == "__main__":
+  import uvicorn
+  from alembic.config import Config
+  from alembic import command
+
+  if app.config['APP_ENVIRONMENT'] != "test":
+    # Run alembic migrations before starting the server
+    command.upgrade(Config("alembic.ini"), "head")
+
+  uvicorn.run(application, host=os.getenv("HOST", "127.0.0.1"), port=int(os.getenv("PORT", 8000)))
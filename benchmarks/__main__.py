@@ -0,0 +1,66 @@
+"""
+Run the benchmarks and save or compare their results
+
+  python -m benchmarks --output baseline.json
+  python -m benchmarks --compare baseline.json --output current.json
+  python -m benchmarks --db postgres --filter endpoint.
+
+--db postgres uses the RDS_* environment variables of src/config/config.py, point RDS_DB_NAME
+at a scratch database: the tables are created when missing and the seeded rows removed at the end.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+def main():
+  parser = argparse.ArgumentParser(description="Hot path benchmarks")
+  parser.add_argument("--db", choices=["sqlite", "postgres"], default="sqlite")
+  parser.add_argument("--filter", action="append", help="only run benchmarks whose name contains this, repeatable")
+  parser.add_argument("--rows", type=int, default=1000, help="books seeded for the endpoint benchmarks")
+  parser.add_argument("--repeat", type=int, default=5)
+  parser.add_argument("--min-time", type=float, default=0.2, help="min seconds per repeat")
+  parser.add_argument("--output", help="write the results as JSON to this file")
+  parser.add_argument("--compare", help="results file to compare with")
+  parser.add_argument("--threshold", type=float, default=0.1, help="slowdown reported as a regression, 0.1 for 10%%")
+  args = parser.parse_args()
+
+  # the app picks its database and log level up when it is imported, run with LOG_LEVEL=INFO
+  # to include the cost of logging
+  os.environ["APP_ENVIRONMENT"] = "test" if args.db == "sqlite" else "benchmark"
+  os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+  from src.app import app, db
+  from benchmarks import bench_core, bench_endpoints
+  from benchmarks.harness import BENCHMARKS, run, metadata, save, compare
+
+  selected = [name for name in BENCHMARKS if not args.filter or any(part in name for part in args.filter)]
+
+  with app.app_context():
+    db.create_all()
+    context = {}
+    if [name for name in selected if name.startswith("endpoint.")]:
+      context = bench_endpoints.setup(args.rows)
+
+    try:
+      results = run(context, args.filter, args.repeat, args.min_time)
+    finally:
+      if context:
+        db.session.rollback()
+        bench_endpoints.teardown(context)
+
+  if args.output:
+    save(args.output, metadata(args.db), results)
+
+  if args.compare:
+    with open(args.compare) as baseline:
+      regressions = compare(json.load(baseline), results, args.threshold)
+    if regressions:
+      print("\n{} benchmarks regressed by more than {:.0%}".format(len(regressions), args.threshold))
+      return 1
+
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
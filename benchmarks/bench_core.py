@@ -0,0 +1,66 @@
+"""
+Benchmarks of the helpers every request goes through
+"""
+
+from datetime import datetime
+
+from benchmarks.harness import benchmark
+from src.helpers import responsify, err_dict, list_diff
+from src.libs.validation_manager import validationManager
+from src.models.books import Book
+from src.models.reading_lists import ReadingList
+
+def _books(count):
+  return [
+    Book(book_id="{:032x}".format(index), ISBN="978{:010d}".format(index), title="Book {}".format(index), author="Author {}".format(index), created_at=datetime(2023, 7, 15, 20, 57, 55))
+    for index in range(count)
+  ]
+
+@benchmark("to_dict.book")
+def to_dict_book(context):
+  book = _books(1)[0]
+  return lambda: book.to_dict()
+
+@benchmark("to_dict.book_fields")
+def to_dict_book_fields(context):
+  book = _books(1)[0]
+  return lambda: book.to_dict(fields=["book_id", "title"])
+
+@benchmark("to_dicts.books_100")
+def to_dicts_books(context):
+  books = _books(100)
+  return lambda: Book.to_dicts(books)
+
+@benchmark("validate.book")
+def validate_book(context):
+  data = {"ISBN": " 9783161484100 ", "title": "Some Title", "author": "Some Author"}
+  return lambda: Book._validator_.validate(data, Book._restrict_in_creation_)
+
+@benchmark("validate.book_invalid")
+def validate_book_invalid(context):
+  data = {"ISBN": "97831614", "title": "", "author": 12}
+  return lambda: Book._validator_.validate(data, Book._restrict_in_creation_)
+
+@benchmark("validate.reading_list_uncompiled")
+def validate_reading_list(context):
+  data = {"book_id": "a" * 32, "status": "unread"}
+  return lambda: validationManager.validate(data, ReadingList._validations_)
+
+@benchmark("validate_many.books_100")
+def validate_many_books(context):
+  rows = [{"ISBN": "978{:010d}".format(index), "title": "Book {}".format(index), "author": "Author"} for index in range(100)]
+  return lambda: Book._validator_.validate_many(rows, Book._restrict_in_creation_)
+
+@benchmark("responsify.books_page")
+def responsify_books_page(context):
+  payload = {"books": Book.to_dicts(_books(20)), "book_count": 1000, "page_number": 1, "page_offset": 20}
+  return lambda: responsify(payload, {}, 200)
+
+@benchmark("err_dict")
+def err_dict_message(context):
+  return lambda: err_dict({"orderby": "should be 1 for ascending or -1 for descending"}, "TAG_ERROR")
+
+@benchmark("list_diff.columns")
+def list_diff_columns(context):
+  columns = Book.columns_list()
+  return lambda: list_diff(columns, Book._restrict_in_creation_)
@@ -0,0 +1,163 @@
+"""
+Benchmarks of full request round trips through the Flask test client, against seeded tables
+"""
+
+import itertools
+import json
+import random
+import uuid
+
+from benchmarks.harness import benchmark
+from src.app import app, db
+from src.models.books import Book, book_cache
+from src.models.reading_lists import ReadingList
+from src.models.book_ratings import BookRating
+
+def setup(rows=1000):
+  """
+  Seed books, reading lists for half of them and ratings for a fifth, tagged with a run prefix
+  so they can be removed afterwards from a shared database
+
+  :param rows: [int] number of books
+
+  :return [dict] context of the endpoint benchmarks
+  """
+  prefix = random.randint(100, 999)
+  books = [{"ISBN": "979{}{:07d}".format(prefix, index), "title": "Benchmark Book {}".format(index), "author": "Author {}".format(index % 97)} for index in range(rows)]
+  book_ids = [result["book_id"] for result in Book.create_books(books)["results"] if "book_id" in result]
+
+  reading_lists = [ReadingList(book_id=book_id, status=["unread", "in_progress", "finished"][index % 3]) for index, book_id in enumerate(book_ids[:rows // 2])]
+  db.session.add_all(reading_lists)
+  db.session.commit()
+
+  for index, reading_list in enumerate(reading_lists[:rows // 5]):
+    BookRating.create_a_rating({"book_id": reading_list.book_id, "list_id": reading_list.list_id, "rating": index % 6, "notes": "Benchmark notes"})
+
+  return {
+    "client": app.test_client(),
+    "prefix": prefix,
+    "book_ids": book_ids,
+    "isbns": [book["ISBN"] for book in books],
+    "list_ids": [reading_list.list_id for reading_list in reading_lists],
+    "rated_book_ids": [reading_list.book_id for reading_list in reading_lists[:rows // 5]],
+    "rating_id": BookRating.query.filter(BookRating.book_id.in_(book_ids[:1])).first().rating_id,
+  }
+
+def teardown(context):
+  book_ids = Book.query.with_entities(Book.book_id).filter(Book.ISBN.like("979{}%".format(context["prefix"]))).all()
+  book_ids = [book_id for book_id, in book_ids]
+  for start in range(0, len(book_ids), 500):
+    chunk = book_ids[start:start + 500]
+    BookRating.query.filter(BookRating.book_id.in_(chunk)).delete(synchronize_session=False)
+    ReadingList.query.filter(ReadingList.book_id.in_(chunk)).delete(synchronize_session=False)
+    Book.query.filter(Book.book_id.in_(chunk)).delete(synchronize_session=False)
+  db.session.commit()
+
+def _get(context, url, status=200, headers=None):
+  client = context["client"]
+  response = client.get(url, headers=headers)
+  if response.status_code != status:
+    raise AssertionError("GET {} answered {}: {}".format(url, response.status_code, response.data[:200]))
+  return lambda: client.get(url, headers=headers)
+
+def _cycle(values):
+  return itertools.cycle(values).__next__
+
+@benchmark("endpoint.get_books_page")
+def get_books_page(context):
+  return _get(context, "/v1/books?page_number=3&page_offset=20")
+
+@benchmark("endpoint.get_books_cursor_without_count")
+def get_books_cursor(context):
+  return _get(context, "/v1/books?cursor=&page_offset=20&with_count=false")
+
+@benchmark("endpoint.get_books_fields")
+def get_books_fields(context):
+  return _get(context, "/v1/books?page_offset=20&fields=book_id,title")
+
+@benchmark("endpoint.get_books_by_ids_50")
+def get_books_by_ids(context):
+  return _get(context, "/v1/books?ids=" + ",".join(context["book_ids"][:50]))
+
+@benchmark("endpoint.get_book")
+def get_book(context):
+  client = context["client"]
+  next_id = _cycle(context["book_ids"][:100])
+  _get(context, "/v1/books/" + context["book_ids"][0])
+  return lambda: client.get("/v1/books/" + next_id())
+
+@benchmark("endpoint.get_book_uncached")
+def get_book_uncached(context):
+  client = context["client"]
+  next_id = _cycle(context["book_ids"][:100])
+
+  def request():
+    book_cache.clear()
+    return client.get("/v1/books/" + next_id())
+  return request
+
+@benchmark("endpoint.get_book_not_modified")
+def get_book_not_modified(context):
+  url = "/v1/books/" + context["book_ids"][0]
+  etag = context["client"].get(url).headers["ETag"]
+  return _get(context, url, 304, {"If-None-Match": etag})
+
+@benchmark("endpoint.get_book_not_found")
+def get_book_not_found(context):
+  return _get(context, "/v1/books/" + uuid.uuid4().hex, 404)
+
+@benchmark("endpoint.get_book_by_isbn")
+def get_book_by_isbn(context):
+  return _get(context, "/v1/books/isbn/" + context["isbns"][1])
+
+@benchmark("endpoint.post_books_isbn_batch_50")
+def post_books_isbn_batch(context):
+  client = context["client"]
+  body = json.dumps({"isbns": context["isbns"][:50]})
+  return lambda: client.post("/v1/books/isbn/batch", data=body, content_type="application/json")
+
+@benchmark("endpoint.post_book")
+def post_book(context):
+  client = context["client"]
+  counter = itertools.count()
+  isbn = "979{}9{{:06d}}".format(context["prefix"])
+  return lambda: client.post("/v1/books", data=json.dumps({"ISBN": isbn.format(next(counter)), "title": "Posted Book", "author": "Some Author"}), content_type="application/json")
+
+@benchmark("endpoint.patch_book")
+def patch_book(context):
+  client = context["client"]
+  url = "/v1/books/" + context["book_ids"][-1]
+  title = _cycle(["Patched Title A", "Patched Title B"])
+  return lambda: client.patch(url, data=json.dumps({"title": title()}), content_type="application/json")
+
+@benchmark("endpoint.get_reading_lists")
+def get_reading_lists(context):
+  return _get(context, "/v1/reading_lists?page_offset=20")
+
+@benchmark("endpoint.get_reading_lists_by_status")
+def get_reading_lists_by_status(context):
+  return _get(context, "/v1/reading_lists?status=in_progress&page_offset=20")
+
+@benchmark("endpoint.get_reading_lists_include")
+def get_reading_lists_include(context):
+  return _get(context, "/v1/reading_lists?page_offset=20&include=book,rating")
+
+@benchmark("endpoint.get_reading_list")
+def get_reading_list(context):
+  return _get(context, "/v1/reading_lists/" + context["list_ids"][0])
+
+@benchmark("endpoint.get_reading_lists_summary")
+def get_reading_lists_summary(context):
+  return _get(context, "/v1/reading_lists/summary")
+
+@benchmark("endpoint.get_ratings")
+def get_ratings(context):
+  return _get(context, "/v1/ratings?page_offset=20")
+
+@benchmark("endpoint.get_rating")
+def get_rating(context):
+  return _get(context, "/v1/ratings/" + context["rating_id"])
+
+@benchmark("endpoint.get_book_stats")
+def get_book_stats(context):
+  return _get(context, "/v1/books/{}/stats".format(context["rated_book_ids"][0]))
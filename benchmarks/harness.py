@@ -0,0 +1,116 @@
+"""
+Benchmark registry, timing, JSON results and baseline comparison
+"""
+
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import timeit
+
+BENCHMARKS = {}
+
+def benchmark(name):
+  """
+  Register a benchmark. The decorated function receives the context built by the suite's
+  setup and returns the zero-argument callable to time.
+
+  :param name: [str] unique name, e.g. "to_dict.book"
+  """
+  def register(build):
+    if name in BENCHMARKS:
+      raise ValueError("Benchmark {} is registered twice".format(name))
+    BENCHMARKS[name] = build
+    return build
+
+  return register
+
+def measure(fn, repeat=5, min_time=0.2):
+  """
+  Time a callable: the loop count is calibrated so one repeat runs at least min_time seconds
+
+  :return [dict] per call timings in microseconds over the repeats
+  """
+  timer = timeit.Timer(fn)
+  # autorange grows the loop count until a run takes 0.2 seconds
+  loops, elapsed = timer.autorange()
+  if elapsed < min_time:
+    loops = int(loops * min_time / elapsed) + 1
+
+  timings = [seconds / loops * 1e6 for seconds in timer.repeat(repeat, loops)]
+  return {
+    "loops": loops,
+    "repeat": repeat,
+    "min_us": round(min(timings), 3),
+    "median_us": round(statistics.median(timings), 3),
+    "mean_us": round(statistics.mean(timings), 3),
+    "stdev_us": round(statistics.stdev(timings), 3) if len(timings) > 1 else 0.0,
+  }
+
+def run(context, names=None, repeat=5, min_time=0.2, report=print):
+  """
+  Run the registered benchmarks
+
+  :param context: [dict] fixtures shared by the benchmarks, e.g. the Flask test client
+  :param names: [list] substrings selecting the benchmarks to run, None for all of them
+
+  :return [dict] name => timings
+  """
+  results = {}
+  for name, build in sorted(BENCHMARKS.items()):
+    if names and not any(selected in name for selected in names):
+      continue
+
+    results[name] = measure(build(context), repeat, min_time)
+    report("{:<45} {:>12.2f} us  (median {:.2f}, +/- {:.2f})".format(name, results[name]["min_us"], results[name]["median_us"], results[name]["stdev_us"]))
+
+  return results
+
+def metadata(database):
+  try:
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    commit = None
+
+  return {
+    "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+    "commit": commit,
+    "database": database,
+    "python": platform.python_version(),
+    "platform": platform.platform(),
+  }
+
+def save(path, meta, results):
+  with open(path, "w") as output:
+    json.dump({"meta": meta, "results": results}, output, indent=2, sort_keys=True)
+
+def compare(baseline, results, threshold=0.1, report=print):
+  """
+  Compare min timings with a saved baseline
+
+  :param baseline: [dict] content of a results file
+  :param results: [dict] name => timings of this run
+  :param threshold: [float] relative slowdown reported as a regression, e.g. 0.1 for 10%
+
+  :return [list] names of the regressed benchmarks
+  """
+  regressions = []
+  report("\n{:<45} {:>12} {:>12} {:>8}".format("benchmark", "baseline us", "current us", "change"))
+
+  for name, timings in sorted(results.items()):
+    before = baseline["results"].get(name)
+    if not before:
+      report("{:<45} {:>12} {:>12.2f} {:>8}".format(name, "-", timings["min_us"], "new"))
+      continue
+
+    change = timings["min_us"] / before["min_us"] - 1
+    flag = ""
+    if change > threshold:
+      regressions.append(name)
+      flag = "  REGRESSION"
+    elif change < -threshold:
+      flag = "  faster"
+    report("{:<45} {:>12.2f} {:>12.2f} {:>+7.1%}{}".format(name, before["min_us"], timings["min_us"], change, flag))
+
+  return regressions
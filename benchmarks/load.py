@@ -0,0 +1,316 @@
+"""
+Replay a mix of /v1 requests against a running server at a target rate
+
+  python -m benchmarks.load --url http://localhost:5000 --manifest seed.json --rps 200 --duration 60
+  python -m benchmarks.load --mix get_book=70,get_books=20,patch_reading_list=10 --output load.json
+
+Requests are sent open loop: they are scheduled at the target rate whether or not the earlier
+ones have completed, and their latency is measured from their scheduled time, so a server falling
+behind shows up as latency instead of a lower request rate. The ids are picked from the seeding
+manifest (python -m benchmarks.seed --manifest) with a Zipf skew, or from the first pages of the
+API without one. p50/p95/p99 latency, throughput and error rates are reported per route.
+"""
+
+import argparse
+import bisect
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import urllib3
+from benchmarks.seed import ADJECTIVES, NOUNS, LAST_NAMES
+
+# words of the seeded titles and authors, typed into search and autocomplete
+SEARCH_WORDS = [word.lower() for word in ADJECTIVES + NOUNS + LAST_NAMES if word.isalpha()]
+
+# route => (method, path, body) built from a picker of ids
+ROUTES = {
+  "get_book": lambda pick: ("GET", "/v1/books/" + pick("books")["book_id"], None),
+  "get_book_by_isbn": lambda pick: ("GET", "/v1/books/isbn/" + pick("books")["ISBN"], None),
+  "get_books": lambda pick: ("GET", "/v1/books?page_number={}&page_offset=20".format(pick.page()), None),
+  "get_books_cursor": lambda pick: ("GET", "/v1/books?cursor=&page_offset=20&with_count=false", None),
+  "get_books_by_ids": lambda pick: ("GET", "/v1/books?ids=" + ",".join(pick("books")["book_id"] for _ in range(20)), None),
+  "post_books_isbn_batch": lambda pick: ("POST", "/v1/books/isbn/batch", {"isbns": [pick("books")["ISBN"] for _ in range(20)]}),
+  "get_reading_lists": lambda pick: ("GET", "/v1/reading_lists?page_number={}&page_offset=20".format(pick.page()), None),
+  "get_reading_lists_by_status": lambda pick: ("GET", "/v1/reading_lists?status={}&page_offset=20".format(random.choice(["unread", "in_progress", "finished"])), None),
+  "get_reading_lists_include": lambda pick: ("GET", "/v1/reading_lists?page_offset=20&include=book,rating", None),
+  "get_reading_lists_summary": lambda pick: ("GET", "/v1/reading_lists/summary", None),
+  "get_reading_list": lambda pick: ("GET", "/v1/reading_lists/" + pick("reading_lists"), None),
+  "patch_reading_list": lambda pick: ("PATCH", "/v1/reading_lists/" + pick("reading_lists"), {"status": random.choice(["unread", "in_progress", "finished"])}),
+  "get_ratings": lambda pick: ("GET", "/v1/ratings?page_number={}&page_offset=20".format(pick.page()), None),
+  "get_rating": lambda pick: ("GET", "/v1/ratings/" + pick("ratings"), None),
+  "search_books": lambda pick: ("GET", "/v1/books/search?q=" + random.choice(SEARCH_WORDS), None),
+  "suggest_books": lambda pick: ("GET", "/v1/books/suggest?prefix=" + random.choice(SEARCH_WORDS)[:random.randint(1, 5)], None),
+  "get_book_stats": lambda pick: ("GET", "/v1/books/{}/stats".format(pick("rated_books")), None),
+  "post_book": lambda pick: ("POST", "/v1/books", {"ISBN": "979{:010d}".format(random.randrange(10 ** 10)), "title": "Load Test Book", "author": "Load Test"}),
+}
+
+# read heavy, with a few writes to the reading lists
+DEFAULT_MIX = "get_book=30,get_book_by_isbn=10,get_books=8,get_books_cursor=5,get_books_by_ids=3,post_books_isbn_batch=3,get_reading_lists=8,get_reading_lists_by_status=5,get_reading_lists_include=3,get_reading_lists_summary=2,get_reading_list=6,patch_reading_list=2,get_ratings=5,get_rating=4,get_book_stats=6"
+
+def parse_mix(mix):
+  """
+  :param mix: [str] comma separated route=weight pairs
+
+  :return [dict] route => weight
+  """
+  weights = {}
+  for part in mix.split(","):
+    route, _, weight = part.partition("=")
+    route = route.strip()
+    if route not in ROUTES:
+      raise ValueError("Unknown route {}, should be one of {}".format(route, ", ".join(sorted(ROUTES))))
+    weights[route] = float(weight or 1)
+  return weights
+
+class idPicker:
+
+  def __init__(self, ids, exponent=1.1, pages=50, seed=None):
+    """
+    :param ids: [dict] kind => ids in popularity order, the content of a seeding manifest
+    :param exponent: [float] Zipf exponent, 0 picks uniformly
+    :param pages: [int] page numbers requested by the list routes, page 1 the most often
+    """
+    self.ids = {kind: values for kind, values in ids.items() if isinstance(values, list) and values}
+    self.random = random.Random(seed)
+    self.lock = threading.Lock()
+    self.cum_weights = {kind: list(itertools.accumulate(1 / rank ** exponent for rank in range(1, len(values) + 1))) for kind, values in self.ids.items()}
+    self.page_weights = list(itertools.accumulate(1 / rank ** exponent for rank in range(1, pages + 1)))
+
+  def _rank(self, cum_weights):
+    with self.lock:
+      value = self.random.random() * cum_weights[-1]
+    return bisect.bisect(cum_weights, value)
+
+  def __call__(self, kind):
+    if kind not in self.ids:
+      raise KeyError("No {} ids to request, seed some or leave the routes which need them out of the mix".format(kind))
+    return self.ids[kind][self._rank(self.cum_weights[kind])]
+
+  def page(self):
+    return self._rank(self.page_weights) + 1
+
+def discover_ids(send, pages=5):
+  """
+  Collect ids to request from the first pages of the list endpoints, for a database seeded without a manifest
+
+  :param send: [function] (method, path, body) => (status, response body)
+
+  :return [dict] kind => ids
+  """
+  ids = {"books": [], "reading_lists": [], "ratings": [], "rated_books": []}
+  for kind, path, key in [("books", "/v1/books?page_offset=100&with_count=false&fields=book_id,ISBN&cursor=", "books"), ("reading_lists", "/v1/reading_lists?page_offset=100&with_count=false&cursor=", "reading_lists"), ("ratings", "/v1/ratings?page_offset=100&with_count=false&cursor=", "ratings")]:
+    cursor = ""
+    for _ in range(pages):
+      status, data = send("GET", path + cursor, None)
+      page = json.loads(data) if status == 200 else {}
+      for row in page.get(key) or []:
+        if kind == "books":
+          ids["books"].append({"book_id": row["book_id"], "ISBN": row["ISBN"]})
+        elif kind == "reading_lists":
+          ids["reading_lists"].append(row["list_id"])
+        else:
+          ids["ratings"].append(row["rating_id"])
+          ids["rated_books"].append(row["book_id"])
+      cursor = page.get("next_cursor")
+      if not cursor:
+        break
+
+  # the manifest keeps the most popular ids first, discovered ones are in no particular order
+  for values in ids.values():
+    random.shuffle(values)
+  return ids
+
+def http_sender(url, concurrency, timeout=10):
+  """
+  :param url: [str] base URL of the server, e.g. http://localhost:5000
+
+  :return [function] (method, path, body) => (status, response body)
+  """
+  pool = urllib3.PoolManager(maxsize=concurrency, block=True, retries=False, timeout=urllib3.Timeout(total=timeout))
+  url = url.rstrip("/")
+
+  def send(method, path, body):
+    if body is None:
+      response = pool.request(method, url + path)
+    else:
+      response = pool.request(method, url + path, body=json.dumps(body), headers={"Content-Type": "application/json"})
+    return response.status, response.data
+
+  return send
+
+class loadDriver:
+
+  def __init__(self, send, mix, picker, rps=100, duration=60, concurrency=32, warmup=0):
+    """
+    :param send: [function] (method, path, body) => (status, response body), called from the worker threads
+    :param mix: [dict] route => weight
+    :param picker: [object] idPicker of the ids to request
+    :param rps: [float] target requests per second
+    :param duration: [float] seconds requests are recorded
+    :param concurrency: [int] max requests in flight
+    :param warmup: [float] seconds of requests sent before the recorded ones
+    """
+    self.send = send
+    self.routes = list(mix)
+    self.cum_weights = list(itertools.accumulate(mix.values()))
+    self.picker = picker
+    self.rps = rps
+    self.duration = duration
+    self.concurrency = concurrency
+    self.warmup = warmup
+    self.random = random.Random()
+
+    # route => latencies in seconds, status codes and exceptions
+    self.latencies = {route: [] for route in self.routes}
+    self.statuses = {route: {} for route in self.routes}
+    self.failures = {route: 0 for route in self.routes}
+    self.lock = threading.Lock()
+
+  def _fire(self, route, scheduled, recorded):
+    try:
+      method, path, body = ROUTES[route](self.picker)
+      status, _ = self.send(method, path, body)
+    except Exception:
+      status = None
+    latency = time.perf_counter() - scheduled
+
+    if not recorded:
+      return
+    with self.lock:
+      if status is None:
+        self.failures[route] += 1
+      else:
+        self.latencies[route].append(latency)
+        self.statuses[route][status] = self.statuses[route].get(status, 0) + 1
+
+  def run(self):
+    """
+    Send the requests and wait for the last ones
+
+    :return [dict] report, see summarize
+    """
+    interval = 1 / self.rps
+    started = time.perf_counter()
+    recording = started + self.warmup
+    end = recording + self.duration
+
+    with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+      for number in itertools.count():
+        scheduled = started + number * interval
+        if scheduled >= end:
+          break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+          time.sleep(delay)
+
+        route = self.routes[bisect.bisect(self.cum_weights, self.random.random() * self.cum_weights[-1])]
+        executor.submit(self._fire, route, scheduled, scheduled >= recording)
+
+    return self.summarize(time.perf_counter() - recording)
+
+  def summarize(self, elapsed):
+    """
+    :param elapsed: [float] seconds from the first recorded request to the last response
+
+    :return [dict] routes => per route requests, throughput, latency percentiles in ms and error rates, plus the total
+    """
+    report = {"target_rps": self.rps, "elapsed_s": round(elapsed, 3), "routes": {}}
+    all_latencies, totals = [], {"requests": 0, "errors": 0, "client_errors": 0}
+
+    for route in self.routes:
+      latencies = sorted(self.latencies[route])
+      statuses = self.statuses[route]
+      requests = len(latencies) + self.failures[route]
+      if not requests:
+        continue
+
+      # connection failures count as server errors
+      errors = self.failures[route] + sum(count for status, count in statuses.items() if status >= 500)
+      client_errors = sum(count for status, count in statuses.items() if 400 <= status < 500)
+      report["routes"][route] = {
+        "requests": requests,
+        "rps": round(requests / elapsed, 2),
+        **percentiles(latencies),
+        "errors": errors,
+        "error_rate": round(errors / requests, 4),
+        "client_errors": client_errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+      }
+      all_latencies.extend(latencies)
+      totals["requests"] += requests
+      totals["errors"] += errors
+      totals["client_errors"] += client_errors
+
+    all_latencies.sort()
+    report["total"] = {
+      **totals,
+      "rps": round(totals["requests"] / elapsed, 2) if elapsed else 0,
+      **percentiles(all_latencies),
+      "error_rate": round(totals["errors"] / totals["requests"], 4) if totals["requests"] else 0,
+    }
+    return report
+
+def percentiles(latencies):
+  """
+  :param latencies: [list] sorted latencies in seconds
+
+  :return [dict] p50, p95, p99 and max in milliseconds, nearest rank
+  """
+  if not latencies:
+    return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+
+  def rank(share):
+    return round(latencies[max(0, int(share * len(latencies) + 0.5) - 1)] * 1000, 2)
+  return {"p50_ms": rank(0.5), "p95_ms": rank(0.95), "p99_ms": rank(0.99), "max_ms": round(latencies[-1] * 1000, 2)}
+
+def print_report(report, output=print):
+  output("{:<30} {:>8} {:>8} {:>9} {:>9} {:>9} {:>8} {:>7}".format("route", "requests", "rps", "p50 ms", "p95 ms", "p99 ms", "errors", "4xx"))
+  for route, row in sorted(report["routes"].items()) + [("total", report["total"])]:
+    output("{:<30} {:>8} {:>8.1f} {:>9} {:>9} {:>9} {:>7.2%} {:>7}".format(route, row["requests"], row["rps"], row["p50_ms"], row["p95_ms"], row["p99_ms"], row["error_rate"], row["client_errors"]))
+
+def main():
+  parser = argparse.ArgumentParser(description="Load test the /v1 endpoints")
+  parser.add_argument("--url", default="http://localhost:5000")
+  parser.add_argument("--rps", type=float, default=100, help="target requests per second")
+  parser.add_argument("--duration", type=float, default=60, help="seconds requests are recorded")
+  parser.add_argument("--warmup", type=float, default=5, help="seconds of requests sent before recording")
+  parser.add_argument("--concurrency", type=int, default=32, help="max requests in flight")
+  parser.add_argument("--timeout", type=float, default=10, help="seconds before a request counts as failed")
+  parser.add_argument("--mix", default=DEFAULT_MIX, help="comma separated route=weight pairs, routes: " + ", ".join(sorted(ROUTES)))
+  parser.add_argument("--manifest", help="ids written by python -m benchmarks.seed --manifest")
+  parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of the picked ids, 0 for uniform")
+  parser.add_argument("--output", help="write the report as JSON to this file")
+  args = parser.parse_args()
+
+  try:
+    mix = parse_mix(args.mix)
+  except ValueError as e:
+    print(e, file=sys.stderr)
+    return 2
+
+  send = http_sender(args.url, args.concurrency, args.timeout)
+  if args.manifest:
+    with open(args.manifest) as manifest:
+      ids = json.load(manifest)
+  else:
+    ids = discover_ids(send)
+
+  driver = loadDriver(send, mix, idPicker(ids, args.zipf), args.rps, args.duration, args.concurrency, args.warmup)
+  print("Sending {} requests/s to {} for {}s after a {}s warmup".format(args.rps, args.url, args.duration, args.warmup))
+  report = driver.run()
+  print_report(report)
+
+  if args.output:
+    from benchmarks.harness import metadata
+    with open(args.output, "w") as output:
+      json.dump({"meta": {**metadata(None), "url": args.url, "mix": mix}, "report": report}, output, indent=2, sort_keys=True)
+
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
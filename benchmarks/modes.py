@@ -0,0 +1,250 @@
+"""
+Compare the WSGI (run.py) and ASGI (asgi.py) serving modes under the same load
+
+  python -m benchmarks.modes --manifest seed.json --rps 300 --duration 60 --slow-clients 1000
+  python -m benchmarks.modes --modes asgi --mix get_book=100 --output modes.json
+
+Each mode is served by a process of its own on a free port, against the RDS_* database (fill it with
+python -m benchmarks.seed first): the Flask app on Werkzeug's threaded server, one thread per connection,
+and asgi.py on uvicorn. While benchmarks.load replays the mix at the target rate, --slow-clients
+connections keep trickling small request bodies over --slow-seconds each, like clients on a slow
+network. The latency of the replayed requests, the slow requests completed and the peak threads and
+memory of the server process are printed side by side.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import urllib3
+from benchmarks.load import DEFAULT_MIX, discover_ids, http_sender, idPicker, loadDriver, parse_mix, print_report
+
+MODES = ["wsgi", "asgi"]
+
+def serve(mode, port):
+  """
+  Serve the app in this process until it is killed
+  """
+  if mode == "wsgi":
+    from werkzeug.serving import make_server
+    from src.app import app
+    # one access log line per request would slow the server down more than the requests
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    make_server("127.0.0.1", port, app, threaded=True).serve_forever()
+  else:
+    import uvicorn
+    from asgi import application
+    uvicorn.run(application, host="127.0.0.1", port=port, log_level="warning")
+
+def free_port():
+  with socket.socket() as sock:
+    sock.bind(("127.0.0.1", 0))
+    return sock.getsockname()[1]
+
+def wait_until_up(url, timeout=30):
+  pool = urllib3.PoolManager(retries=False, timeout=1)
+  deadline = time.monotonic() + timeout
+  while time.monotonic() < deadline:
+    try:
+      if pool.request("GET", url + "/v1/").status == 200:
+        return
+    except urllib3.exceptions.HTTPError:
+      pass
+    time.sleep(0.2)
+  raise RuntimeError("The server at {} did not start within {}s".format(url, timeout))
+
+class processSampler:
+
+  def __init__(self, pid, interval=0.2):
+    """
+    Peak threads and resident memory of a process, read from /proc (Linux)
+    """
+    self.pid = pid
+    self.interval = interval
+    self.peak_threads = 0
+    self.peak_rss_mb = 0.0
+    self._stop = threading.Event()
+    self._thread = threading.Thread(target=self._sample, daemon=True)
+
+  def _sample(self):
+    while not self._stop.wait(self.interval):
+      try:
+        with open("/proc/{}/status".format(self.pid)) as status:
+          for line in status:
+            if line.startswith("Threads:"):
+              self.peak_threads = max(self.peak_threads, int(line.split()[1]))
+            elif line.startswith("VmRSS:"):
+              self.peak_rss_mb = max(self.peak_rss_mb, int(line.split()[1]) / 1024)
+      except OSError:
+        return
+
+  def __enter__(self):
+    self._thread.start()
+    return self
+
+  def __exit__(self, *args):
+    self._stop.set()
+    self._thread.join()
+
+class slowClients:
+
+  def __init__(self, port, clients, seconds, isbns):
+    """
+    Connections which each send POST /v1/books/isbn/batch with its body trickled over seconds, again and again
+
+    :param clients: [int] concurrent connections, a request answered with a status below 500 counts as completed
+    :param seconds: [float] seconds the body of a request is sent over
+    :param isbns: [list] ISBNs put in the bodies
+    """
+    self.port = port
+    self.clients = clients
+    self.seconds = seconds
+    self.body = json.dumps({"isbns": isbns[:20] or ["9780000000000"]}).encode()
+    self.completed = 0
+    self.failed = 0
+    self._stop = None
+    self._thread = threading.Thread(target=asyncio.run, args=(self._run(),), daemon=True)
+    self._started = threading.Event()
+
+  async def _client(self, number):
+    # spread the first requests over the trickle time so the connections don't arrive at once
+    await asyncio.sleep(self.seconds * number / self.clients)
+    head = "POST /v1/books/isbn/batch HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: close\r\n\r\n".format(len(self.body)).encode()
+    parts = 10
+    while not self._stop.is_set():
+      writer = None
+      try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(head)
+        for part in range(parts):
+          writer.write(self.body[part * len(self.body) // parts:(part + 1) * len(self.body) // parts])
+          await writer.drain()
+          await asyncio.sleep(self.seconds / parts)
+        status = int((await reader.readline()).split(b" ")[1])
+        await reader.read()
+        if status < 500:
+          self.completed += 1
+        else:
+          self.failed += 1
+      except (OSError, IndexError, ValueError):
+        self.failed += 1
+        await asyncio.sleep(self.seconds / parts)
+      finally:
+        if writer:
+          writer.close()
+
+  async def _run(self):
+    self._stop = asyncio.Event()
+    self._loop = asyncio.get_running_loop()
+    self._started.set()
+    await asyncio.gather(*[self._client(number) for number in range(self.clients)])
+
+  def __enter__(self):
+    if self.clients:
+      self._thread.start()
+      self._started.wait()
+    return self
+
+  def __exit__(self, *args):
+    if self.clients:
+      self._loop.call_soon_threadsafe(self._stop.set)
+      self._thread.join()
+
+def run_mode(mode, args, mix, ids):
+  """
+  Start a server in the given mode, replay the mix against it with the slow clients connected and stop it
+
+  :return [dict] load report plus the slow client counts and the peak threads and memory of the server
+  """
+  port = free_port()
+  url = "http://127.0.0.1:{}".format(port)
+  server = subprocess.Popen([sys.executable, "-m", "benchmarks.modes", "--serve", mode, "--port", str(port)])
+  try:
+    wait_until_up(url)
+    send = http_sender(url, args.concurrency, args.timeout)
+    ids = ids or discover_ids(send)
+
+    with processSampler(server.pid) as sampler, slowClients(port, args.slow_clients, args.slow_seconds, [book["ISBN"] for book in ids["books"]]) as slow:
+      report = loadDriver(send, mix, idPicker(ids, args.zipf), args.rps, args.duration, args.concurrency, args.warmup).run()
+
+    report["server"] = {
+      "slow_completed": slow.completed,
+      "slow_failed": slow.failed,
+      "peak_threads": sampler.peak_threads,
+      "peak_rss_mb": round(sampler.peak_rss_mb, 1),
+    }
+    return report
+  finally:
+    server.terminate()
+    server.wait()
+
+def print_comparison(reports, output=print):
+  output("{:<6} {:>8} {:>9} {:>9} {:>9} {:>8} {:>10} {:>8} {:>9} {:>8}".format("mode", "rps", "p50 ms", "p95 ms", "p99 ms", "errors", "slow done", "slow err", "threads", "rss MB"))
+  for mode, report in reports.items():
+    total, server = report["total"], report["server"]
+    output("{:<6} {:>8.1f} {:>9} {:>9} {:>9} {:>7.2%} {:>10} {:>8} {:>9} {:>8}".format(
+      mode, total["rps"], total["p50_ms"], total["p95_ms"], total["p99_ms"], total["error_rate"],
+      server["slow_completed"], server["slow_failed"], server["peak_threads"], server["peak_rss_mb"]
+    ))
+
+def main():
+  parser = argparse.ArgumentParser(description="Compare the WSGI and ASGI serving modes")
+  parser.add_argument("--modes", default=",".join(MODES), help="comma separated modes to run, " + " or ".join(MODES))
+  parser.add_argument("--rps", type=float, default=100, help="target requests per second")
+  parser.add_argument("--duration", type=float, default=30, help="seconds requests are recorded")
+  parser.add_argument("--warmup", type=float, default=5, help="seconds of requests sent before recording")
+  parser.add_argument("--concurrency", type=int, default=64, help="max replayed requests in flight")
+  parser.add_argument("--timeout", type=float, default=10, help="seconds before a request counts as failed")
+  parser.add_argument("--slow-clients", type=int, default=500, help="connections trickling request bodies during the run")
+  parser.add_argument("--slow-seconds", type=float, default=5, help="seconds a slow client takes to send a body")
+  parser.add_argument("--mix", default=DEFAULT_MIX, help="comma separated route=weight pairs, see benchmarks.load")
+  parser.add_argument("--manifest", help="ids written by python -m benchmarks.seed --manifest")
+  parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of the picked ids, 0 for uniform")
+  parser.add_argument("--output", help="write the reports as JSON to this file")
+  parser.add_argument("--serve", choices=MODES, help=argparse.SUPPRESS)
+  parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.serve:
+    serve(args.serve, args.port)
+    return 0
+
+  modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+  try:
+    mix = parse_mix(args.mix)
+    if [mode for mode in modes if mode not in MODES]:
+      raise ValueError("Modes should be among {}".format(", ".join(MODES)))
+  except ValueError as e:
+    print(e, file=sys.stderr)
+    return 2
+
+  ids = None
+  if args.manifest:
+    with open(args.manifest) as manifest:
+      ids = json.load(manifest)
+
+  reports = {}
+  for mode in modes:
+    print("\n{}: {} requests/s for {}s with {} slow clients".format(mode, args.rps, args.duration, args.slow_clients))
+    reports[mode] = run_mode(mode, args, mix, ids)
+    print_report(reports[mode])
+
+  print()
+  print_comparison(reports)
+
+  if args.output:
+    from benchmarks.harness import metadata
+    with open(args.output, "w") as output:
+      json.dump({"meta": {**metadata(os.getenv("RDS_DB_NAME")), "mix": mix, "slow_clients": args.slow_clients}, "reports": reports}, output, indent=2, sort_keys=True)
+
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,350 @@
+"""
+Generate a production sized dataset of books, reading lists and ratings
+
+  python -m benchmarks.seed --books 1000000 --manifest seed.json
+  python -m benchmarks.seed --database-url sqlite:///seed.db --books 100000 --truncate
+
+Book popularity follows a Zipf distribution: popular books are much more likely to be on a
+reading list, to be finished and rated, and get higher ratings, and a few prolific authors wrote
+many of the books. ISBNs are valid ISBN-13s, unique within the run. book_rating_stats is filled in
+from the generated ratings. The target database is the one of the RDS_* environment variables
+unless --database-url is given, the tables are created when missing.
+
+The manifest lists the ids of the most popular books, reading lists and ratings, the load driver
+(python -m benchmarks.load) requests them with the same skew.
+"""
+
+import argparse
+import bisect
+import csv
+import io
+import itertools
+import json
+import math
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, select, text
+
+STATUSES = ["unread", "in_progress", "finished"]
+STATUS_WEIGHTS = [0.4, 0.25, 0.35]
+
+# rating 0 to 5, the popular books are rated higher
+POPULAR_RATING_WEIGHTS = [1, 2, 4, 12, 35, 46]
+RATING_WEIGHTS = [4, 7, 14, 30, 28, 17]
+
+ADJECTIVES = ["Silent", "Hidden", "Broken", "Golden", "Last", "Forgotten", "Burning", "Distant", "Quiet", "Wild", "Crimson", "Endless", "Lost", "Secret", "Winter", "Northern", "Bright", "Hollow", "Iron", "Paper"]
+NOUNS = ["River", "Garden", "Kingdom", "Letters", "Machine", "Island", "Orchard", "Harbor", "Mountain", "Library", "Empire", "Promise", "Shadow", "Voyage", "Theory", "Signal", "Lighthouse", "Archive", "Storm", "City"]
+PLACES = ["Dublin", "the North", "Glass", "Tomorrow", "the Sea", "Ashes", "Small Things", "the Valley", "Stars", "Salt"]
+FIRST_NAMES = ["Anna", "Brian", "Chloe", "Declan", "Eva", "Fionn", "Grace", "Hugo", "Isla", "Jack", "Kate", "Liam", "Maeve", "Niall", "Orla", "Patrick", "Roisin", "Sean", "Tara", "Yusuf", "Mei", "Arjun", "Lucia", "Tomas"]
+LAST_NAMES = ["Murphy", "Kelly", "Walsh", "Byrne", "Ryan", "O'Brien", "Smith", "Doyle", "Chen", "Garcia", "Novak", "Okafor", "Kowalski", "Silva", "Nakamura", "Larsen", "Rossi", "Haddad", "Dubois", "Schmidt"]
+NOTES = ["Could not put it down", "Slow start, great ending", "Read it for the book club", "Not for me", "Beautifully written", "Would read again", "Too long", "A classic"]
+
+# a stride coprime with 10^9 spreads consecutive books over the ISBN space without repeating
+ISBN_STRIDE = 7919
+
+def isbn13(prefix, number):
+  """
+  Build a valid ISBN-13
+
+  :param prefix: [str] 978 or 979
+  :param number: [int] 0 to 999999999, the registration group, publisher and title digits
+
+  :return [str] 13 digits, the last one the check digit
+  """
+  digits = "{}{:09d}".format(prefix, number)
+  total = sum(int(digit) * (3 if position % 2 else 1) for position, digit in enumerate(digits))
+  return digits + str((10 - total % 10) % 10)
+
+def zipf_cum_weights(count, exponent):
+  """
+  :return [list] cumulative Zipf weights of ranks 1 to count, for random.choices and bisect
+  """
+  return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+def weighted_sample(rng, count, exponent, size):
+  """
+  Pick size distinct indexes out of count, index 0 the most likely, without replacement
+  (Efraimidis-Spirakis keys, log(u) / weight with weight = 1 / rank ** exponent)
+
+  :return [list] picked indexes, in the order of their keys
+  """
+  keys = [math.log(1 - rng.random()) * (index + 1) ** exponent for index in range(count)]
+  return sorted(range(count), key=keys.__getitem__, reverse=True)[:size]
+
+class datasetGenerator:
+
+  def __init__(self, books, lists_share=0.5, ratings_share=0.6, exponent=1.1, days=730, isbn_prefix="978", seed=42, now=None):
+    """
+    :param books: [int] number of books
+    :param lists_share: [float] share of the books on a reading list
+    :param ratings_share: [float] share of the finished reading lists with a rating, in progress ones are rated a third as often
+    :param exponent: [float] Zipf exponent of the book popularity, higher is more skewed
+    :param days: [int] the rows are created over the last days
+    :param isbn_prefix: [str] 978 or 979
+    :param seed: [int] random seed, the same seed generates the same dataset
+    """
+    self.books = books
+    self.lists_share = lists_share
+    self.ratings_share = ratings_share
+    self.exponent = exponent
+    self.isbn_prefix = isbn_prefix
+    self.rng = random.Random(seed)
+    self.now = now or datetime.utcnow().replace(microsecond=0)
+    self.start = self.now - timedelta(days=days)
+    self.span = (self.now - self.start).total_seconds()
+
+    self.authors = [
+      "{} {}".format(self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES))
+      for _ in range(max(20, books // 25))
+    ]
+    self.author_weights = zipf_cum_weights(len(self.authors), 0.8)
+
+    # book index => book_id and seconds after start it was created, the index is its popularity rank
+    self.book_ids = []
+    self.book_created = []
+    # book index => (list_id, status, seconds after start it was created)
+    self.lists = {}
+    # book_id, rating_id, rating and created_at of the generated ratings, the most popular books first
+    self.ratings = []
+
+  def _id(self):
+    return uuid.UUID(int=self.rng.getrandbits(128), version=1).hex
+
+  def _title(self):
+    rng = self.rng
+    shape = rng.random()
+    if shape < 0.45:
+      title = "The {} {}".format(rng.choice(ADJECTIVES), rng.choice(NOUNS))
+    elif shape < 0.8:
+      title = "{} of {}".format(rng.choice(NOUNS), rng.choice(PLACES))
+    else:
+      title = "{} {}".format(rng.choice(ADJECTIVES), rng.choice(NOUNS))
+    if rng.random() < 0.15:
+      title += " Book {}".format(rng.randint(2, 9))
+    return title
+
+  def _time(self, seconds):
+    return self.start + timedelta(seconds=int(seconds))
+
+  def book_rows(self):
+    """
+    :return [generator] books column dicts, the most popular first
+    """
+    rng = self.rng
+    for index in range(self.books):
+      book_id = self._id()
+      created = rng.uniform(0, self.span)
+      self.book_ids.append(book_id)
+      self.book_created.append(created)
+      author = self.authors[bisect.bisect(self.author_weights, rng.random() * self.author_weights[-1])]
+      yield {
+        "book_id": book_id,
+        "ISBN": isbn13(self.isbn_prefix, (index * ISBN_STRIDE) % 10 ** 9),
+        "title": self._title(),
+        "author": author,
+        "created_at": self._time(created),
+        "updated_at": None,
+      }
+
+  def reading_list_rows(self):
+    """
+    :return [generator] reading_lists column dicts of popularity weighted books, needs book_rows to have run
+    """
+    rng = self.rng
+    picked = weighted_sample(rng, len(self.book_ids), self.exponent, int(len(self.book_ids) * self.lists_share))
+    for index in sorted(picked):
+      list_id = self._id()
+      status = rng.choices(STATUSES, STATUS_WEIGHTS)[0]
+      created = rng.uniform(self.book_created[index], self.span)
+      self.lists[index] = (list_id, status, created)
+      yield {
+        "list_id": list_id,
+        "book_id": self.book_ids[index],
+        "status": status,
+        "created_at": self._time(created),
+        "updated_at": self._time(rng.uniform(created, self.span)) if status != "unread" else None,
+      }
+
+  def rating_rows(self):
+    """
+    :return [generator] book_ratings column dicts, needs reading_list_rows to have run
+    """
+    rng = self.rng
+    popular = max(1, len(self.book_ids) // 10)
+    for index, (list_id, status, created) in self.lists.items():
+      share = self.ratings_share if status == "finished" else self.ratings_share / 3 if status == "in_progress" else 0
+      if rng.random() >= share:
+        continue
+
+      weights = POPULAR_RATING_WEIGHTS if index < popular else RATING_WEIGHTS
+      row = {
+        "rating_id": self._id(),
+        "book_id": self.book_ids[index],
+        "list_id": list_id,
+        "rating": rng.choices(range(6), weights)[0],
+        "notes": rng.choice(NOTES) if rng.random() < 0.3 else None,
+        "created_at": self._time(rng.uniform(created, self.span)),
+        "updated_at": None,
+      }
+      self.ratings.append({key: row[key] for key in ["book_id", "rating_id", "rating", "created_at"]})
+      yield row
+
+def stats_rows(ratings):
+  """
+  :param ratings: [iterable] book_ratings column dicts
+
+  :return [list] book_rating_stats column dicts of the rated books
+  """
+  stats = {}
+  for rating in ratings:
+    row = stats.get(rating["book_id"])
+    if not row:
+      row = stats[rating["book_id"]] = {"book_id": rating["book_id"], "rating_count": 0, "rating_sum": 0, **{"stars_{}".format(star): 0 for star in range(6)}, "updated_at": rating["created_at"]}
+    row["rating_count"] += 1
+    row["rating_sum"] += rating["rating"]
+    row["stars_{}".format(rating["rating"])] += 1
+    row["updated_at"] = max(row["updated_at"], rating["created_at"])
+
+  for row in stats.values():
+    stars = [star for star in range(6) if row["stars_{}".format(star)]]
+    row["rating_min"], row["rating_max"] = stars[0], stars[-1]
+
+  return list(stats.values())
+
+def insert_rows(engine, table, rows, batch_size=10000, report=print):
+  """
+  Insert rows in batches, with COPY on Postgres when psycopg2 is the driver
+
+  :param table: [object] sqlalchemy Table
+  :param rows: [iterable] column dicts, every row with the same keys
+
+  :return [int] number of rows inserted
+  """
+  inserted = 0
+  began = time.perf_counter()
+  rows = iter(rows)
+
+  for batches in itertools.count(1):
+    batch = list(itertools.islice(rows, batch_size))
+    if not batch:
+      break
+
+    with engine.begin() as connection:
+      cursor = connection.connection.cursor() if engine.dialect.name == "postgresql" else None
+      if cursor is not None and hasattr(cursor, "copy_expert"):
+        columns = list(batch[0])
+        buffer = io.StringIO()
+        # None is written as an empty field, which COPY reads as NULL
+        csv.writer(buffer).writerows([["" if row[column] is None else row[column] for column in columns] for row in batch])
+        buffer.seek(0)
+        cursor.copy_expert('COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(table.name, ", ".join('"{}"'.format(column) for column in columns)), buffer)
+      else:
+        connection.execute(insert(table), batch)
+
+    inserted += len(batch)
+    if batches % 10 == 0:
+      report("  {:<20} {:>10} rows  {:>9.0f} rows/s".format(table.name, inserted, inserted / (time.perf_counter() - began)))
+
+  report("  {:<20} {:>10} rows in {:.1f}s".format(table.name, inserted, time.perf_counter() - began))
+  return inserted
+
+def seed(engine, generator, batch_size=10000, truncate=False, report=print):
+  """
+  Create the tables when missing and insert a generated dataset
+
+  :param engine: [object] sqlalchemy Engine
+  :param generator: [object] datasetGenerator
+  :param truncate: [bool] delete the existing rows first, else the books table has to be empty
+
+  :return [dict] rows inserted per table
+  """
+  from src.app import db
+  from src.models.books import Book
+  import src.models.reading_lists, src.models.book_ratings, src.models.book_rating_stats
+  tables = db.metadata.tables
+
+  db.metadata.create_all(engine, tables=[tables[name] for name in ["books", "reading_lists", "book_ratings", "book_rating_stats"]])
+
+  with engine.begin() as connection:
+    if truncate:
+      for name in ["book_rating_stats", "book_ratings", "reading_lists", "books"]:
+        connection.execute(tables[name].delete())
+    elif connection.execute(select(func.count()).select_from(tables["books"])).scalar():
+      raise ValueError("The books table is not empty, seed an empty database or pass --truncate")
+
+  counts = {}
+  counts["books"] = insert_rows(engine, tables["books"], generator.book_rows(), batch_size, report)
+  with engine.begin() as connection:
+    Book.rebuild_search_index(connection)
+  counts["reading_lists"] = insert_rows(engine, tables["reading_lists"], generator.reading_list_rows(), batch_size, report)
+  counts["book_ratings"] = insert_rows(engine, tables["book_ratings"], generator.rating_rows(), batch_size, report)
+  counts["book_rating_stats"] = insert_rows(engine, tables["book_rating_stats"], stats_rows(generator.ratings), batch_size, report)
+
+  if engine.dialect.name == "postgresql":
+    # fresh planner statistics, the estimated counts of with_count=estimated come from them too
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+      for name in counts:
+        connection.execute(text("ANALYZE {}".format(name)))
+
+  return counts
+
+def manifest(generator, counts, size=10000):
+  """
+  Ids of the most popular rows, in popularity order, for the load driver
+
+  :param generator: [object] datasetGenerator which seeded the database
+  :param counts: [dict] rows inserted per table
+
+  :return [dict]
+  """
+  top = range(min(size, len(generator.book_ids)))
+  listed = sorted(generator.lists)[:size]
+  return {
+    "counts": counts,
+    "books": [{"book_id": generator.book_ids[index], "ISBN": isbn13(generator.isbn_prefix, (index * ISBN_STRIDE) % 10 ** 9)} for index in top],
+    "reading_lists": [generator.lists[index][0] for index in listed],
+    "rated_books": [rating["book_id"] for rating in generator.ratings[:size]],
+    "ratings": [rating["rating_id"] for rating in generator.ratings[:size]],
+  }
+
+def main():
+  parser = argparse.ArgumentParser(description="Seed books, reading lists and ratings")
+  parser.add_argument("--database-url", help="defaults to the database of the RDS_* environment variables")
+  parser.add_argument("--books", type=int, default=1000000)
+  parser.add_argument("--lists", type=float, default=0.5, help="share of the books on a reading list")
+  parser.add_argument("--ratings", type=float, default=0.6, help="share of the finished reading lists with a rating")
+  parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of the book popularity")
+  parser.add_argument("--days", type=int, default=730, help="spread the creation times over this many days")
+  parser.add_argument("--isbn-prefix", choices=["978", "979"], default="978")
+  parser.add_argument("--seed", type=int, default=42)
+  parser.add_argument("--batch-size", type=int, default=10000)
+  parser.add_argument("--truncate", action="store_true", help="delete the existing rows first")
+  parser.add_argument("--manifest", help="write the ids of the most popular rows to this JSON file")
+  parser.add_argument("--manifest-size", type=int, default=10000)
+  args = parser.parse_args()
+
+  from src.config.config import DB_URI
+  engine = create_engine(args.database_url or DB_URI)
+  generator = datasetGenerator(args.books, args.lists, args.ratings, args.zipf, args.days, args.isbn_prefix, args.seed)
+
+  began = time.perf_counter()
+  try:
+    counts = seed(engine, generator, args.batch_size, args.truncate)
+  except ValueError as e:
+    print(e, file=sys.stderr)
+    return 1
+
+  print("Seeded {} in {:.1f}s".format(", ".join("{} {}".format(count, name) for name, count in counts.items()), time.perf_counter() - began))
+
+  if args.manifest:
+    with open(args.manifest, "w") as output:
+      json.dump(manifest(generator, counts, args.manifest_size), output)
+
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -1,9 +1,12 @@
-from flask import Flask
+from flask import Flask, g, request
+from flask.logging import default_handler
 from flask_sqlalchemy import SQLAlchemy
 from src.helpers import *
 from src.config import config
+from src.libs.pool_stats import timedQueuePool
+from src.libs.structured_logging import setup_logging
 import os
-import logging
+import uuid
 from flask_swagger_ui import get_swaggerui_blueprint
 
 app = Flask("book_status_api", static_url_path='/static')
@@ -11,20 +14,13 @@ app = Flask("book_status_api", static_url_path='/static')
 # Load config to app
 app.config.from_pyfile("src/config/config.py")
 app.config['SQLALCHEMY_DATABASE_URI'] = config.DB_URI
+if config.SQLALCHEMY_ENGINE_OPTIONS:
+  # times checkouts for /v1/_internal/pool
+  app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**config.SQLALCHEMY_ENGINE_OPTIONS, "poolclass": timedQueuePool}
 
-# StreamHandler for logging
-stream_handler = logging.StreamHandler()
-
-# Set the log level to INFO
-stream_handler.setLevel(logging.INFO)
-
-# format logs
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-stream_handler.setFormatter(formatter)
-
-# Adding the handler to app's logger
-app.logger.addHandler(stream_handler)
-app.logger.setLevel(logging.INFO)
+# Log through a queue, the listener thread writes JSON lines to stderr
+app.logger.removeHandler(default_handler)
+log_listener = setup_logging(app.logger, config.LOG_LEVEL, config.LOG_FORMAT, config.LOG_SAMPLING)
 
 # Swagger UI setup
 SWAGGER_URL = '/api/docs'  # URL for exposing Swagger UI (without trailing '/')
@@ -51,6 +47,17 @@ def root_uri():
     app.logger.info('Root URI accessed')
     return responsify({"message": "Hello World. Welcome to Book Status Service API.", "version": "0.0.1"})
 
+@app.before_request
+def assign_request_id():
+  # kept from the load balancer or client when supplied, so log lines can be joined across services
+  g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+
+@app.after_request
+def return_request_id(response):
+  if g.get("request_id"):
+    response.headers["X-Request-ID"] = g.request_id
+  return response
+
 # Handle all error cases
 @app.errorhandler(404)
 def error_404(error):
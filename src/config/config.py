@@ -15,13 +15,112 @@ else:
     RDS_DB_NAME   = os.getenv("RDS_DB_NAME")  or "books_status"
     RDS_USERNAME  = os.getenv("RDS_USERNAME") or "postgres"
     RDS_PASSWORD  = os.getenv("RDS_PASSWORD") or "newpassword"
-    
-    SQS_QUEUE_URL = os.getenv("SQS_QUEUE_URL") or ""
 
     DB_URI = "postgresql://{}:{}@{}:{}/{}".format(RDS_USERNAME, RDS_PASSWORD, RDS_HOSTNAME, RDS_PORT, RDS_DB_NAME)
 
 SQLALCHEMY_POOL_RECYCLE = int(os.getenv("SQLALCHEMY_POOL_RECYCLE", 3600))
 
+# Connection pool of every app/worker process: connections kept open, extra ones opened under load,
+# seconds a request waits for a free connection and whether connections are tested before use
+SQLALCHEMY_POOL_SIZE     = int(os.getenv("SQLALCHEMY_POOL_SIZE", 5))
+SQLALCHEMY_MAX_OVERFLOW  = int(os.getenv("SQLALCHEMY_MAX_OVERFLOW", 10))
+SQLALCHEMY_POOL_TIMEOUT  = float(os.getenv("SQLALCHEMY_POOL_TIMEOUT", 30))
+SQLALCHEMY_POOL_PRE_PING = os.getenv("SQLALCHEMY_POOL_PRE_PING", "true").lower() == "true"
+
+if APP_ENVIRONMENT == 'test':
+    # the in-memory SQLite database lives in a single connection
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+else:
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": SQLALCHEMY_POOL_SIZE,
+        "max_overflow": SQLALCHEMY_MAX_OVERFLOW,
+        "pool_timeout": SQLALCHEMY_POOL_TIMEOUT,
+        "pool_recycle": SQLALCHEMY_POOL_RECYCLE,
+        "pool_pre_ping": SQLALCHEMY_POOL_PRE_PING,
+    }
+
+# ASGI serving mode (asgi.py): the same database through an async driver, with the pool options above,
+# and the max size of a request body, read in full before the request is handled
+if APP_ENVIRONMENT == 'test':
+    ASYNC_DB_URI = 'sqlite+aiosqlite:///:memory:'
+else:
+    ASYNC_DB_URI = DB_URI.replace("postgresql://", "postgresql+asyncpg://", 1)
+ASGI_MAX_BODY_SIZE = int(os.getenv("ASGI_MAX_BODY_SIZE", 10 * 1024 * 1024))
+
+# Seconds a list endpoint's total count is reused before it is counted again
+COUNT_CACHE_TTL = int(os.getenv("COUNT_CACHE_TTL", 30))
+
+# Bulk book creation: max rows per request and rows per INSERT/COPY statement
+BULK_MAX_ROWS          = int(os.getenv("BULK_MAX_ROWS", 50000))
+BULK_INSERT_CHUNK_SIZE = int(os.getenv("BULK_INSERT_CHUNK_SIZE", 1000))
+
+# Rows fetched from the server side cursor per chunk of a streamed export
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 1000))
+
+# In-process cache of books looked up by book_id/ISBN, size 0 disables it
+BOOK_CACHE_SIZE = int(os.getenv("BOOK_CACHE_SIZE", 10000))
+BOOK_CACHE_TTL  = int(os.getenv("BOOK_CACHE_TTL", 60))
+
+# Multi-get: max keys per request and values per IN (...) query
+MULTI_GET_MAX_KEYS   = int(os.getenv("MULTI_GET_MAX_KEYS", 1000))
+MULTI_GET_CHUNK_SIZE = int(os.getenv("MULTI_GET_CHUNK_SIZE", 500))
+
+# Queue of book upload requests, QUEUE_BACKEND is "sqs" or "local" (in-memory, for tests and development)
+QUEUE_BACKEND = os.getenv("QUEUE_BACKEND", "local" if APP_ENVIRONMENT == "test" else "sqs")
+SQS_QUEUE_URL = os.getenv("SQS_QUEUE_URL") or ""
+SQS_REGION    = os.getenv("SQS_REGION", "us-east-1")
+
+# Upload producer: messages per SendMessageBatch (SQS allows 10), max seconds a message
+# waits for its batch to fill and max messages buffered before requests are turned away
+SQS_BATCH_SIZE     = min(int(os.getenv("SQS_BATCH_SIZE", 10)), 10)
+SQS_FLUSH_INTERVAL = float(os.getenv("SQS_FLUSH_INTERVAL", 0.2))
+SQS_MAX_PENDING    = int(os.getenv("SQS_MAX_PENDING", 10000))
+
+# Ingestion worker: threads fetching the books of received messages, long poll seconds,
+# seconds a received message stays hidden from other workers and max books per message
+WORKER_CONCURRENCY        = int(os.getenv("WORKER_CONCURRENCY", 8))
+WORKER_WAIT_TIME          = int(os.getenv("WORKER_WAIT_TIME", 20))
+WORKER_VISIBILITY_TIMEOUT = int(os.getenv("WORKER_VISIBILITY_TIMEOUT", 300))
+UPLOAD_MAX_BOOKS          = int(os.getenv("UPLOAD_MAX_BOOKS", 1000))
+
+# GET /v1/books/suggest: "database" (pg_trgm indexes on Postgres, the FTS5 table on SQLite) or "memory", an
+# in-process prefix index loaded from books on first use and reloaded every SUGGEST_RELOAD_INTERVAL seconds
+# to pick up the writes of other processes, 0 never reloads
+SUGGEST_BACKEND         = os.getenv("SUGGEST_BACKEND", "database")
+SUGGEST_RELOAD_INTERVAL = int(os.getenv("SUGGEST_RELOAD_INTERVAL", 300))
+SUGGEST_MAX_RESULTS     = int(os.getenv("SUGGEST_MAX_RESULTS", 20))
+
+# Google Books API
+GOOGLE_BOOKS_URL     = os.getenv("GOOGLE_BOOKS_URL", "https://www.googleapis.com/books/v1/volumes")
+GOOGLE_BOOKS_API_KEY = os.getenv("GOOGLE_BOOKS_API_KEY", "")
+
+# Google Books client: pages requested at the same time per upload, retries per page and timeout in seconds
+GOOGLE_BOOKS_CONCURRENCY = int(os.getenv("GOOGLE_BOOKS_CONCURRENCY", 4))
+GOOGLE_BOOKS_RETRIES     = int(os.getenv("GOOGLE_BOOKS_RETRIES", 3))
+GOOGLE_BOOKS_TIMEOUT     = float(os.getenv("GOOGLE_BOOKS_TIMEOUT", 10))
+
+# Request metrics served at /metrics. METRICS_DIR is a directory shared by the processes of the app
+# (e.g. gunicorn workers), each saves its totals there every METRICS_FLUSH_INTERVAL seconds
+METRICS_ENABLED        = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_DIR            = os.getenv("METRICS_DIR") or None
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 10))
+
+# Response compression negotiated from Accept-Encoding: offered encodings most preferred first (br and zstd
+# are skipped when the brotli/zstandard packages are missing), level per encoding, bodies smaller than
+# COMPRESSION_MIN_SIZE bytes are sent as they are, compressed bodies of responses with an ETag are kept
+# in an in-process cache of COMPRESSION_CACHE_SIZE entries, size 0 disables it
+COMPRESSION_ENCODINGS  = [name.strip() for name in os.getenv("COMPRESSION_ENCODINGS", "br,zstd,gzip").split(",") if name.strip()]
+COMPRESSION_LEVELS     = {"gzip": 6, "br": 4, "zstd": 3, **{name.strip(): int(level) for name, level in (item.rsplit("=", 1) for item in os.getenv("COMPRESSION_LEVELS", "").split(",") if item.strip())}}
+COMPRESSION_MIN_SIZE   = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_CACHE_SIZE = int(os.getenv("COMPRESSION_CACHE_SIZE", 1000))
+COMPRESSION_CACHE_TTL  = int(os.getenv("COMPRESSION_CACHE_TTL", 300))
+
+# Logging: level, json or text lines, and the share of requests of busy routes whose info logs
+# are kept, e.g. LOG_SAMPLING="/v1/books/<book_id>=0.01,/v1/books=0.1" (warnings and errors are always kept)
+LOG_LEVEL    = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT   = os.getenv("LOG_FORMAT", "json")
+LOG_SAMPLING = {route.strip(): float(rate) for route, rate in (item.rsplit("=", 1) for item in os.getenv("LOG_SAMPLING", "").split(",") if item.strip())}
+
 # API URI Prefix
 BASE_PATH = "/v1"
 API_URI   = os.getenv("API_URI", "http://0.0.0.0:5000")
\ No newline at end of file
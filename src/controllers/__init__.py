@@ -1,3 +1,7 @@
 from src.controllers.books import *
 from src.controllers.reading_lists import *
-from src.controllers.book_ratings import *
\ No newline at end of file
+from src.controllers.book_ratings import *
+from src.controllers.metrics import *
+# registered after the metrics hook so that it runs first and the compressed size is recorded
+from src.controllers.compression import *
+from src.controllers.internal import *
\ No newline at end of file
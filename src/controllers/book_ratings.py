@@ -1,5 +1,6 @@
 from flask import Blueprint, request
 from src.models.book_ratings import BookRating
+from src.models.book_rating_stats import BookRatingStats
 from src.helpers import *
 from src.app import app
 
@@ -11,18 +12,32 @@ def create_a_rating():
     app.logger.info('Create rating request received')
 
     data = request.get_json()
-    app.logger.debug(f'Request data: {data}')
+    app.logger.debug('Request data: %s', data)
 
     result = BookRating.create_a_rating(data)
 
     if result.get("error"):
         app.logger.error('Rating creation failed')
-        app.logger.debug(f'Error details: {result}')
+        app.logger.debug('Error details: %s', result)
         return errorit(result, "RATING_CREATION_FAILED", 400)
     else:
         app.logger.info('Rating successfully created')
         return responsify(result, {}, 201)
 
+@app.route(BASE_PATH + "/ratings/export", methods=["GET"])
+def export_ratings():
+    """
+    Stream every rating as NDJSON or CSV
+    """
+    app.logger.info('Export ratings request received')
+
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in EXPORT_MIMETYPES:
+        app.logger.warning('Invalid export format')
+        return errorit({"format":"should be ndjson or csv"}, "TAG_ERROR", 400)
+
+    return streamify(BookRating.export_rows(export_format), export_format, "ratings")
+
 @app.route(BASE_PATH + "/ratings/<rating_id>", methods=["GET"])
 def get_a_rating(rating_id):
     """
@@ -32,14 +47,19 @@ def get_a_rating(rating_id):
     """
     app.logger.info(f'Rating information request received for Rating ID: {rating_id}')
 
-    rating = BookRating.get_ratings(rating_id)
+    fields, error = parse_fields(request.args.get("fields"), BookRating.columns_list())
+    if error:
+        app.logger.warning('Invalid fields value')
+        return errorit(error, "TAG_ERROR", 400)
+
+    rating = BookRating.get_ratings(rating_id, fields=fields)
 
     if not rating:
         app.logger.error(f'Rating not found for ID: {rating_id}')
         return errorit("No such rating found", "RATING_NOT_FOUND", 404)
     else:
         app.logger.info(f'Rating information retrieved for ID: {rating_id}')
-        return responsify(rating, {})
+        return etagify(rating)
 
 @app.route(BASE_PATH + "/ratings", methods=["GET"])
 def get_ratings():
@@ -68,19 +88,35 @@ def get_ratings():
             app.logger.warning('Invalid sortby value')
             return errorit({"orderby":"should be 1 for ascending or -1 for descending","sortby":"should be rating or createdAt"}, "TAG_ERROR", 400)
 
-    app.logger.debug(f'Orderby: {orderby}, Sorting column: {sorting_column}')
+    fields, error = parse_fields(request.args.get("fields"), BookRating.columns_list())
+    if error:
+        app.logger.warning('Invalid fields value')
+        return errorit(error, "TAG_ERROR", 400)
+
+    # a cursor only continues a page of the same sort, it would otherwise seek on another column
+    cursor = request.args.get("cursor")
+    if cursor and BookRating.cursor_bound(sorting_column or "created_at", orderby or 1, cursor) is None:
+        app.logger.warning('Invalid cursor value')
+        return errorit({"cursor":"should be the next_cursor value returned by the previous page of the same sort"}, "TAG_ERROR", 400)
+
+    with_count = request.args.get("with_count", "true")
+    if with_count not in ["true", "false", "estimated"]:
+        app.logger.warning('Invalid with_count value')
+        return errorit({"with_count":"should be true, false or estimated"}, "TAG_ERROR", 400)
 
-    ratings = BookRating.get_ratings(None, False, request.args.get("page_number"), request.args.get("page_offset"), orderby, sorting_column)
+    app.logger.debug('Orderby: %s, Sorting column: %s', orderby, sorting_column)
+
+    ratings = BookRating.get_ratings(None, False, request.args.get("page_number"), request.args.get("page_offset"), orderby, sorting_column, cursor, with_count, fields)
 
     if not ratings:
         app.logger.info('No ratings found')
-        return responsify({"ratings":[]}, {})
+        return etagify({"ratings":[]}, weak=True)
     elif type(ratings) is dict:
         app.logger.info('Single rating found')
-        return responsify(ratings, {}, 200)
+        return etagify(ratings, weak=True)
     else:
         app.logger.info(f'{len(ratings)} ratings found')
-        return responsify(ratings, {})
+        return etagify(ratings, weak=True)
 
 @app.route(BASE_PATH + "/ratings/<rating_id>", methods=["PATCH"])
 def update_a_rating(rating_id):
@@ -92,7 +128,7 @@ def update_a_rating(rating_id):
     app.logger.info(f'Update rating request received for rating id: {rating_id}')
 
     data = request.get_json()
-    app.logger.debug(f'Request data: {data}')
+    app.logger.debug('Request data: %s', data)
 
     result = BookRating.update_a_rating(rating_id, data)
 
@@ -101,7 +137,7 @@ def update_a_rating(rating_id):
         return {"error": "No such rating found", "status": 404}, 404
     elif result.get("error"):
         app.logger.error('Rating update failed')
-        app.logger.debug(f'Error details: {result.get("error")}')
+        app.logger.debug('Error details: %s', result.get("error"))
         return {"error": result.get("error"), "status": 400}, 400
     else:
         app.logger.info(f'Rating successfully updated for id: {rating_id}')
@@ -124,8 +160,29 @@ def delete_rating_permanently(rating_id):
 
     if result.get("error"):
         app.logger.error('Rating deletion failed')
-        app.logger.debug(f'Error details: {result}')
+        app.logger.debug('Error details: %s', result)
         return errorit(result, "RATING_DELETION_FAILED", 400)
 
     app.logger.info('Rating successfully deleted')
-    return responsify(result, {}, 200)
\ No newline at end of file
+    return responsify(result, {}, 200)
+
+@app.route(BASE_PATH + "/books/<book_id>/stats", methods=["GET"])
+def get_book_rating_stats(book_id):
+    """
+    Get a book's rating count, sum, average, min, max and per star histogram
+
+    :param book_id: [str] books table primary key
+    """
+    app.logger.info(f'Rating stats request received for book_id: {book_id}')
+
+    stats = BookRatingStats.get_stats(book_id)
+
+    if not stats:
+        app.logger.warning(f'No book found for book_id: {book_id}')
+        return errorit("No such book found", "BOOK_NOT_FOUND", 404)
+    elif stats.get("error"):
+        app.logger.error(f'Rating stats retrieval failed for book_id: {book_id}')
+        return errorit(stats, "RATING_STATS_FAILED", 500)
+    else:
+        app.logger.info(f'Rating stats retrieved for book_id: {book_id}')
+        return etagify(stats)
@@ -2,8 +2,13 @@ from flask import Blueprint, request
 from src.models.books import Book
 from src.helpers import *
 from src.app import app
-import boto3
+from src.libs.queues import queue_client
+from src.libs.sqs_producer import sqsProducer
 import json
+import ujson
+
+# one long lived client and sender thread for every upload request of the process
+upload_producer = sqsProducer(queue_client, SQS_QUEUE_URL, SQS_BATCH_SIZE, SQS_FLUSH_INTERVAL, SQS_MAX_PENDING)
 
 @app.route(BASE_PATH + "/books", methods=["POST"])
 def create_a_book():
@@ -13,19 +18,63 @@ def create_a_book():
     app.logger.info('Create book request received')
 
     data = request.get_json()
-    app.logger.debug(f'Request data: {data}')
+    app.logger.debug('Request data: %s', data)
     
     result = Book.create_a_book(data)
 
     if result.get("error"):
         app.logger.error('Book creation failed')
-        app.logger.debug(f'Error details: {result}')
+        app.logger.debug('Error details: %s', result)
         return errorit(result, "BOOK_CREATION_FAILED", 400)
     else:
         app.logger.info('Book successfully created')
         return responsify(result, {}, 201)
 
 
+@app.route(BASE_PATH + "/books/bulk", methods=["POST"])
+def create_books_in_bulk():
+    """
+    Create many books from a JSON array or an NDJSON (one book per line) body
+    """
+    app.logger.info('Bulk book creation request received')
+
+    if request.mimetype in ["application/x-ndjson", "application/jsonl"]:
+        try:
+            rows = [ujson.loads(line) for line in request.stream if line.strip()]
+        except ValueError:
+            app.logger.warning('Invalid NDJSON body')
+            return errorit("Request body should have one JSON book per line", "BULK_CREATION_FAILED", 400)
+    else:
+        rows = request.get_json(silent=True)
+
+    if not isinstance(rows, list) or not rows:
+        app.logger.warning('Bulk book creation body is not a list of books')
+        return errorit("Request body should be a non empty list of books", "BULK_CREATION_FAILED", 400)
+
+    if len(rows) > BULK_MAX_ROWS:
+        app.logger.warning(f'Bulk book creation request has {len(rows)} books')
+        return errorit(f"At most {BULK_MAX_ROWS} books can be created per request", "BULK_CREATION_FAILED", 400)
+
+    result = Book.create_books(rows)
+
+    app.logger.info(f'{result["created"]} books created, {result["failed"]} failed')
+    return responsify(result, {}, 201 if result["created"] else 200)
+
+
+@app.route(BASE_PATH + "/books/export", methods=["GET"])
+def export_books():
+    """
+    Stream every book as NDJSON or CSV
+    """
+    app.logger.info('Export books request received')
+
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in EXPORT_MIMETYPES:
+        app.logger.warning('Invalid export format')
+        return errorit({"format":"should be ndjson or csv"}, "TAG_ERROR", 400)
+
+    return streamify(Book.export_rows(export_format), export_format, "books")
+
 @app.route(BASE_PATH + "/books/<book_id>", methods=["GET"])
 def get_a_book(book_id):
     """
@@ -35,14 +84,19 @@ def get_a_book(book_id):
     """
     app.logger.info(f'Book information request received for Book ID: {book_id}')
 
-    book = Book.get_books(book_id)
+    fields, error = parse_fields(request.args.get("fields"), Book.columns_list())
+    if error:
+        app.logger.warning('Invalid fields value')
+        return errorit(error, "TAG_ERROR", 400)
+
+    book = Book.get_books(book_id, fields=fields)
 
     if not book:
         app.logger.error(f'Book not found for ID: {book_id}')
         return errorit("No such book found", "BOOK_NOT_FOUND", 404)
     else:
         app.logger.info(f'Book information retrieved for ID: {book_id}')
-        return responsify(book, {})
+        return etagify(book)
 
 @app.route(BASE_PATH + "/books", methods=["GET"])
 def get_books():
@@ -71,19 +125,108 @@ def get_books():
             app.logger.warning('Invalid sortby value')
             return errorit({"orderby":"should be 1 for ascending or -1 for descending","sortby":"should be book title or createdAt"}, "TAG_ERROR", 400)
 
-    app.logger.debug(f'Orderby: {orderby}, Sorting column: {sorting_column}')
+    fields, error = parse_fields(request.args.get("fields"), Book.columns_list())
+    if error:
+        app.logger.warning('Invalid fields value')
+        return errorit(error, "TAG_ERROR", 400)
+
+    if request.args.get("ids") is not None:
+        ids = [book_id.strip() for book_id in request.args.get("ids").split(",") if book_id.strip()]
+        if not ids or len(ids) > MULTI_GET_MAX_KEYS:
+            app.logger.warning('Invalid ids value')
+            return errorit({"ids":f"should be a comma separated list of 1 to {MULTI_GET_MAX_KEYS} book ids"}, "TAG_ERROR", 400)
+
+        books = Book.get_books_by_keys("book_id", ids, fields)
+        if books.get("error"):
+            app.logger.error('Book retrieval by ids failed')
+            return errorit(books, "BOOK_RETRIEVAL_FAILED", 400)
+
+        app.logger.info(f'{len(books["books"])} books found, {len(books["missing"])} ids missing')
+        return etagify(books, weak=True)
+
+    # a cursor only continues a page of the same sort, it would otherwise seek on another column
+    cursor = request.args.get("cursor")
+    if cursor and Book.cursor_bound(sorting_column or "title", orderby or 1, cursor) is None:
+        app.logger.warning('Invalid cursor value')
+        return errorit({"cursor":"should be the next_cursor value returned by the previous page of the same sort"}, "TAG_ERROR", 400)
 
-    books = Book.get_books(None, False, request.args.get("page_number"), request.args.get("page_offset"), orderby, sorting_column)
+    with_count = request.args.get("with_count", "true")
+    if with_count not in ["true", "false", "estimated"]:
+        app.logger.warning('Invalid with_count value')
+        return errorit({"with_count":"should be true, false or estimated"}, "TAG_ERROR", 400)
+
+    app.logger.debug('Orderby: %s, Sorting column: %s', orderby, sorting_column)
+
+    books = Book.get_books(None, False, request.args.get("page_number"), request.args.get("page_offset"), orderby, sorting_column, cursor, with_count, fields)
     
     if not books:
         app.logger.info('No books found')
-        return responsify({"books":[]}, {})
+        return etagify({"books":[]}, weak=True)
     elif type(books) is dict:
         app.logger.info('Single book found')
-        return responsify(books, {}, 200)
+        return etagify(books, weak=True)
     else:
         app.logger.info(f'{len(books)} books found')
-        return responsify(books, {})
+        return etagify(books, weak=True)
+
+@app.route(BASE_PATH + "/books/search", methods=["GET"])
+def search_books():
+    """
+    Search books by words of their title and author, ranked and cursor paginated
+    """
+    app.logger.info('Book search request received')
+
+    q = (request.args.get("q") or "").strip()
+    if not q or len(q) > 200:
+        app.logger.warning('Invalid q value')
+        return errorit({"q":"should be 1 to 200 characters of search terms"}, "TAG_ERROR", 400)
+
+    fields, error = parse_fields(request.args.get("fields"), Book.columns_list())
+    if error:
+        app.logger.warning('Invalid fields value')
+        return errorit(error, "TAG_ERROR", 400)
+
+    cursor = request.args.get("cursor")
+    if cursor and decode_cursor(cursor) is None:
+        app.logger.warning('Invalid cursor value')
+        return errorit({"cursor":"should be the next_cursor value returned by the previous page of the same search"}, "TAG_ERROR", 400)
+
+    books = Book.search_books(q, cursor, request.args.get("page_offset"), fields)
+
+    if books.get("error") == "Invalid pagination cursor":
+        app.logger.warning('Cursor of another search')
+        return errorit({"cursor":"should be the next_cursor value returned by the previous page of the same search"}, "TAG_ERROR", 400)
+    elif books.get("error"):
+        app.logger.error('Book search failed')
+        return errorit(books, "BOOK_SEARCH_FAILED", 400)
+
+    app.logger.info(f'{len(books["books"])} books found')
+    return etagify(books, weak=True)
+
+@app.route(BASE_PATH + "/books/suggest", methods=["GET"])
+def suggest_books():
+    """
+    Autocomplete books whose title or author has a word starting with the prefix, most rated first
+    """
+    app.logger.info('Book suggestion request received')
+
+    prefix = (request.args.get("prefix") or "").strip()
+    if not prefix or len(prefix) > 100:
+        app.logger.warning('Invalid prefix value')
+        return errorit({"prefix":"should be 1 to 100 characters"}, "TAG_ERROR", 400)
+
+    limit = request.args.get("limit", "10")
+    if not limit.isdigit() or not 1 <= int(limit) <= SUGGEST_MAX_RESULTS:
+        app.logger.warning('Invalid limit value')
+        return errorit({"limit":f"should be between 1 and {SUGGEST_MAX_RESULTS}"}, "TAG_ERROR", 400)
+
+    suggestions = Book.suggest_books(prefix, int(limit))
+
+    if suggestions.get("error"):
+        app.logger.error('Book suggestion failed')
+        return errorit(suggestions, "BOOK_SUGGESTION_FAILED", 400)
+
+    return etagify(suggestions, weak=True)
 
 @app.route(BASE_PATH + "/books/<book_id>", methods=["PATCH"])
 def update_a_book(book_id):
@@ -95,7 +238,7 @@ def update_a_book(book_id):
     app.logger.info(f'Update book request received for book id: {book_id}')
 
     data = request.get_json()
-    app.logger.debug(f'Request data: {data}')
+    app.logger.debug('Request data: %s', data)
     
     result = Book.update_a_book(book_id, data)
 
@@ -104,7 +247,7 @@ def update_a_book(book_id):
         return {"error": "No such book found", "status": 404}, 404
     elif result.get("error"):
         app.logger.error('Book update failed')
-        app.logger.debug(f'Error details: {result.get("error")}')
+        app.logger.debug('Error details: %s', result.get("error"))
         return {"error": result.get("error"), "status": 400}, 400
     else:
         app.logger.info(f'Book successfully updated for id: {book_id}')
@@ -127,7 +270,7 @@ def delete_book_permanently(book_id):
 
   if result.get("error"):
     app.logger.error('Book deletion failed')
-    app.logger.debug(f'Error details: {result}')
+    app.logger.debug('Error details: %s', result)
     return errorit(result, "BOOK_DELETION_FAILED", 400)
 
   app.logger.info('Book successfully deleted')
@@ -142,14 +285,48 @@ def get_book_by_isbn(isbn):
     """
     app.logger.info(f'Book information request received for ISBN: {isbn}')
 
-    book = Book.get_book_by_isbn(isbn)
+    fields, error = parse_fields(request.args.get("fields"), Book.columns_list())
+    if error:
+        app.logger.warning('Invalid fields value')
+        return errorit(error, "TAG_ERROR", 400)
+
+    book = Book.get_book_by_isbn(isbn, fields)
 
     if not book:
         app.logger.error(f'Book not found for ISBN: {isbn}')
         return errorit("No such book found", "BOOK_NOT_FOUND", 404)
     else:
         app.logger.info(f'Book information retrieved for ISBN: {isbn}')
-        return responsify(book, {})
+        return etagify(book)
+
+@app.route(BASE_PATH + "/books/isbn/batch", methods=["POST"])
+def get_books_by_isbns():
+    """
+    Get many books' information by ISBN
+
+    :param isbns: [list] ISBNs of the books
+    """
+    data = request.get_json(silent=True)
+    isbns = data.get("isbns") if isinstance(data, dict) else None
+    app.logger.info(f'Book information request received for {len(isbns) if isinstance(isbns, list) else 0} ISBNs')
+
+    if not isinstance(isbns, list) or not isbns or len(isbns) > MULTI_GET_MAX_KEYS or not all(type(isbn) is str for isbn in isbns):
+        app.logger.warning('Invalid isbns value')
+        return errorit({"isbns":f"should be a list of 1 to {MULTI_GET_MAX_KEYS} ISBN strings"}, "TAG_ERROR", 400)
+
+    fields, error = parse_fields(request.args.get("fields"), Book.columns_list())
+    if error:
+        app.logger.warning('Invalid fields value')
+        return errorit(error, "TAG_ERROR", 400)
+
+    books = Book.get_books_by_keys("ISBN", isbns, fields)
+
+    if books.get("error"):
+        app.logger.error('Book retrieval by ISBNs failed')
+        return errorit(books, "BOOK_RETRIEVAL_FAILED", 400)
+    else:
+        app.logger.info(f'{len(books["books"])} books found, {len(books["missing"])} ISBNs missing')
+        return responsify(books, {})
 
 @app.route(BASE_PATH + '/books/upload', methods=['POST'])
 def upload_books():
@@ -160,15 +337,15 @@ def upload_books():
     """
     app.logger.info(f'Book upload request received. Request to upload {request.json.get("number_of_books")} books.')
     
-    # Create SQS client
-    sqs = boto3.client('sqs', region_name='us-east-1')
     number_of_books = request.json.get('number_of_books')
     keyword = request.json.get('keyword')
 
-    # Send message to SQS queue
-    sqs.send_message(QueueUrl=SQS_QUEUE_URL, MessageBody=json.dumps({'number_of_books': number_of_books, 'keyword': keyword}))
+    # Buffer the message, it is sent to SQS in a batch off the request thread
+    if not upload_producer.send(json.dumps({'number_of_books': number_of_books, 'keyword': keyword})):
+        app.logger.error('Upload queue is full')
+        return errorit("Too many upload requests, please retry later", "UPLOAD_QUEUE_FULL", 503)
 
     # Log information about the sent message
-    app.logger.info(f'Message sent to SQS. Request to upload {number_of_books} books.')
+    app.logger.info(f'Message queued for SQS. Request to upload {number_of_books} books.')
 
     return responsify({"message": "Book upload request received"}, {}, 202)
\ No newline at end of file
@@ -0,0 +1,66 @@
+from flask import request
+from src.libs.compression import available, negotiate, compress, compress_chunks
+from src.libs.lru_cache import lruCache
+from src.helpers import *
+from src.app import app
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/csv", "text/plain"}
+
+encodings = available(COMPRESSION_ENCODINGS)
+
+# (ETag, encoding) => compressed body, an ETag is a digest of the body so the entry is valid for as long as it is kept
+compressed_cache = lruCache(COMPRESSION_CACHE_SIZE, COMPRESSION_CACHE_TTL)
+
+@app.after_request
+def compress_response(response):
+    if encodings and response.status_code == 304:
+        # a 304 has the Vary of the response it revalidates, a cache would otherwise reuse it for any Accept-Encoding
+        response.vary.add("Accept-Encoding")
+        return response
+
+    if (
+        not encodings
+        or request.method == "HEAD"
+        or response.status_code < 200
+        or response.status_code in (204, 206)
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate(request.accept_encodings, encodings)
+    if not encoding:
+        return response
+
+    level = COMPRESSION_LEVELS[encoding]
+    if response.is_streamed:
+        # compressed chunk by chunk as the export is read, the length is unknown
+        body = response.response
+        response.response = compress_chunks(response.iter_encoded(), encoding, level)
+        if hasattr(body, "close"):
+            response.call_on_close(body.close)
+        response.headers.pop("Content-Length", None)
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return response
+
+    etag, weak = response.get_etag()
+    compressed = compressed_cache.get((etag, encoding)) if etag and compressed_cache.enabled else None
+    if compressed is None:
+        compressed = compress(data, encoding, level)
+        if etag:
+            compressed_cache.set_many({(etag, encoding): compressed})
+    else:
+        app.logger.debug('Compressed body cache hit for %s', encoding)
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    if etag and not weak:
+        # the compressed body differs byte for byte from the identity one
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,24 @@
+from src.models.books import book_cache, suggest_index
+from src.controllers.compression import compressed_cache
+from src.helpers import *
+from src.libs.pool_stats import poolStats
+from src.app import app, db
+
+@app.route(BASE_PATH + "/_internal/cache", methods=["GET"])
+def get_cache_stats():
+    """
+    Get size and hit/miss/eviction counters of the in-process caches and the size of the suggest index
+    """
+    app.logger.info('Cache stats request received')
+
+    return responsify({"book_cache": book_cache.stats(), "compressed_cache": compressed_cache.stats(), "suggest_index": suggest_index.stats()}, {})
+
+@app.route(BASE_PATH + "/_internal/pool", methods=["GET"])
+def get_pool_stats():
+    """
+    Get checked out, idle and overflow connections of the database connection pool and how long checkouts waited
+    """
+    app.logger.info('Pool stats request received')
+
+    # db.session is bound to the async engine when served by asgi.py, its pool is the one requests use
+    return responsify(poolStats.stats(db.session.get_bind().pool), {})
@@ -0,0 +1,54 @@
+import contextvars
+import time
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from src.libs.metrics import requestMetrics
+from src.helpers import *
+from src.app import app
+
+request_metrics = requestMetrics(METRICS_DIR, METRICS_FLUSH_INTERVAL)
+
+# [statement start, seconds spent in database statements] of the current request, a context variable
+# rather than a thread local so that requests sharing a thread under asgi.py are timed apart
+_db_time = contextvars.ContextVar("db_time", default=None)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    timer = _db_time.get()
+    if timer is not None:
+        timer[0] = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _stop_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    timer = _db_time.get()
+    if timer is not None and timer[0] is not None:
+        timer[1] += time.perf_counter() - timer[0]
+        timer[0] = None
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    _db_time.set([None, 0.0])
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop("request_started", None)
+    if METRICS_ENABLED and started is not None:
+        request_metrics.observe(
+            request.url_rule.rule if request.url_rule else "unmatched",
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+            response.content_length or 0,
+            _db_time.get()[1],
+        )
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Request counts, latency, response size and database time histograms in the Prometheus text format
+    """
+    return app.response_class(request_metrics.render(), mimetype="text/plain; version=0.0.4")
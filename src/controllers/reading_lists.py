@@ -11,18 +11,47 @@ def create_a_reading_list():
     app.logger.info('Create reading list request received')
 
     data = request.get_json()
-    app.logger.debug(f'Request data: {data}')
+    app.logger.debug('Request data: %s', data)
     
     result = ReadingList.create_a_reading_list(data)
 
     if result.get("error"):
         app.logger.error('Reading list creation failed')
-        app.logger.debug(f'Error details: {result}')
+        app.logger.debug('Error details: %s', result)
         return errorit(result, "READINGLIST_CREATION_FAILED", 400)
     else:
         app.logger.info('Reading list successfully created')
         return responsify(result, {}, 201)
 
+@app.route(BASE_PATH + "/reading_lists/export", methods=["GET"])
+def export_reading_lists():
+    """
+    Stream every reading list as NDJSON or CSV
+    """
+    app.logger.info('Export reading lists request received')
+
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in EXPORT_MIMETYPES:
+        app.logger.error('Invalid export format received')
+        return errorit({"format":"should be ndjson or csv"}, "TAG_ERROR", 400)
+
+    return streamify(ReadingList.export_rows(export_format), export_format, "reading_lists")
+
+@app.route(BASE_PATH + "/reading_lists/summary", methods=["GET"])
+def get_reading_lists_summary():
+    """
+    Get the number of reading lists per status
+    """
+    app.logger.info('Get reading lists summary request received')
+
+    result = ReadingList.get_summary()
+
+    if result.get("error"):
+        app.logger.error('Reading lists summary failed')
+        return errorit(result, "READING_LIST_SUMMARY_FAILED", 500)
+    else:
+        return etagify(result, weak=True)
+
 @app.route(BASE_PATH + "/reading_lists/<list_id>", methods=["GET"])
 def get_a_reading_list(list_id):
     """
@@ -32,14 +61,24 @@ def get_a_reading_list(list_id):
     """
     app.logger.info(f'Get reading list request received for list_id: {list_id}')
 
-    reading_list = ReadingList.get_reading_lists(list_id)
+    fields, error = parse_fields(request.args.get("fields"), ReadingList.columns_list())
+    if error:
+        app.logger.error('Invalid fields value received')
+        return errorit(error, "TAG_ERROR", 400)
+
+    include, error = parse_fields(request.args.get("include"), list(ReadingList._includes_), "include")
+    if error:
+        app.logger.error('Invalid include value received')
+        return errorit(error, "TAG_ERROR", 400)
+
+    reading_list = ReadingList.get_reading_lists(list_id, fields=fields, include=include)
 
     if not reading_list:
         app.logger.warning(f'No reading list found for list_id: {list_id}')
         return errorit("No such reading list found", "READING_LIST_NOT_FOUND", 404)
     else:
         app.logger.info(f'Reading list successfully retrieved for list_id: {list_id}')
-        return responsify(reading_list, {})
+        return etagify(reading_list)
 
 @app.route(BASE_PATH + "/reading_lists", methods=["GET"])
 def get_reading_lists():
@@ -69,19 +108,40 @@ def get_reading_lists():
     if request.args.get("status") and request.args.get("status") not in ["unread", "in_progress", "finished"]:
         app.logger.error('Invalid status value received')
         return errorit({"statusy":"should be either unread, in_progress, or finished"}, "TAG_ERROR", 400)
+
+    fields, error = parse_fields(request.args.get("fields"), ReadingList.columns_list())
+    if error:
+        app.logger.error('Invalid fields value received')
+        return errorit(error, "TAG_ERROR", 400)
+
+    include, error = parse_fields(request.args.get("include"), list(ReadingList._includes_), "include")
+    if error:
+        app.logger.error('Invalid include value received')
+        return errorit(error, "TAG_ERROR", 400)
+
+    # a cursor only continues a page of the same sort, it would otherwise seek on another column
+    cursor = request.args.get("cursor")
+    if cursor and ReadingList.cursor_bound(sorting_column or "created_at", orderby or 1, cursor) is None:
+        app.logger.error('Invalid cursor value received')
+        return errorit({"cursor":"should be the next_cursor value returned by the previous page of the same sort"}, "TAG_ERROR", 400)
+
+    with_count = request.args.get("with_count", "true")
+    if with_count not in ["true", "false", "estimated"]:
+        app.logger.error('Invalid with_count value received')
+        return errorit({"with_count":"should be true, false or estimated"}, "TAG_ERROR", 400)
         
     app.logger.debug('Fetching reading lists from database')
-    reading_lists = ReadingList.get_reading_lists(None, False, request.args.get("page_number"), request.args.get("page_offset"), orderby, sorting_column, request.args.get("status"))
+    reading_lists = ReadingList.get_reading_lists(None, False, request.args.get("page_number"), request.args.get("page_offset"), orderby, sorting_column, request.args.get("status"), cursor, with_count, fields, include)
     
     if not reading_lists:
         app.logger.info('No reading lists found')
-        return responsify({"reading_lists":[]}, {})
+        return etagify({"reading_lists":[]}, weak=True)
     elif type(reading_lists) is dict:
         app.logger.info('Reading lists found and returned')
-        return responsify(reading_lists, {}, 200)
+        return etagify(reading_lists, weak=True)
     else:
         app.logger.error('Unexpected result type when getting reading lists')
-        return responsify(reading_lists, {})
+        return etagify(reading_lists, weak=True)
     
 @app.route(BASE_PATH + "/reading_lists/<list_id>", methods=["PATCH"])
 def update_a_reading_list(list_id):
@@ -93,7 +153,7 @@ def update_a_reading_list(list_id):
     app.logger.info(f'Update reading list request received for list_id: {list_id}')
 
     data = request.get_json()
-    app.logger.debug(f'Request data: {data}')
+    app.logger.debug('Request data: %s', data)
 
     result = ReadingList.update_a_reading_list(list_id, data)
 
@@ -102,7 +162,7 @@ def update_a_reading_list(list_id):
         return {"error": "No such reading list found", "status": 404}, 404
     elif result.get("error"):
         app.logger.error('Failed to update reading list')
-        app.logger.debug(f'Error details: {result.get("error")}')
+        app.logger.debug('Error details: %s', result.get("error"))
         return {"error": result.get("error"), "status": 400}, 400
     else:
         app.logger.info(f'Reading list successfully updated for list_id: {list_id}')
@@ -124,7 +184,7 @@ def delete_reading_list_permanently(list_id):
         return errorit("No such reading list found", "READING_LIST_NOT_FOUND", 404)
     if result.get("error"):
         app.logger.error('Reading list deletion failed')
-        app.logger.debug(f'Error details: {result}')
+        app.logger.debug('Error details: %s', result)
         return errorit(result, "READING_LIST_DELETION_FAILED", 400)
     
     app.logger.info(f'Reading list successfully deleted for list id: {list_id}')
@@ -1,7 +1,11 @@
+import base64
+import hashlib
 import ujson
-from flask import Response
+from flask import Response, request, stream_with_context
 from src.config.config import *
 
+EXPORT_MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
 def responsify(payload, links={}, http_code=200, mimetype="application/json"):
   """
   An utility for returning reponse of an api call
@@ -22,6 +26,65 @@ def responsify(payload, links={}, http_code=200, mimetype="application/json"):
   return Response(response=data, status=http_code, mimetype=mimetype)
   
   
+class taggedDict(dict):
+  """
+  A payload dictionary which already knows its ETag, e.g. one served from a cache
+  """
+  def __init__(self, data, etag):
+    super().__init__(data)
+    self.etag = etag
+
+def body_etag(data):
+  """
+  Build an ETag from an encoded response body
+
+  :param  data: [string] e.g. '{"name": "john"}'
+
+  :return [string] hex digest
+  """
+  return hashlib.sha1(data.encode()).hexdigest()
+
+def etagify(payload, weak=False, mimetype="application/json"):
+  """
+  An utility for returning the response of a GET api call with an ETag, or 304 Not Modified
+  when the client's If-None-Match already has it
+
+  :param  payload: [dictionary] e.g. {"name": "john"}, a taggedDict skips encoding when the client's copy is current
+  :param  weak: [bool] mark the ETag as weak e.g. for list pages
+  :param  mimetype: [string]
+
+  :return [Object] Response object
+  """
+  data = None
+  etag = getattr(payload, "etag", None)
+  if etag is None:
+    data = ujson.dumps(payload)
+    etag = body_etag(data)
+
+  if request.if_none_match.contains_weak(etag):
+    response = Response(status=304)
+  else:
+    response = Response(response=data if data is not None else ujson.dumps(payload), status=200, mimetype=mimetype)
+
+  response.set_etag(etag, weak)
+  return response
+
+def streamify(chunks, export_format, filename):
+  """
+  An utility for returning a streamed export of an api call
+
+  :param  chunks: [generator] encoded chunks of the body
+  :param  export_format: [string] ndjson or csv
+  :param  filename: [string] e.g. books
+
+  :return [Object] Response object
+  """
+  return Response(
+    stream_with_context(chunks),
+    mimetype=EXPORT_MIMETYPES[export_format],
+    headers={"Content-Disposition": "attachment; filename={}.{}".format(filename, export_format)}
+  )
+
 def errorit(msg, custom_code, http_code=400, info="", mimetype="application/json", debug_info=None, **kwargs):
   """
   An utility for returning error reponse of an api call
@@ -72,6 +135,25 @@ def err_dict(msg, code, info="", debug_info=None, **kwargs):
 
   return ujson.dumps(dc)
 
+def parse_fields(fields, columns, param="fields"):
+  """
+  Parse a comma separated fields= query parameter
+
+  :param  fields: [string] e.g. "book_id,title"
+  :param  columns: [list] columns the fields can be picked from
+  :param  param: [string] name of the query parameter, used in the error
+
+  :return [tuple] list of fields (None when not supplied) and error dict (None when valid)
+  """
+  if not fields:
+    return None, None
+
+  fields = [field.strip() for field in fields.split(",") if field.strip()]
+  if not fields or [field for field in fields if field not in columns]:
+    return None, {param: "should be a comma separated list of {}".format(", ".join(columns))}
+
+  return fields, None
+
 def list_diff(l1, l2):
   """
   Find differnce between two lists
@@ -92,4 +174,29 @@ def datetime_to_str(dt, with_time=False, no_day=False):
     else:
       return dt.strftime("%Y-%m-%d") if not with_time else dt.strftime("%Y-%m-%dT%H:%M:%SZ")
   except:
-    return None
\ No newline at end of file
+    return None
+
+def encode_cursor(values):
+  """
+  Encode keyset values into an opaque pagination cursor
+
+  :param  values: [list] e.g. ["title", 1, "Some Title", "2b1f..."]
+
+  :return [string] url safe cursor token
+  """
+  return base64.urlsafe_b64encode(ujson.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+  """
+  Decode a pagination cursor built by encode_cursor
+
+  :param  cursor: [string] cursor token
+
+  :return [list] keyset values or None if the cursor is malformed
+  """
+  try:
+    values = ujson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+  except (ValueError, TypeError):
+    return None
+
+  return values if isinstance(values, list) else None
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+Serve a Flask-SQLAlchemy app over ASGI with async database sessions: asgiBridge
+
+Each request runs the WSGI app in a greenlet on the event loop, with db.session bound to the
+sync side of an AsyncSession of an async engine (asyncpg). The views, validation and serialization
+are the ones of the sync app, their database calls switch back to the loop while the driver waits,
+so one process serves many concurrent requests without a thread per request.
+"""
+
+import asyncio
+import io
+import sys
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.util import greenlet_spawn
+from src.helpers import err_dict
+
+class asgiBridge:
+
+  def __init__(self, app, db, db_uri, engine_options=None, max_body_size=10 * 1024 * 1024, on_startup=None):
+    """
+    :param app: [object] Flask app
+    :param db: [object] its flask_sqlalchemy.SQLAlchemy
+    :param db_uri: [str] database URI with an async driver e.g. postgresql+asyncpg://...
+    :param engine_options: [dict] create_async_engine options e.g. pool_size
+    :param max_body_size: [int] larger request bodies are refused with 413, bodies are read before the app is called
+    :param on_startup: [list] blocking callables run on a worker thread before the first request, e.g. loading an
+                       in-process index, a failure is logged and left to be retried on first use
+    """
+    self.app = app
+    self.db = db
+    self.engine = create_async_engine(db_uri, **(engine_options or {}))
+    self.max_body_size = max_body_size
+    self.on_startup = on_startup or []
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] == "http":
+      await self._http(scope, receive, send)
+    elif scope["type"] == "lifespan":
+      await self._lifespan(receive, send)
+    else:
+      raise ValueError("Unsupported ASGI scope type {}".format(scope["type"]))
+
+  async def _lifespan(self, receive, send):
+    while True:
+      message = await receive()
+      if message["type"] == "lifespan.startup":
+        for callback in self.on_startup:
+          try:
+            # off the event loop, which keeps answering the server meanwhile
+            await asyncio.to_thread(callback)
+          except Exception as e:
+            self.app.logger.error('Startup task failed')
+            self.app.logger.debug('Error details: %s', e)
+        await send({"type": "lifespan.startup.complete"})
+      elif message["type"] == "lifespan.shutdown":
+        await self.engine.dispose()
+        await send({"type": "lifespan.shutdown.complete"})
+        return
+
+  async def _http(self, scope, receive, send):
+    # a slow client uploading its body holds no database connection
+    body = await self._read_body(receive)
+    if body is None:
+      return
+    if body is False:
+      data = err_dict("Request body is larger than {} bytes".format(self.max_body_size), "REQUEST_TOO_LARGE").encode()
+      await send({"type": "http.response.start", "status": 413, "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(data)).encode())]})
+      await send({"type": "http.response.body", "body": data})
+      return
+
+    session = AsyncSession(self.engine)
+    chunks = None
+    try:
+      # the greenlets share the request task's context, so Flask reuses this app context and db.session
+      # is the AsyncSession for the whole request
+      with self.app.app_context():
+        self.db.session.registry.set(session.sync_session)
+        try:
+          status, headers, data, chunks = await greenlet_spawn(self._call_app, self._environ(scope, body))
+          if chunks is None:
+            # the whole body is known, the connection goes back to the pool before it is sent
+            await session.close()
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": data})
+            return
+
+          # streamed, e.g. an export read from a server side cursor: the session stays open until the end
+          await send({"type": "http.response.start", "status": status, "headers": headers})
+          iterator = iter(chunks)
+          while True:
+            chunk = await greenlet_spawn(next, iterator, None)
+            if chunk is None:
+              break
+            if chunk:
+              await send({"type": "http.response.body", "body": chunk, "more_body": True})
+          await send({"type": "http.response.body", "body": b""})
+        finally:
+          if hasattr(chunks, "close"):
+            await greenlet_spawn(chunks.close)
+          self.db.session.registry.clear()
+    finally:
+      await session.close()
+
+  async def _read_body(self, receive):
+    """
+    :return [bytes] request body, None when the client disconnected, False when larger than max_body_size
+    """
+    chunks = []
+    size = 0
+    while True:
+      message = await receive()
+      if message["type"] == "http.disconnect":
+        return None
+      chunk = message.get("body", b"")
+      size += len(chunk)
+      if size > self.max_body_size:
+        return False
+      chunks.append(chunk)
+      if not message.get("more_body"):
+        return b"".join(chunks)
+
+  def _call_app(self, environ):
+    """
+    Run the WSGI app, in a greenlet
+
+    :return [tuple] status, ASGI headers, and the body, or None and the iterable of a streamed body
+    """
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+      started[:] = [int(status.split(" ", 1)[0]), [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]]
+
+    chunks = self.app(environ, start_response)
+    status, headers = started
+    if not any(name == b"content-length" for name, _ in headers):
+      return status, headers, None, chunks
+
+    try:
+      return status, headers, b"".join(chunks), None
+    finally:
+      if hasattr(chunks, "close"):
+        chunks.close()
+
+  @staticmethod
+  def _environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+      "REQUEST_METHOD": scope["method"],
+      "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+      "PATH_INFO": scope["path"].encode().decode("latin-1"),
+      "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+      "SERVER_NAME": server[0],
+      "SERVER_PORT": str(server[1]),
+      "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+      "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+      "CONTENT_LENGTH": str(len(body)),
+      "wsgi.version": (1, 0),
+      "wsgi.url_scheme": scope.get("scheme", "http"),
+      "wsgi.input": io.BytesIO(body),
+      "wsgi.errors": sys.stderr,
+      "wsgi.multithread": True,
+      "wsgi.multiprocess": True,
+      "wsgi.run_once": False,
+    }
+
+    for name, value in scope.get("headers", []):
+      name = name.decode("latin-1").upper().replace("-", "_")
+      value = value.decode("latin-1")
+      if name == "CONTENT_TYPE":
+        environ["CONTENT_TYPE"] = value
+      elif name != "CONTENT_LENGTH":
+        key = "HTTP_" + name
+        environ[key] = environ[key] + "," + value if key in environ else value
+
+    return environ
@@ -0,0 +1,114 @@
+"""
+Response body compression: gzip, plus brotli and zstd when their packages are installed
+"""
+
+import zlib
+
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+class gzipCodec:
+  name = "gzip"
+
+  def compress(self, data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+  def stream(self, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    # Z_SYNC_FLUSH ends each chunk on a byte boundary so the client can decode it before the next one
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+class brotliCodec:
+  name = "br"
+
+  def compress(self, data, level):
+    return brotli.compress(data, quality=level)
+
+  def stream(self, level):
+    compressor = brotli.Compressor(quality=level)
+    return compressor.process, compressor.flush, compressor.finish
+
+class zstdCodec:
+  name = "zstd"
+
+  def compress(self, data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+  def stream(self, level):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    return (
+      compressor.compress,
+      lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+      lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH),
+    )
+
+CODECS = {"gzip": gzipCodec()}
+if brotli:
+  CODECS["br"] = brotliCodec()
+if zstandard:
+  CODECS["zstd"] = zstdCodec()
+
+def available(preferred):
+  """
+  :param preferred: [list] encodings in order of preference e.g. ["br", "zstd", "gzip"]
+
+  :return [list] the preferred encodings whose codec is installed
+  """
+  return [name for name in preferred if name in CODECS]
+
+def negotiate(accept_encoding, encodings):
+  """
+  Pick the encoding of a response
+
+  :param accept_encoding: [object] werkzeug MIMEAccept/Accept of the request's Accept-Encoding header
+  :param encodings: [list] encodings the server offers, most preferred first
+
+  :return [str] encoding or None to send the body as it is
+  """
+  best, best_quality = None, 0
+  for name in encodings:
+    quality = accept_encoding[name]
+    if quality > best_quality:
+      best, best_quality = name, quality
+  return best
+
+def compress(data, encoding, level):
+  """
+  :param data: [bytes] body
+  :param encoding: [str] gzip, br or zstd
+  :param level: [int] compression level of the codec
+
+  :return [bytes] compressed body
+  """
+  return CODECS[encoding].compress(data, level)
+
+def compress_chunks(chunks, encoding, level):
+  """
+  Compress a streamed body chunk by chunk, each compressed chunk is flushed so the client
+  receives it without waiting for the rest of the body
+
+  :param chunks: [iterable] bytes chunks of the body
+  :param encoding: [str] gzip, br or zstd
+  :param level: [int] compression level of the codec
+
+  :return [generator] compressed chunks
+  """
+  process, flush, finish = CODECS[encoding].stream(level)
+  try:
+    for chunk in chunks:
+      if chunk:
+        data = process(chunk) + flush()
+        if data:
+          yield data
+    yield finish()
+  finally:
+    if hasattr(chunks, "close"):
+      chunks.close()
@@ -0,0 +1,94 @@
+"""
+Cache for list endpoint row counts: countCache
+
+Counts are kept per (table, filters) for COUNT_CACHE_TTL seconds and dropped as
+soon as a transaction that inserted, deleted or updated rows of the table commits.
+"""
+
+import threading
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from src.config.config import COUNT_CACHE_TTL
+
+class countCache:
+
+  _entries = {}
+  _lock = threading.Lock()
+
+  @staticmethod
+  def get(table, filters=None):
+    """
+    Get a cached count
+
+    :param table: [str] table name
+    :param filters: [dict] column => value filters the count was made with
+
+    :return [int] cached count or None if missing or expired
+    """
+    entry = countCache._entries.get((table, countCache._filters_key(filters)))
+    if entry and entry[1] > time.monotonic():
+      return entry[0]
+    return None
+
+  @staticmethod
+  def set(table, count, filters=None):
+    with countCache._lock:
+      countCache._entries[(table, countCache._filters_key(filters))] = (count, time.monotonic() + COUNT_CACHE_TTL)
+
+  @staticmethod
+  def invalidate(table, filtered_only=False):
+    """
+    Drop cached counts of a table
+
+    :param table: [str] table name
+    :param filtered_only: [bool] only drop counts made with filters (e.g. after an update)
+    """
+    with countCache._lock:
+      for key in [k for k in countCache._entries if k[0] == table and (k[1] or not filtered_only)]:
+        countCache._entries.pop(key, None)
+
+  @staticmethod
+  def clear():
+    with countCache._lock:
+      countCache._entries.clear()
+
+  @staticmethod
+  def estimate(session, table):
+    """
+    Read the planner's row estimate of a table from pg_class
+
+    :param session: [object] database session
+    :param table: [str] table name
+
+    :return [int] estimated row count or None if not available
+    """
+    if session.get_bind().dialect.name != "postgresql":
+      return None
+
+    estimate = session.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table"), {"table": table}).scalar()
+    # reltuples is -1 for tables which have never been vacuumed or analyzed
+    return estimate if estimate is not None and estimate >= 0 else None
+
+  @staticmethod
+  def _filters_key(filters):
+    return tuple(sorted(filters.items())) if filters else ()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_tables(session, flush_context):
+  changed = session.info.setdefault("count_cache_changed", {})
+  for obj in list(session.new) + list(session.deleted):
+    changed[obj.__table__.name] = False
+  for obj in session.dirty:
+    changed.setdefault(obj.__table__.name, True)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_tables(session):
+  for table, filtered_only in session.info.pop("count_cache_changed", {}).items():
+    countCache.invalidate(table, filtered_only)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_tables(session):
+  session.info.pop("count_cache_changed", None)
@@ -0,0 +1,152 @@
+"""
+Google Books API source for book uploads: googleBooksClient, fetch_google_books, volume_to_book
+
+Pages of the volumes API are fetched concurrently over pooled keep-alive connections,
+retried with exponential backoff, and their books yielded in page order as they arrive.
+"""
+
+import itertools
+import json
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import urllib3
+from urllib3.util.retry import Retry
+from src.config.config import GOOGLE_BOOKS_URL, GOOGLE_BOOKS_API_KEY, GOOGLE_BOOKS_CONCURRENCY, GOOGLE_BOOKS_RETRIES, GOOGLE_BOOKS_TIMEOUT
+
+# max results the volumes API returns per page
+PAGE_SIZE = 40
+
+def volume_to_book(volume):
+  """
+  Map a volumes API item to a book row
+
+  :param volume: [dict] item of the volumes API response
+
+  :return [dict] ISBN, title and author, None when the volume has no ISBN-13, title or author
+  """
+  info = volume.get("volumeInfo") or {}
+  isbns = [identifier.get("identifier") for identifier in info.get("industryIdentifiers") or [] if identifier.get("type") == "ISBN_13"]
+  title = (info.get("title") or "").strip()
+  author = ", ".join(info.get("authors") or []).strip()
+
+  if not isbns or not title or not author:
+    return None
+
+  return {"ISBN": isbns[0], "title": title[:100], "author": author[:100]}
+
+class googleBooksClient:
+
+  def __init__(self, url=GOOGLE_BOOKS_URL, api_key=GOOGLE_BOOKS_API_KEY, concurrency=GOOGLE_BOOKS_CONCURRENCY, retries=GOOGLE_BOOKS_RETRIES, timeout=GOOGLE_BOOKS_TIMEOUT, backoff=0.5):
+    """
+    :param url: [str] volumes API endpoint
+    :param api_key: [str] API key, empty for anonymous requests
+    :param concurrency: [int] max pages requested at the same time per fetch
+    :param retries: [int] retries of a page on connection errors, 429 and 5xx responses
+    :param timeout: [float] connect and read timeout in seconds
+    :param backoff: [float] base of the exponential backoff between retries in seconds
+    """
+    self.url = url
+    self.api_key = api_key
+    self.concurrency = concurrency
+    self.pool = urllib3.PoolManager(
+      maxsize=concurrency,
+      timeout=urllib3.Timeout(total=timeout),
+      retries=Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+        respect_retry_after_header=True,
+      ),
+    )
+    self.requests = 0
+    self._lock = threading.Lock()
+
+  def fetch(self, keyword, number_of_books):
+    """
+    Fetch books matching a keyword. Up to concurrency pages are in flight while the books of the
+    earlier pages are yielded, no more pages are requested once enough books were found
+
+    :param keyword: [str] search terms
+    :param number_of_books: [int] max number of books to return
+
+    :return [generator] book rows with distinct ISBNs
+    """
+    if number_of_books <= 0:
+      return
+
+    starts = itertools.count(0, PAGE_SIZE)
+    seen = set()
+    pages = deque()
+
+    with ThreadPoolExecutor(self.concurrency, thread_name_prefix="google-books") as executor:
+      try:
+        for start in itertools.islice(starts, min(self.concurrency, -(-number_of_books // PAGE_SIZE))):
+          pages.append(executor.submit(self.fetch_page, keyword, start))
+
+        while pages:
+          items = pages.popleft().result()
+          # the volumes API answers with no items past the last match
+          if not items:
+            return
+          # keep the window full while the pages in flight may still be short of books
+          if len(seen) + len(items) + len(pages) * PAGE_SIZE < number_of_books:
+            pages.append(executor.submit(self.fetch_page, keyword, next(starts)))
+
+          found = len(seen)
+          for volume in items:
+            book = volume_to_book(volume)
+            if book and book["ISBN"] not in seen:
+              seen.add(book["ISBN"])
+              yield book
+              if len(seen) >= number_of_books:
+                return
+
+          # volumes without an ISBN-13 or repeated ones left the request short, carry on
+          # unless the page had nothing new at all
+          if not pages and len(seen) > found:
+            pages.append(executor.submit(self.fetch_page, keyword, next(starts)))
+      finally:
+        for page in pages:
+          page.cancel()
+
+  def fetch_page(self, keyword, start):
+    """
+    :param keyword: [str] search terms
+    :param start: [int] index of the first result
+
+    :return [list] volumes of the page
+    """
+    fields = {"q": keyword, "startIndex": start, "maxResults": PAGE_SIZE}
+    if self.api_key:
+      fields["key"] = self.api_key
+
+    with self._lock:
+      self.requests += 1
+
+    response = self.pool.request("GET", self.url, fields=fields, preload_content=False)
+    try:
+      if response.status >= 400:
+        raise IOError("Google Books API answered {} for {!r} from {}".format(response.status, keyword, start))
+      return json.load(response).get("items") or []
+    finally:
+      response.release_conn()
+
+_default_client = None
+
+def fetch_google_books(keyword, number_of_books):
+  """
+  Books source of the ingestion worker, fetches through a client shared by the process
+
+  :param keyword: [str] search terms
+  :param number_of_books: [int] max number of books to return
+
+  :return [generator] book rows
+  """
+  global _default_client
+  if _default_client is None:
+    _default_client = googleBooksClient()
+
+  return _default_client.fetch(keyword, number_of_books)
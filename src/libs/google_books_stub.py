@@ -0,0 +1,148 @@
+"""
+Local stand-in for the Google Books volumes API: googleBooksStub
+
+Replays responses recorded in a JSON file of keyword => list of pages, as returned by the
+volumes API for startIndex 0, 40, 80, ... with maxResults=40.
+
+  python -m src.libs.google_books_stub serve tests/fixtures/google_books_volumes.json --port 8001 --latency 0.05
+  GOOGLE_BOOKS_URL=http://127.0.0.1:8001/books/v1/volumes ./worker.py
+
+  python -m src.libs.google_books_stub record recordings.json python --pages 3
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.libs.google_books import PAGE_SIZE, googleBooksClient
+
+class googleBooksStub:
+
+  def __init__(self, recordings, host="127.0.0.1", port=0, latency=0, fail_every=0):
+    """
+    :param recordings: [dict] keyword => recorded response pages
+    :param port: [int] port to listen on, 0 picks a free one
+    :param latency: [float] seconds every response is delayed, to mimic the real API
+    :param fail_every: [int] answer every nth request with a 503, 0 never fails
+    """
+    self.recordings = recordings
+    self.latency = latency
+    self.fail_every = fail_every
+    self.requests = 0
+    self._lock = threading.Lock()
+    self.server = ThreadingHTTPServer((host, port), self._handler())
+    self.server.daemon_threads = True
+    self.url = "http://{}:{}/books/v1/volumes".format(*self.server.server_address)
+
+  @classmethod
+  def from_file(cls, path, **kwargs):
+    with open(path) as recordings:
+      return cls(json.load(recordings), **kwargs)
+
+  def start(self):
+    threading.Thread(target=self.server.serve_forever, args=(0.05,), name="google-books-stub", daemon=True).start()
+    return self
+
+  def stop(self):
+    self.server.shutdown()
+    self.server.server_close()
+
+  def response(self, keyword, start):
+    """
+    :return [dict] recorded page holding the startIndex
+    """
+    pages = self.recordings.get(keyword) or []
+    if start % PAGE_SIZE == 0 and start // PAGE_SIZE < len(pages):
+      return pages[start // PAGE_SIZE]
+
+    return {"kind": "books#volumes", "totalItems": pages[0]["totalItems"] if pages else 0}
+
+  def _handler(self):
+    stub = self
+
+    class handler(BaseHTTPRequestHandler):
+      protocol_version = "HTTP/1.1"
+
+      def do_GET(self):
+        with stub._lock:
+          stub.requests += 1
+          failing = stub.fail_every and stub.requests % stub.fail_every == 0
+
+        if stub.latency:
+          time.sleep(stub.latency)
+
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        if failing:
+          status, body = 503, {"error": {"code": 503, "message": "Backend Error"}}
+        else:
+          status, body = 200, stub.response(query.get("q", [""])[0], int(query.get("startIndex", ["0"])[0]))
+
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+      def log_message(self, format, *args):
+        pass
+
+    return handler
+
+def record(path, keyword, pages, client=None):
+  """
+  Record pages of the real volumes API for a keyword into a recordings file
+
+  :param path: [str] recordings file, created or updated
+  :param keyword: [str] search terms
+  :param pages: [int] number of pages to record
+  """
+  client = client or googleBooksClient()
+  try:
+    with open(path) as recordings_file:
+      recordings = json.load(recordings_file)
+  except FileNotFoundError:
+    recordings = {}
+
+  recorded = []
+  for start in range(0, pages * PAGE_SIZE, PAGE_SIZE):
+    response = client.pool.request("GET", client.url, fields={"q": keyword, "startIndex": start, "maxResults": PAGE_SIZE, **({"key": client.api_key} if client.api_key else {})})
+    if response.status >= 400:
+      raise IOError("Google Books API answered {} for {!r} from {}".format(response.status, keyword, start))
+    recorded.append(json.loads(response.data))
+    if not recorded[-1].get("items"):
+      break
+
+  recordings[keyword] = recorded
+  with open(path, "w") as recordings_file:
+    json.dump(recordings, recordings_file, indent=1)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  commands = parser.add_subparsers(dest="command", required=True)
+
+  serve = commands.add_parser("serve", help="replay a recordings file")
+  serve.add_argument("recordings")
+  serve.add_argument("--host", default="127.0.0.1")
+  serve.add_argument("--port", type=int, default=8001)
+  serve.add_argument("--latency", type=float, default=0)
+  serve.add_argument("--fail-every", type=int, default=0)
+
+  recorder = commands.add_parser("record", help="record pages of the real API")
+  recorder.add_argument("recordings")
+  recorder.add_argument("keyword")
+  recorder.add_argument("--pages", type=int, default=3)
+
+  args = parser.parse_args()
+  if args.command == "record":
+    record(args.recordings, args.keyword, args.pages)
+  else:
+    stub = googleBooksStub.from_file(args.recordings, host=args.host, port=args.port, latency=args.latency, fail_every=args.fail_every)
+    print("Serving {} on {}".format(args.recordings, stub.url))
+    try:
+      stub.server.serve_forever()
+    except KeyboardInterrupt:
+      stub.server.server_close()
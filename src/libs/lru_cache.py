@@ -0,0 +1,95 @@
+"""
+Size bounded, TTL expiring in-process cache: lruCache
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+class lruCache:
+
+  def __init__(self, max_size, ttl):
+    """
+    :param max_size: [int] max number of entries, 0 disables the cache
+    :param ttl: [int] seconds an entry is served for
+    """
+    self.max_size = max_size
+    self.ttl = ttl
+    # bumped by every invalidation so lookups which raced a write don't store stale values
+    self.generation = 0
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  @property
+  def enabled(self):
+    return self.max_size > 0
+
+  def get(self, key):
+    """
+    Get a cached value and mark it as recently used
+
+    :param key: [hashable] cache key
+
+    :return [object] cached value or None when missing or expired
+    """
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None or entry[1] <= time.monotonic():
+        if entry is not None:
+          del self._entries[key]
+        self.misses += 1
+        return None
+
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return entry[0]
+
+  def set_many(self, items, generation=None):
+    """
+    Store values, evicting the least recently used entries beyond max_size
+
+    :param items: [dict] key => value
+    :param generation: [int] value of self.generation read before loading the values, skip storing if it changed since
+    """
+    if not self.enabled:
+      return
+
+    with self._lock:
+      if generation is not None and generation != self.generation:
+        return
+
+      expires_at = time.monotonic() + self.ttl
+      for key, value in items.items():
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+
+      while len(self._entries) > self.max_size:
+        self._entries.popitem(last=False)
+        self.evictions += 1
+
+  def invalidate(self, *keys):
+    with self._lock:
+      self.generation += 1
+      for key in keys:
+        self._entries.pop(key, None)
+
+  def clear(self):
+    with self._lock:
+      self.generation += 1
+      self._entries.clear()
+
+  def stats(self):
+    """
+    :return [dict] size, limits and hit/miss/eviction counters
+    """
+    return {
+      "size": len(self._entries),
+      "max_size": self.max_size,
+      "ttl": self.ttl,
+      "hits": self.hits,
+      "misses": self.misses,
+      "evictions": self.evictions,
+    }
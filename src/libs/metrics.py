@@ -0,0 +1,264 @@
+"""
+Request metrics in the Prometheus text format: requestMetrics
+
+Every thread aggregates its own requests, so recording one takes no lock; a scrape sums the
+threads up, and a thread's totals are folded into the process totals when it exits. With a
+metrics directory every process also saves its totals there, and a scrape of any process adds
+the totals saved by the others. The saves of exited processes are folded into one file.
+"""
+
+import atexit
+import bisect
+import fcntl
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+
+# upper bounds of the histogram buckets
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+SIZE_BUCKETS     = [100, 1000, 10000, 100000, 1000000, 10000000]
+
+# name, help, buckets of the histograms recorded per request
+HISTOGRAMS = [
+  ("http_request_duration_seconds", "Time spent handling the request", DURATION_BUCKETS),
+  ("http_response_size_bytes", "Size of the response body, 0 for streamed responses", SIZE_BUCKETS),
+  ("http_request_db_seconds", "Time spent executing database statements for the request", DURATION_BUCKETS),
+]
+
+# totals of the processes which exited, in the metrics directory
+EXITED_FILE = "metrics_exited.json"
+
+class _storeRef:
+  """
+  Held by the thread-local of a thread, freed when the thread exits
+  """
+  __slots__ = ["store", "__weakref__"]
+
+  def __init__(self, store):
+    self.store = store
+
+class requestMetrics:
+
+  def __init__(self, directory=None, flush_interval=10):
+    """
+    :param directory: [str] directory shared by the processes of the app, None for a single process
+    :param flush_interval: [float] seconds between two saves of the process totals to the directory
+    """
+    self.directory = directory
+    self.flush_interval = flush_interval
+    self._local = threading.local()
+    self._stores = []
+    # totals of the threads which exited
+    self._exited = {}
+    self._lock = threading.Lock()
+    self._flusher = None
+    self._pid = None
+    atexit.register(self.flush)
+    # a forked worker starts counting from zero, the parent's totals are its own
+    os.register_at_fork(after_in_child=self._reset)
+
+  def observe(self, route, method, status, duration, size, db_time):
+    """
+    Record a request, called from the thread which handled it
+
+    :param route: [str] url rule of the request, e.g. /v1/books/<book_id>
+    """
+    ref = getattr(self._local, "ref", None)
+    if ref is None:
+      ref = self._local.ref = _storeRef({})
+      with self._lock:
+        self._stores.append(ref.store)
+      weakref.finalize(ref, self._retire, ref.store, os.getpid())
+      self._ensure_flusher()
+    store = ref.store
+
+    key = (route, method, str(status))
+    values = store.get(key)
+    if values is None:
+      values = store[key] = [0] + [[0] * (len(buckets) + 1) for _, _, buckets in HISTOGRAMS] + [0.0] * len(HISTOGRAMS)
+
+    values[0] += 1
+    for index, (value, (_, _, buckets)) in enumerate(zip([duration, size, db_time], HISTOGRAMS)):
+      values[1 + index][bisect.bisect_left(buckets, value)] += 1
+      values[1 + len(HISTOGRAMS) + index] += value
+
+  def totals(self):
+    """
+    :return [dict] "route<TAB>method<TAB>status" => [count, histogram bucket counts..., histogram sums...] of this process
+    """
+    totals = {}
+    with self._lock:
+      stores = list(self._stores)
+      for key, values in self._exited.items():
+        self._add(totals, key, values)
+
+    for store in stores:
+      # dict() copies in one step, a request thread may add keys meanwhile
+      for key, values in dict(store).items():
+        self._add(totals, "\t".join(key), values)
+
+    return totals
+
+  def collect(self):
+    """
+    :return [dict] totals of every process sharing the directory, or of this process
+    """
+    totals = self.totals()
+    if not self.directory:
+      return totals
+
+    own = self._path(os.getpid())
+    for path in glob.glob(os.path.join(self.directory, "metrics_*.json")):
+      if path != own:
+        for key, values in self._read(path).items():
+          self._add(totals, key, values)
+
+    return totals
+
+  def render(self):
+    """
+    :return [str] metrics in the Prometheus text exposition format
+    """
+    totals = sorted(self.collect().items())
+    lines = ["# HELP http_requests_total Number of requests handled", "# TYPE http_requests_total counter"]
+
+    for key, values in totals:
+      lines.append("http_requests_total{{{}}} {}".format(self._labels(key), values[0]))
+
+    for index, (name, help, buckets) in enumerate(HISTOGRAMS):
+      lines.append("# HELP {} {}".format(name, help))
+      lines.append("# TYPE {} histogram".format(name))
+      for key, values in totals:
+        labels = self._labels(key)
+        cumulative = 0
+        for bound, count in zip(buckets + ["+Inf"], values[1 + index]):
+          cumulative += count
+          lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, cumulative))
+        lines.append("{}_sum{{{}}} {}".format(name, labels, round(values[1 + len(HISTOGRAMS) + index], 6)))
+        lines.append("{}_count{{{}}} {}".format(name, labels, values[0]))
+
+    return "\n".join(lines) + "\n"
+
+  def flush(self):
+    """
+    Save the totals of this process to the directory, replacing the previous save atomically
+    """
+    if not self.directory:
+      return
+
+    os.makedirs(self.directory, exist_ok=True)
+    self._write(self.totals(), self._path(os.getpid()))
+    self._prune()
+
+  def _prune(self):
+    """
+    Fold the saves of the processes which exited into EXITED_FILE, the directory would otherwise
+    keep a file per worker ever started and every scrape would read them all
+    """
+    exited = []
+    for path in glob.glob(os.path.join(self.directory, "metrics_*.json")):
+      pid = os.path.basename(path)[len("metrics_"):-len(".json")]
+      if pid.isdigit() and not self._alive(int(pid)):
+        exited.append(path)
+    if not exited:
+      return
+
+    # the processes sharing the directory prune one at a time
+    with open(os.path.join(self.directory, ".metrics.lock"), "w") as lock:
+      fcntl.flock(lock, fcntl.LOCK_EX)
+      totals = self._read(os.path.join(self.directory, EXITED_FILE))
+      folded = [path for path in exited if os.path.exists(path)]
+      if not folded:
+        return
+      for path in folded:
+        for key, values in self._read(path).items():
+          self._add(totals, key, values)
+      self._write(totals, os.path.join(self.directory, EXITED_FILE))
+      for path in folded:
+        os.remove(path)
+
+  def _retire(self, store, pid):
+    # the thread exited, a forked child drops the stores of its parent's threads instead
+    if pid != os.getpid():
+      return
+    with self._lock:
+      self._stores = [other for other in self._stores if other is not store]
+      for key, values in store.items():
+        self._add(self._exited, "\t".join(key), values)
+
+  def _read(self, path):
+    """
+    :return [dict] totals saved to path, empty when it is missing
+    """
+    try:
+      with open(path) as saved:
+        return json.load(saved)
+    except (OSError, ValueError):
+      # removed by a prune, or written by a process which was killed mid-save
+      return {}
+
+  def _write(self, totals, path):
+    # replaced atomically, a scrape never reads half a save
+    handle, temporary = tempfile.mkstemp(dir=self.directory, prefix=".metrics_")
+    with os.fdopen(handle, "w") as saved:
+      json.dump(totals, saved)
+    os.replace(temporary, path)
+
+  def _ensure_flusher(self):
+    # one saving thread per process, forked workers start their own
+    if not self.directory or self._pid == os.getpid():
+      return
+
+    with self._lock:
+      if self._pid != os.getpid():
+        self._pid = os.getpid()
+        self._flusher = threading.Thread(target=self._flush_forever, name="metrics-flusher", daemon=True)
+        self._flusher.start()
+
+  def _flush_forever(self):
+    while True:
+      time.sleep(self.flush_interval)
+      try:
+        self.flush()
+      except OSError:
+        pass
+
+  def _reset(self):
+    self._local = threading.local()
+    self._stores = []
+    self._exited = {}
+    self._lock = threading.Lock()
+
+  def _path(self, pid):
+    return os.path.join(self.directory, "metrics_{}.json".format(pid))
+
+  @staticmethod
+  def _alive(pid):
+    try:
+      os.kill(pid, 0)
+    except ProcessLookupError:
+      return False
+    except PermissionError:
+      pass
+    return True
+
+  @staticmethod
+  def _add(totals, key, values):
+    total = totals.get(key)
+    if total is None:
+      totals[key] = [values[0]] + [list(counts) for counts in values[1:1 + len(HISTOGRAMS)]] + list(values[1 + len(HISTOGRAMS):])
+      return
+
+    total[0] += values[0]
+    for index in range(len(HISTOGRAMS)):
+      total[1 + index] = [a + b for a, b in zip(total[1 + index], values[1 + index])]
+      total[1 + len(HISTOGRAMS) + index] += values[1 + len(HISTOGRAMS) + index]
+
+  @staticmethod
+  def _labels(key):
+    route, method, status = [value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in key.split("\t")]
+    return 'route="{}",method="{}",status="{}"'.format(route, method, status)
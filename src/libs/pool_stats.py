@@ -0,0 +1,100 @@
+"""
+Connection pool metrics: timedQueuePool, poolStats
+
+timedQueuePool is a QueuePool which times how long every checkout waits for a connection,
+timedAsyncQueuePool the same for async engines. Connects, checkouts and invalidations are
+counted from the pool events of the class.
+"""
+
+import bisect
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# upper bounds in seconds of the wait time histogram buckets
+WAIT_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30]
+
+class poolStats:
+
+  _lock = threading.Lock()
+  _wait_counts = [0] * (len(WAIT_BUCKETS) + 1)
+  _wait_sum = 0.0
+  _counters = {"connects": 0, "checkouts": 0, "invalidations": 0, "timeouts": 0}
+
+  @staticmethod
+  def observe_wait(seconds):
+    with poolStats._lock:
+      poolStats._wait_counts[bisect.bisect_left(WAIT_BUCKETS, seconds)] += 1
+      poolStats._wait_sum += seconds
+
+  @staticmethod
+  def increment(counter):
+    with poolStats._lock:
+      poolStats._counters[counter] += 1
+
+  @staticmethod
+  def stats(pool):
+    """
+    :param pool: [object] pool of the engine
+
+    :return [dict] connection counts of the pool, event counters and the cumulative wait time histogram
+    """
+    result = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+      result.update({
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        # negative while fewer than size connections were opened yet
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+        "timeout": pool.timeout(),
+      })
+
+    with poolStats._lock:
+      result.update(poolStats._counters)
+      buckets = []
+      total = 0
+      for bound, count in zip(WAIT_BUCKETS + ["+Inf"], poolStats._wait_counts):
+        total += count
+        buckets.append({"le": bound, "count": total})
+      result["wait_seconds"] = {"buckets": buckets, "count": total, "sum": round(poolStats._wait_sum, 6)}
+
+    return result
+
+  @staticmethod
+  def reset():
+    with poolStats._lock:
+      poolStats._wait_counts = [0] * (len(WAIT_BUCKETS) + 1)
+      poolStats._wait_sum = 0.0
+      poolStats._counters = dict.fromkeys(poolStats._counters, 0)
+
+class timedQueuePool(QueuePool):
+
+  def _do_get(self):
+    # waits while every connection is checked out and the overflow is used up
+    start = time.perf_counter()
+    try:
+      return super()._do_get()
+    except exc.TimeoutError:
+      poolStats.increment("timeouts")
+      raise
+    finally:
+      poolStats.observe_wait(time.perf_counter() - start)
+
+class timedAsyncQueuePool(timedQueuePool, AsyncAdaptedQueuePool):
+  pass
+
+@event.listens_for(timedQueuePool, "connect")
+def _count_connect(dbapi_connection, connection_record):
+  poolStats.increment("connects")
+
+@event.listens_for(timedQueuePool, "checkout")
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+  poolStats.increment("checkouts")
+
+@event.listens_for(timedQueuePool, "invalidate")
+def _count_invalidate(dbapi_connection, connection_record, exception):
+  poolStats.increment("invalidations")
@@ -0,0 +1,253 @@
+"""
+In-process autocomplete index: prefixIndex
+
+Every word of a document's texts starts a key running to the end of the text, so a prefix
+matches at any word boundary ("silent ri" finds "The Silent River"). The keys are kept in a
+sorted array searched with bisect. Prefixes matching many keys (short ones) have their top
+results cached until a write changes them.
+"""
+
+import bisect
+import heapq
+import re
+import threading
+import time
+
+WORD = re.compile(r"\w+")
+
+def normalize(text):
+  return " ".join(text.lower().split())
+
+def sort_key(popularity, texts):
+  """
+  Most popular first, then alphabetically by the first text
+
+  :param popularity: [number|tuple] higher is more popular, tuples compare item by item, a number is
+                     compared as a tuple of one item so that mixed shapes still sort
+  """
+  popularity = popularity if isinstance(popularity, tuple) else (popularity,)
+  return (tuple(-value for value in popularity), normalize(texts[0] or "") if texts else "")
+
+class prefixIndex:
+
+  def __init__(self, loader=None, reload_interval=0, max_key_length=40, scan_limit=2000, max_cached=1000, default_popularity=0):
+    """
+    :param loader: [function] () => iterable of (doc_id, texts, popularity, payload), reads every document,
+                   texts is a list of strings and popularity a number or a tuple of numbers
+    :param reload_interval: [int] seconds after which a search triggers a background reload, 0 never reloads
+    :param max_key_length: [int] keys are cut to this many characters, longer prefixes are cut too
+    :param scan_limit: [int] prefixes matching more keys than this have their results cached
+    :param max_cached: [int] max cached prefixes
+    :param default_popularity: [number|tuple] popularity of documents added without one, of the loader's shape
+    """
+    self.loader = loader
+    self.reload_interval = reload_interval
+    self.max_key_length = max_key_length
+    self.scan_limit = scan_limit
+    self.max_cached = max_cached
+    self.default_popularity = default_popularity
+
+    self._keys = []
+    self._ids = []
+    # doc_id => (keys, sort key, payload, texts, popularity)
+    self._docs = {}
+    # (prefix, k) => (top doc_ids, (sort key, doc_id) of the k-th one or None when fewer matched)
+    self._cached = {}
+    # bumped by every write so that searches which raced one don't cache their result
+    self._version = 0
+    self._lock = threading.Lock()
+    self._load_lock = threading.Lock()
+    self._loaded_at = None
+    self._reloading = False
+    # writes made while a reload reads the documents, applied again on its result
+    self._replay = []
+
+  def _doc_keys(self, texts):
+    keys = set()
+    for text in texts:
+      text = normalize(text or "")
+      for word in WORD.finditer(text):
+        keys.add(text[word.start():word.start() + self.max_key_length])
+    return keys
+
+  def load(self, documents):
+    """
+    Replace the content of the index
+
+    :param documents: [iterable] (doc_id, texts, popularity, payload) tuples
+    """
+    docs = {}
+    entries = []
+    for doc_id, texts, popularity, payload in documents:
+      keys = self._doc_keys(texts)
+      docs[doc_id] = (keys, sort_key(popularity, texts), payload, texts, popularity)
+      entries.extend((key, doc_id) for key in keys)
+    entries.sort()
+
+    with self._lock:
+      self._keys = [key for key, _ in entries]
+      self._ids = [doc_id for _, doc_id in entries]
+      self._docs = docs
+      self._cached = {}
+      self._loaded_at = time.monotonic()
+
+  def ensure_loaded(self):
+    """
+    Load the index on first use and start a background reload once it is older than reload_interval
+    """
+    if self._loaded_at is None:
+      with self._load_lock:
+        if self._loaded_at is None and self.loader:
+          self._start_reload()
+          self._reload(initial=True)
+      return
+
+    if self.reload_interval and not self._reloading and time.monotonic() - self._loaded_at > self.reload_interval:
+      if self._start_reload():
+        threading.Thread(target=self._reload, name="prefix-index-reload", daemon=True).start()
+
+  def _start_reload(self):
+    with self._lock:
+      if self._reloading:
+        return False
+      self._reloading = True
+      self._replay = []
+      return True
+
+  def _reload(self, initial=False):
+    try:
+      self.load(self.loader())
+    except Exception:
+      if initial:
+        raise
+      # keep serving the current content, retried after another reload_interval
+      with self._lock:
+        self._loaded_at = time.monotonic()
+    finally:
+      with self._lock:
+        self._reloading = False
+        replay, self._replay = self._replay, []
+      for method, args in replay:
+        getattr(self, method)(*args)
+
+  def add(self, doc_id, texts, popularity=None, payload=None):
+    """
+    Add a document or replace its texts and payload
+
+    :param popularity: [number|tuple] None keeps the popularity of an indexed document, default_popularity for a new one
+    """
+    keys = self._doc_keys(texts)
+    with self._lock:
+      if self._reloading:
+        self._replay.append(("add", (doc_id, texts, popularity, payload)))
+      elif self._loaded_at is None:
+        # not loaded yet, the first search reads it from the loader
+        return
+      if popularity is None:
+        popularity = self._docs[doc_id][4] if doc_id in self._docs else self.default_popularity
+      self._remove(doc_id)
+      for key in keys:
+        position = bisect.bisect_left(self._keys, key)
+        self._keys.insert(position, key)
+        self._ids.insert(position, doc_id)
+      rank = sort_key(popularity, texts)
+      self._docs[doc_id] = (keys, rank, payload, texts, popularity)
+      self._invalidate(doc_id, keys, (rank, doc_id))
+
+  def remove(self, doc_id):
+    with self._lock:
+      if self._reloading:
+        self._replay.append(("remove", (doc_id,)))
+      elif self._loaded_at is None:
+        return
+      self._remove(doc_id)
+
+  def set_popularity(self, doc_id, popularity):
+    """
+    Change the popularity of an indexed document, unknown documents are ignored
+    """
+    with self._lock:
+      if self._reloading:
+        self._replay.append(("set_popularity", (doc_id, popularity)))
+      elif self._loaded_at is None:
+        return
+      doc = self._docs.get(doc_id)
+      if doc:
+        rank = sort_key(popularity, doc[3])
+        self._docs[doc_id] = (doc[0], rank, doc[2], doc[3], popularity)
+        self._invalidate(doc_id, doc[0], (rank, doc_id))
+
+  def _remove(self, doc_id):
+    doc = self._docs.pop(doc_id, None)
+    if not doc:
+      return
+    for key in doc[0]:
+      position = bisect.bisect_left(self._keys, key)
+      while self._ids[position] != doc_id:
+        position += 1
+      del self._keys[position]
+      del self._ids[position]
+    self._invalidate(doc_id, doc[0])
+
+  def _invalidate(self, doc_id, keys, rank=None):
+    """
+    Drop the cached results a write changes: the ones listing the document, and the ones of its prefixes
+    it now ranks into. A new, unpopular document keeps the cached results of short prefixes.
+
+    :param rank: [tuple] (sort key, doc_id) of the document after the write, None when it was removed
+    """
+    self._version += 1
+    for cached, (ids, bound) in list(self._cached.items()):
+      if doc_id in ids or (rank is not None and (bound is None or rank < bound) and any(key.startswith(cached[0]) for key in keys)):
+        del self._cached[cached]
+
+  def search(self, prefix, k=10):
+    """
+    Most popular documents with a word boundary starting with prefix
+
+    :param prefix: [str] typed text, case and repeated spaces are ignored
+    :param k: [int] max results
+
+    :return [list] (doc_id, payload) pairs, most popular first
+    """
+    self.ensure_loaded()
+    prefix = normalize(prefix)[:self.max_key_length]
+    if not prefix:
+      return []
+
+    with self._lock:
+      cached = self._cached.get((prefix, k))
+      if cached is not None:
+        return [(doc_id, self._docs[doc_id][2]) for doc_id in cached[0]]
+
+      start = bisect.bisect_left(self._keys, prefix)
+      end = bisect.bisect_left(self._keys, prefix + "\U0010ffff", start)
+      ids = self._ids[start:end]
+      docs = self._docs
+      version = self._version
+
+    # ranked without the lock, a short prefix matches most documents and would hold up every other search and write
+    ranked = []
+    for doc_id in set(ids):
+      doc = docs.get(doc_id)
+      if doc:
+        ranked.append((doc[1], doc_id, doc[2]))
+    top = heapq.nsmallest(k, ranked)
+
+    if len(ids) > self.scan_limit:
+      with self._lock:
+        if version == self._version and len(self._cached) < self.max_cached:
+          self._cached[(prefix, k)] = ([doc_id for _, doc_id, _ in top], top[-1][:2] if len(top) == k else None)
+
+    return [(doc_id, payload) for _, doc_id, payload in top]
+
+  def stats(self):
+    """
+    :return [dict] documents, keys, cached prefixes and seconds since the last load
+    """
+    return {
+      "documents": len(self._docs),
+      "keys": len(self._keys),
+      "cached_prefixes": len(self._cached),
+      "loaded_seconds_ago": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else None,
+    }
@@ -0,0 +1,107 @@
+"""
+Message queue clients: localQueue, queue_client
+
+queue_client() returns the process wide client of QUEUE_BACKEND, either a boto3 SQS
+client or localQueue, an in-memory stand-in implementing the SQS calls the app uses.
+"""
+
+import threading
+import time
+import uuid
+
+import boto3
+from src.config.config import QUEUE_BACKEND, SQS_REGION
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def queue_client(backend=None):
+  """
+  Shared queue client, created on first use. boto3 clients are thread safe, so one is reused by every thread
+
+  :param backend: [str] "sqs" or "local", defaults to QUEUE_BACKEND
+
+  :return [object] client
+  """
+  backend = backend or QUEUE_BACKEND
+  with _clients_lock:
+    if backend not in _clients:
+      _clients[backend] = localQueue() if backend == "local" else boto3.client("sqs", region_name=SQS_REGION)
+
+    return _clients[backend]
+
+class localQueue:
+  """
+  In-memory queue answering send_message(_batch), receive_message and delete_message(_batch)
+  like SQS does, QueueUrl is ignored. Received messages are hidden for VisibilityTimeout
+  seconds and delivered again unless they are deleted before that.
+  """
+
+  def __init__(self):
+    self._messages = []
+    self._in_flight = {}
+    self._condition = threading.Condition()
+    self.batches = 0
+
+  def send_message(self, QueueUrl, MessageBody, **kwargs):
+    response = self.send_message_batch(QueueUrl, [{"Id": "0", "MessageBody": MessageBody}])
+    return {"MessageId": response["Successful"][0]["MessageId"]}
+
+  def send_message_batch(self, QueueUrl, Entries):
+    if not 0 < len(Entries) <= 10:
+      raise ValueError("A batch holds 1 to 10 entries")
+
+    successful = []
+    with self._condition:
+      self.batches += 1
+      for entry in Entries:
+        message_id = uuid.uuid4().hex
+        self._messages.append({"MessageId": message_id, "Body": entry["MessageBody"]})
+        successful.append({"Id": entry["Id"], "MessageId": message_id})
+      self._condition.notify_all()
+
+    return {"Successful": successful, "Failed": []}
+
+  def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, VisibilityTimeout=30, **kwargs):
+    deadline = time.monotonic() + WaitTimeSeconds
+    with self._condition:
+      while True:
+        self._release_expired()
+        if self._messages or time.monotonic() >= deadline:
+          break
+        self._condition.wait(min(deadline - time.monotonic(), 0.1))
+
+      messages = self._messages[:MaxNumberOfMessages]
+      del self._messages[:MaxNumberOfMessages]
+
+      received = []
+      for message in messages:
+        receipt_handle = uuid.uuid4().hex
+        self._in_flight[receipt_handle] = (message, time.monotonic() + VisibilityTimeout)
+        received.append({**message, "ReceiptHandle": receipt_handle})
+
+    return {"Messages": received} if received else {}
+
+  def delete_message(self, QueueUrl, ReceiptHandle):
+    with self._condition:
+      self._in_flight.pop(ReceiptHandle, None)
+    return {}
+
+  def delete_message_batch(self, QueueUrl, Entries):
+    with self._condition:
+      for entry in Entries:
+        self._in_flight.pop(entry["ReceiptHandle"], None)
+    return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+  def purge(self):
+    with self._condition:
+      self._messages = []
+      self._in_flight = {}
+      self.batches = 0
+
+  def _release_expired(self):
+    now = time.monotonic()
+    for receipt_handle, (message, visible_at) in list(self._in_flight.items()):
+      if visible_at <= now:
+        del self._in_flight[receipt_handle]
+        self._messages.append(message)
@@ -0,0 +1,135 @@
+"""
+Buffered, batching queue producer: sqsProducer
+
+Messages are handed to a background thread which sends them with SendMessageBatch,
+as soon as a batch is full or the oldest message waited flush_interval seconds.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger("book_status_api.sqs_producer")
+
+class sqsProducer:
+
+  def __init__(self, client_factory, queue_url, batch_size=10, flush_interval=0.2, max_pending=10000, retries=3):
+    """
+    :param client_factory: [function] returns the queue client, called from the sender thread
+    :param queue_url: [str] url of the queue
+    :param batch_size: [int] max messages per SendMessageBatch, up to 10
+    :param flush_interval: [float] max seconds a message waits for its batch to fill
+    :param max_pending: [int] max messages buffered, send() returns False beyond that
+    :param retries: [int] attempts made to send a message before it is dropped
+    """
+    self.client_factory = client_factory
+    self.queue_url = queue_url
+    self.batch_size = batch_size
+    self.flush_interval = flush_interval
+    self.retries = retries
+    self.sent = 0
+    self.failed = 0
+    self.batches = 0
+    self._queue = queue.Queue(max_pending)
+    self._lock = threading.Lock()
+    self._thread = None
+    self._pid = None
+    atexit.register(self.flush, 5)
+
+  def send(self, body):
+    """
+    Buffer a message, it is sent from the background thread
+
+    :param body: [str] message body
+
+    :return [bool] False when the buffer is full and the message was not accepted
+    """
+    self._ensure_thread()
+    try:
+      self._queue.put_nowait(body)
+      return True
+    except queue.Full:
+      return False
+
+  def flush(self, timeout=None):
+    """
+    Wait for the buffered messages to be sent
+
+    :param timeout: [float] max seconds to wait, None to wait until they are
+
+    :return [bool] True when nothing is left to send
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with self._queue.all_tasks_done:
+      while self._queue.unfinished_tasks:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+          return False
+        self._queue.all_tasks_done.wait(remaining)
+
+    return True
+
+  def stats(self):
+    return {"pending": self._queue.qsize(), "sent": self.sent, "failed": self.failed, "batches": self.batches}
+
+  def _ensure_thread(self):
+    # a forked worker process doesn't inherit the parent's thread, start its own
+    if self._pid == os.getpid() and self._thread.is_alive():
+      return
+
+    with self._lock:
+      if self._pid != os.getpid() or not self._thread.is_alive():
+        self._thread = threading.Thread(target=self._run, name="sqs-producer", daemon=True)
+        self._pid = os.getpid()
+        self._thread.start()
+
+  def _run(self):
+    client = self.client_factory()
+    while True:
+      batch = [self._queue.get()]
+      deadline = time.monotonic() + self.flush_interval
+      while len(batch) < self.batch_size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+          break
+        try:
+          batch.append(self._queue.get(timeout=remaining))
+        except queue.Empty:
+          break
+
+      try:
+        self._send_batch(client, batch)
+      finally:
+        for _ in batch:
+          self._queue.task_done()
+
+  def _send_batch(self, client, batch):
+    entries = [{"Id": str(index), "MessageBody": body} for index, body in enumerate(batch)]
+
+    for attempt in range(self.retries):
+      if attempt:
+        time.sleep(0.1 * 2 ** attempt)
+
+      try:
+        response = client.send_message_batch(QueueUrl=self.queue_url, Entries=entries)
+      except Exception as e:
+        logger.warning("SendMessageBatch failed: %s", e)
+        continue
+
+      self.batches += 1
+      self.sent += len(response.get("Successful", []))
+      failed = {failure["Id"] for failure in response.get("Failed", []) if not failure.get("SenderFault")}
+      dropped = [failure for failure in response.get("Failed", []) if failure.get("SenderFault")]
+      if dropped:
+        self.failed += len(dropped)
+        logger.error("%d messages rejected by the queue: %s", len(dropped), dropped[0].get("Message"))
+
+      entries = [entry for entry in entries if entry["Id"] in failed]
+      if not entries:
+        return
+
+    self.failed += len(entries)
+    logger.error("Dropped %d messages after %d attempts", len(entries), self.retries)
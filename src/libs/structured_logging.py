@@ -0,0 +1,129 @@
+"""
+Logging pipeline: jsonFormatter, requestContextFilter, structuredQueueHandler, setup_logging
+
+Records are put on an in-memory queue by the request thread and written by a listener
+thread, so log I/O never blocks a request. Info records of busy routes can be sampled.
+"""
+
+import atexit
+import copy
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+import ujson
+from flask import g, has_request_context, request
+
+class jsonFormatter(logging.Formatter):
+  """
+  One JSON object per record, with the request id and route of the request which logged it
+  """
+
+  def format(self, record):
+    entry = {
+      "time": self.formatTime(record),
+      "level": record.levelname,
+      "logger": record.name,
+      "message": record.getMessage(),
+    }
+    for key in ["request_id", "method", "route"]:
+      value = getattr(record, key, None)
+      if value is not None:
+        entry[key] = value
+    if record.exc_info and not record.exc_text:
+      record.exc_text = self.formatException(record.exc_info)
+    if record.exc_text:
+      entry["exc_info"] = record.exc_text
+
+    return ujson.dumps(entry, escape_forward_slashes=False)
+
+class requestContextFilter(logging.Filter):
+
+  def __init__(self, sampling=None):
+    """
+    :param sampling: [dict] url rule => share of its requests whose info records are kept, e.g. {"/v1/books/<book_id>": 0.01}
+    """
+    super().__init__()
+    self.sampling = sampling or {}
+
+  def filter(self, record):
+    """
+    Add the request id and route to the record and drop the info records of unsampled requests.
+    Runs in the thread which logged the record
+    """
+    if not has_request_context():
+      return True
+
+    route = request.url_rule.rule if request.url_rule else request.path
+    record.request_id = g.get("request_id")
+    record.method = request.method
+    record.route = route
+
+    if record.levelno != logging.INFO or route not in self.sampling:
+      return True
+
+    # the whole request is kept or dropped, not a random subset of its lines
+    sampled = g.get("log_sampled")
+    if sampled is None:
+      sampled = g.log_sampled = random.random() < self.sampling[route]
+
+    return sampled
+
+class structuredQueueHandler(logging.handlers.QueueHandler):
+  """
+  Queues records with their traceback kept apart from the message, in exc_text, for jsonFormatter
+  to write as exc_info. QueueHandler.prepare would append it to the message
+  """
+
+  _formatter = logging.Formatter()
+
+  def prepare(self, record):
+    record = copy.copy(record)
+    # rendered in the thread which logged the record, the arguments may change before the listener writes it
+    record.msg = record.getMessage()
+    record.args = None
+    if record.exc_info:
+      record.exc_text = self._formatter.formatException(record.exc_info)
+    # the traceback keeps every frame of the stack alive until the listener gets to the record
+    record.exc_info = None
+    return record
+
+def setup_logging(logger, level="INFO", log_format="json", sampling=None):
+  """
+  Route the records of a logger through a queue to a stream handler on a listener thread
+
+  :param logger: [object] logger to set up, e.g. app.logger
+  :param level: [str] minimum level logged
+  :param log_format: [str] json, or text for the "time - name - level - message" lines
+  :param sampling: [dict] url rule => share of requests whose info records are kept
+
+  :return [object] the started QueueListener, a forked child starts another one, set as the listener of the logger's handler
+  """
+  stream_handler = logging.StreamHandler()
+  if log_format == "json":
+    stream_handler.setFormatter(jsonFormatter())
+  else:
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+  queue_handler = structuredQueueHandler(queue.SimpleQueue())
+  queue_handler.addFilter(requestContextFilter(sampling))
+
+  def start_listener():
+    queue_handler.listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    queue_handler.listener.start()
+    atexit.register(queue_handler.listener.stop)
+
+  def restart_listener():
+    # the listener thread doesn't survive a fork (e.g. gunicorn workers): the child starts a listener of its own,
+    # on a queue of its own so the records the parent hadn't written yet aren't written twice
+    queue_handler.queue = queue.SimpleQueue()
+    start_listener()
+
+  start_listener()
+  os.register_at_fork(after_in_child=restart_listener)
+
+  logger.addHandler(queue_handler)
+  logger.setLevel(level)
+  return queue_handler.listener
@@ -3,84 +3,100 @@ import pytz
 import re
 from datetime import datetime
 
-class validationManager:
-
-  @staticmethod
-  def validate(data, assertions, skip=[], sanitize=True, join_msg=True):
+TYPES = ["string", "enum", "boolean", "integer", "date", "datetime", "float", "array", "time"]
+
+class compiledValidator:
+  """
+  A _validations_ schema resolved once into per key type validators, see validationManager.compile
+  """
+
+  def __init__(self, assertions):
+    self.assertions = assertions
+    self.validators = {}
+    for key, assertion in assertions.items():
+      if assertion:
+        if assertion.get("type") in TYPES:
+          self.validators[key] = (getattr(validationManager, "{}_validation".format(assertion["type"])), assertion)
+        else:
+          self.validators[key] = (None, assertion)
+
+    self.required_keys = [k for k, v in assertions.items() if v["required"]]
+    # skip list => (required keys left after skipping, skip as a set)
+    self._skips = {}
+
+  def _skip_info(self, skip):
+    skip_key = tuple(skip)
+    info = self._skips.get(skip_key)
+    if info is None:
+      info = self._skips[skip_key] = ([k for k in self.required_keys if k not in skip], frozenset(skip))
+    return info
+
+  def validate(self, data, skip=[], sanitize=True, join_msg=True):
+    required_keys, skip = self._skip_info(skip)
+    validators = self.validators
     errors = []
     sanitized = {}
-    required_keys = [k for k, v in assertions.items() if v["required"]]
-    # remove all skip items from required keys
-    required_keys = [x for x in required_keys if x not in skip]
+    supplied = set()
 
-    any_object_data_supplied = False
     for key, value in data.items():
       if sanitize and type(value) is str:
         #trim whitespace from string
         value = value.strip()
       sanitized[key] = value
 
-      if key not in skip and assertions.get(key):
-        any_object_data_supplied = True
-        ## Start custom validation
-        # if assertions[key].get("custom_type") == "phone":
-        #   result = validationManager.phone_validation(value, True)
-        #   if result is not None:
-        #     value = result
-        #     sanitized[key] = value
-        #   else:
-        #     errors.append("Bad phone number {}".format(value))
-        # elif assertions[key].get("custom_type") == "email":
-        #   errors.append(validationManager.email_validation(value))
-        # elif assertions[key].get("custom_type") == "state":
-        #   errors.append(validationManager.state_validation(value))
-        # elif assertions[key].get("custom_type") == "country":
-        #   errors.append(validationManager.country_validation(value))
-        # elif assertions[key].get("custom_type") == "timezone":
-        #   errors.append(validationManager.timezone_validation(value))
-
-        ## Start data type validation
-        if assertions[key].get("type") == "string":
-          errors.append(validationManager.string_validation(key, value, assertions.get(key)))
-        elif assertions[key].get("type") == "enum":
-          errors.append(validationManager.enum_validation(key, value, assertions.get(key)))
-        elif assertions[key].get("type") == "boolean":
-          errors.append(validationManager.boolean_validation(key, value, assertions.get(key)))
-        elif assertions[key].get("type") == "integer":
-          errors.append(validationManager.integer_validation(key, value, assertions.get(key)))
-        elif assertions[key].get("type") == "date":
-          errors.append(validationManager.date_validation(key, value, assertions.get(key)))
-        elif assertions[key].get("type") == "datetime":
-          errors.append(validationManager.datetime_validation(key, value, assertions.get(key)))
-        elif assertions[key].get("type") == "float":
-          errors.append(validationManager.float_validation(key, value, assertions.get(key)))
-        elif assertions[key].get("type") == "array":
-          errors.append(validationManager.array_validation(key, value, assertions.get(key)))
-        elif assertions[key].get("type") == "time":
-          errors.append(validationManager.time_validation(key, value, assertions.get(key)))
-        else:
-          errors.append("Invalid type for {}".format(key))
+      validator = validators.get(key)
+      if validator and key not in skip:
+        supplied.add(key)
+        check, assertion = validator
+        error = check(key, value, assertion) if check else "Invalid type for {}".format(key)
+        if error:
+          errors.append(error)
 
-        if key in required_keys:
-          required_keys.remove(key)
+    missing = [k for k in required_keys if k not in supplied]
+    if missing: # if there are some required filled not passed yet
+      errors.append("Missing required fields: " + ", ".join(missing))
 
-    if required_keys: # if there are some required filled not passed yet
-      errors.append("Missing required fields: " + ", ".join(required_keys))
+    if not supplied:
+      errors = ["No valid input data supplied"]
 
-    # remove all None value from errors
-    errors =  [i for i in errors if i]
+    return {"errors": ", ".join(errors) if join_msg else errors, "data": sanitized}
 
-    if join_msg:
-      if not any_object_data_supplied:
-        return {"errors": "No valid input data supplied", "data": sanitized}
-      else:
-        return {"errors": ", ".join(errors), "data": sanitized}
-    else:
-      if not any_object_data_supplied:
-        return {"errors": ["No valid input data supplied"], "data": sanitized}
-      else:
-        return {"errors": errors, "data": sanitized}
+  def validate_many(self, rows, skip=[], sanitize=True, join_msg=True):
+    """
+    Validate many rows against the schema, e.g. for bulk endpoints
+
+    :param rows: [list] data dicts
 
+    :return [list] validate() result of every row
+    """
+    return [self.validate(row, skip, sanitize, join_msg) for row in rows]
+
+
+class validationManager:
+
+  # id(schema) => compiledValidator of the models' _validations_, which live as long as the process
+  _compiled = {}
+
+  @staticmethod
+  def compile(assertions, cache=False):
+    """
+    Turn a _validations_ schema into a compiledValidator, reusing the one cached for the same schema
+
+    :param assertions: [dict] key => assertion e.g. {"title": {"type": "string", "required": True, ...}}
+    :param cache: [bool] keep the validator for the next calls, for a model's _validations_ only: a cached schema is never freed
+
+    :return [object] compiledValidator
+    """
+    compiled = validationManager._compiled.get(id(assertions))
+    if compiled is None or compiled.assertions is not assertions:
+      compiled = compiledValidator(assertions)
+      if cache:
+        validationManager._compiled[id(assertions)] = compiled
+    return compiled
+
+  @staticmethod
+  def validate(data, assertions, skip=[], sanitize=True, join_msg=True):
+    return validationManager.compile(assertions).validate(data, skip, sanitize, join_msg)
 
   ### data type validations ###
   #############################
@@ -0,0 +1,112 @@
+from datetime import datetime
+from src.app import db, app
+from src.models.mixins import BaseMixin
+from src.models.books import Book
+from src.helpers import *
+from sqlalchemy.dialects import postgresql
+
+STARS = range(0, 6)
+
+class BookRatingStats(BaseMixin, db.Model):
+    __tablename__ = "book_rating_stats"
+
+    book_id = db.Column(db.String(50), db.ForeignKey("books.book_id", ondelete="CASCADE"), primary_key=True)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_min = db.Column(db.Integer)
+    rating_max = db.Column(db.Integer)
+    # per star histogram, ratings are validated to be between 0 and 5
+    stars_0 = db.Column(db.Integer, nullable=False, default=0)
+    stars_1 = db.Column(db.Integer, nullable=False, default=0)
+    stars_2 = db.Column(db.Integer, nullable=False, default=0)
+    stars_3 = db.Column(db.Integer, nullable=False, default=0)
+    stars_4 = db.Column(db.Integer, nullable=False, default=0)
+    stars_5 = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime)
+
+    @staticmethod
+    def add_rating(book_id, rating):
+        """
+        Count a new rating in its book's stats, in the caller's transaction
+
+        :param book_id: [str] books table primary key
+        :param rating: [int] rating value
+        """
+        stats = BookRatingStats._locked_stats(book_id)
+        stats.rating_count += 1
+        stats.rating_sum += rating
+        setattr(stats, f"stars_{rating}", getattr(stats, f"stars_{rating}") + 1)
+        stats._refresh_min_max()
+
+    @staticmethod
+    def remove_rating(book_id, rating):
+        """
+        Take a deleted rating out of its book's stats, in the caller's transaction
+
+        :param book_id: [str] books table primary key
+        :param rating: [int] rating value
+        """
+        stats = BookRatingStats._locked_stats(book_id)
+        stats.rating_count -= 1
+        stats.rating_sum -= rating
+        setattr(stats, f"stars_{rating}", getattr(stats, f"stars_{rating}") - 1)
+        stats._refresh_min_max()
+
+    @staticmethod
+    def get_stats(book_id):
+        """
+        Get a book's rating stats
+
+        :param book_id: [str] books table primary key
+
+        :return [dict] stats or None if there is no such book
+        """
+        app.logger.info(f'Rating stats retrieval request received for book_id: {book_id}')
+
+        try:
+            stats = db.session.get(BookRatingStats, book_id)
+            if not stats:
+                if not db.session.get(Book, book_id):
+                    return None
+                stats = BookRatingStats._empty(book_id)
+
+            return {
+                "book_id": book_id,
+                "rating_count": stats.rating_count,
+                "rating_sum": stats.rating_sum,
+                "rating_avg": round(stats.rating_sum / stats.rating_count, 2) if stats.rating_count else None,
+                "rating_min": stats.rating_min,
+                "rating_max": stats.rating_max,
+                "histogram": {str(star): getattr(stats, f"stars_{star}") for star in STARS},
+            }
+        except Exception as e:
+            app.logger.error('Rating stats retrieval failed')
+            app.logger.debug('Error details: %s, book_id: %s', e, book_id)
+            return {"error": "No rating stats found"}
+
+    @staticmethod
+    def _locked_stats(book_id):
+        """
+        Get a book's stats row locked for update, creating it on the first rating
+        """
+        if db.session.get_bind().dialect.name == "postgresql":
+            # make sure the row exists so concurrent first ratings queue on its lock instead of racing on insert
+            db.session.execute(postgresql.insert(BookRatingStats).values(book_id=book_id).on_conflict_do_nothing())
+
+        stats = db.session.query(BookRatingStats).filter(BookRatingStats.book_id == book_id).with_for_update().first()
+        if not stats:
+            stats = BookRatingStats._empty(book_id)
+            db.session.add(stats)
+
+        stats.updated_at = datetime.utcnow()
+        return stats
+
+    @staticmethod
+    def _empty(book_id):
+        return BookRatingStats(book_id=book_id, rating_count=0, rating_sum=0, **{f"stars_{star}": 0 for star in STARS})
+
+    def _refresh_min_max(self):
+        stars = [star for star in STARS if getattr(self, f"stars_{star}")]
+        self.rating_min = stars[0] if stars else None
+        self.rating_max = stars[-1] if stars else None
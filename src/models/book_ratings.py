@@ -2,6 +2,8 @@ from datetime import datetime
 from src.app import db, app
 import uuid
 from src.models.mixins import BaseMixin
+from src.models.book_rating_stats import BookRatingStats
+from src.libs.validation_manager import validationManager
 from src.helpers import *
 from sqlalchemy import exc
 
@@ -23,6 +25,7 @@ class BookRating(BaseMixin, db.Model):
         "rating": {"type": "integer", "required": True, "min_value": 0, "max_value": 5},
         "notes": {"type": "string", "required": False, "min_length": 0, "max_length": 500},
     }
+    _validator_ = validationManager.compile(_validations_, cache=True)
 
     _restrict_in_creation_  = ["rating_id", "created_at", "updated_at"]
     _restrict_in_update_    = ["rating_id", "created_at", "book_id", "list_id"]
@@ -52,12 +55,13 @@ class BookRating(BaseMixin, db.Model):
         result = new_rating.validate_and_sanitize(BookRating()._restrict_in_creation_)
         if result.get("errors"):
             app.logger.error('Validation and sanitization failed for new rating')
-            app.logger.debug(f'Error details: {result["errors"]}')
+            app.logger.debug('Error details: %s', result["errors"])
             return {"error": result["errors"]}
 
         try:
             db.session.add(new_rating)
             db.session.flush()
+            BookRatingStats.add_rating(new_rating.book_id, new_rating.rating)
             db.session.commit()
             app.logger.info(f'New rating created successfully with id {new_rating.rating_id}')
             return {"rating_id": str(new_rating.rating_id)}
@@ -65,16 +69,16 @@ class BookRating(BaseMixin, db.Model):
             db.session.rollback()
             err = e.orig.diag.message_detail.rsplit(',', 1)[-1]
             app.logger.error('Integrity error occurred while creating new rating')
-            app.logger.debug(f'Error details: {err.replace(")", "")}')
+            app.logger.debug('Error details: %s', err.replace(")", ""))
             return {"error": err.replace(")", "")}
         except Exception as e:
             db.session.rollback()
             app.logger.error('Unknown error occurred while creating new rating')
-            app.logger.debug(f'Error details: {str(e)}')
+            app.logger.debug('Error details: %s', e)
             return {"error": "failed to create rating"}
 
     @staticmethod
-    def get_ratings(rating_id=None, return_as_object=False, page=None, offset=None, orderby=None, sortby=None):
+    def get_ratings(rating_id=None, return_as_object=False, page=None, offset=None, orderby=None, sortby=None, cursor=None, with_count="true", fields=None):
         """
         Get ratings info
 
@@ -82,6 +86,9 @@ class BookRating(BaseMixin, db.Model):
         :param return_as_object: [bool] do we need to return the list of objects or dictionary for rows?
         :param page: [int] page number
         :param offset: [int] page offset - number of rows to return
+        :param cursor: [str] keyset pagination cursor, empty for the first page; None to use page numbers
+        :param with_count: [str] "true" for an exact total count, "estimated" for an estimate, "false" to leave it out
+        :param fields: [list] only load and return these columns, None for all of them
 
         :return [list]
         """
@@ -91,14 +98,18 @@ class BookRating(BaseMixin, db.Model):
         begin_query = db.session.query(BookRating)
 
         app.logger.info('Book rating retrieval request received')
-        app.logger.debug(f'Request parameters - rating_id: {rating_id}, return_as_object: {return_as_object}, page: {page}, offset: {offset}, orderby: {orderby}, sortby: {sortby}')
+        app.logger.debug('Request parameters - rating_id: %s, return_as_object: %s, page: %s, offset: %s, orderby: %s, sortby: %s', rating_id, return_as_object, page, offset, orderby, sortby)
 
         try:
             if not rating_id:
                 offset = int(offset)
                 page = int(page)-1
 
-                if orderby and sortby:
+                begin_query = BookRating.load_fields(begin_query, fields)
+
+                if cursor is not None:
+                    result, next_cursor = BookRating.keyset_paginate(begin_query, sortby or "created_at", orderby or 1, cursor, offset)
+                elif orderby and sortby:
                     if orderby == -1:
                         result = begin_query.order_by(getattr(BookRating, sortby).desc()).offset(page*offset).limit(offset).all()
                     elif orderby == 1:
@@ -106,29 +117,35 @@ class BookRating(BaseMixin, db.Model):
                 else:
                     result = begin_query.order_by(BookRating.created_at).offset(page*offset).limit(offset).all()
 
-                count = BookRating.query.count()
-                meta_data = {"rating_count": count, "page_number": int(page) + 1, "page_offset": offset}
+                count = BookRating.count_rows(with_count)
+                if cursor is not None:
+                    meta_data = {"rating_count": count, "page_offset": offset, "next_cursor": next_cursor}
+                else:
+                    meta_data = {"rating_count": count, "page_number": int(page) + 1, "page_offset": offset}
+
+                if count is None:
+                    meta_data.pop("rating_count")
 
-                app.logger.info(f'Retrieved {count} ratings')
+                app.logger.info(f'Retrieved {len(result)} ratings')
 
                 if result:
                     if return_as_object:
                         return result
                     else:
-                        return {"ratings": [row.to_dict() for row in result], **meta_data}
+                        return {"ratings": BookRating.to_dicts(result, fields=fields), **meta_data}
 
             else:
-                result = begin_query.filter(
+                result = BookRating.load_fields(begin_query, fields).filter(
                     BookRating.rating_id == rating_id
                     ).all()
 
                 if result:
                     app.logger.info(f'Retrieved rating with rating_id {rating_id}')
-                    return result[0] if return_as_object else result[0].to_dict()
+                    return result[0] if return_as_object else result[0].to_dict(fields=fields)
 
         except Exception as e:
             app.logger.error('Book rating retrieval failed')
-            app.logger.debug(f'Error details: {e}, rating_id: {rating_id}, page: {page}, offset: {offset}')
+            app.logger.debug('Error details: %s, rating_id: %s, page: %s, offset: %s', e, rating_id, page, offset)
             return {"error" : "No rating found"}
 
     @staticmethod
@@ -143,24 +160,37 @@ class BookRating(BaseMixin, db.Model):
         """
         app.logger.info(f'Update rating request received for rating id: {rating_id}')
 
-        app.logger.debug(f'Request data: {data}')
+        app.logger.debug('Request data: %s', data)
     
         rating = db.session.get(BookRating, rating_id) 
         if not rating:
             app.logger.error(f'No rating found with id: {rating_id}')
             return {}
 
+        if "rating" in data:
+            # the rating stats histogram only has buckets for valid ratings
+            result = BookRating._validator_.validate({"rating": data["rating"]}, ["book_id", "list_id"])
+            if result["errors"]:
+                app.logger.error('Validation failed for rating update')
+                app.logger.debug('Error details: %s', result["errors"])
+                return {"error": result["errors"]}
+
         try:
+            old_book_id, old_rating = rating.book_id, rating.rating
             for column in data:
                 if hasattr(rating, column):
                     setattr(rating, column, data[column])
             rating.updated_at = datetime.utcnow()
+            if (rating.book_id, rating.rating) != (old_book_id, old_rating):
+                BookRatingStats.remove_rating(old_book_id, old_rating)
+                BookRatingStats.add_rating(rating.book_id, rating.rating)
             db.session.commit()
             app.logger.info('Rating successfully updated')
             return {'message': 'successfully updated rating_id={}'.format(rating_id)}
         except Exception as e:
+            db.session.rollback()
             app.logger.error('Rating update failed')
-            app.logger.debug(f'Error details: {str(e)}')
+            app.logger.debug('Error details: %s', e)
             return {"error": "failed to update rating"}
 
     @staticmethod
@@ -179,12 +209,14 @@ class BookRating(BaseMixin, db.Model):
         if rating:
             try:
                 db.session.delete(rating)
+                BookRatingStats.remove_rating(rating.book_id, rating.rating)
                 db.session.commit()
                 app.logger.info('Rating successfully deleted')
                 return {'message': 'successfully deleted rating_id={}'.format(rating_id)}
             except Exception as e:
+                db.session.rollback()
                 app.logger.error('Rating deletion failed')
-                app.logger.debug(f'Error details: {e}')
+                app.logger.debug('Error details: %s', e)
                 return {"error": "Rating deletion failed"}
         else:
             app.logger.warning(f'Rating with id {rating_id} not found')
@@ -1,9 +1,28 @@
 from datetime import datetime
 from src.app import db, app
+import csv
+import io
 import uuid
+import ujson
 from src.models.mixins import BaseMixin
 from src.helpers import *
-from sqlalchemy import exc
+from src.libs.validation_manager import validationManager
+from src.libs.count_cache import countCache
+from src.libs.lru_cache import lruCache
+from src.libs.prefix_index import prefixIndex, normalize
+import re
+from sqlalchemy import DDL, bindparam, event, exc, insert, inspect, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+# (serialized book, ETag) keyed by ("book_id", book_id) and ("ISBN", isbn)
+book_cache = lruCache(BOOK_CACHE_SIZE, BOOK_CACHE_TTL)
+
+# full-text document of a book on Postgres, generated into search_vector, title matches rank above author matches
+SEARCH_VECTOR = "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', author), 'B')"
+
+# SQLite full-text tables of the books: stemmed words for search, unstemmed words for suggest
+SQLITE_FTS_TABLES = ["books_fts", "books_suggest_fts"]
 
 class Book(BaseMixin, db.Model):
     __tablename__ = "books"
@@ -21,6 +40,7 @@ class Book(BaseMixin, db.Model):
         "title": {"type": "string", "required": True, "min_length": 1, "max_length": 100},
         "author": {"type": "string", "required": True, "min_length": 1, "max_length": 100},
     }
+    _validator_ = validationManager.compile(_validations_, cache=True)
 
     _restrict_in_creation_  = ["book_id", "created_at", "updated_at"]
     _restrict_in_update_    = ["book_id", "created_at", "updated_at"]
@@ -49,12 +69,13 @@ class Book(BaseMixin, db.Model):
         result = new_book.validate_and_sanitize(Book()._restrict_in_creation_)
         if result.get("errors"):
             app.logger.error('Validation and sanitization failed for new book')
-            app.logger.debug(f'Error details: {result["errors"]}')
+            app.logger.debug('Error details: %s', result["errors"])
             return {"error": result["errors"]}
 
         try:
             db.session.add(new_book)
             db.session.flush()
+            Book._index_search([new_book.book_id])
             db.session.commit()
             app.logger.info(f'New book created successfully with id {new_book.book_id}')
             return {"book_id": str(new_book.book_id)}
@@ -62,16 +83,175 @@ class Book(BaseMixin, db.Model):
             db.session.rollback()
             err = e.orig.diag.message_detail.rsplit(',', 1)[-1]
             app.logger.error('Integrity error occurred while creating new book')
-            app.logger.debug(f'Error details: {err.replace(")", "")}')
+            app.logger.debug('Error details: %s', err.replace(")", ""))
             return {"error": err.replace(")", "")}
         except Exception as e:
             db.session.rollback()
             app.logger.error('Unknown error occurred while creating new book')
-            app.logger.debug(f'Error details: {str(e)}')
+            app.logger.debug('Error details: %s', e)
             return {"error": "failed to create book"}
     
     @staticmethod
-    def get_books(book_id=None, return_as_object=False, page=None, offset=None, orderby=None, sortby=None):
+    def create_books(rows):
+        """
+        Create many books at once, validating every row and inserting them in batches
+        :param rows: [list] book info dicts
+
+        :return [dict] per row results plus created and failed totals
+        """
+        app.logger.info(f'Preparing to create {len(rows)} books in bulk')
+
+        results = [None] * len(rows)
+        pending = []
+        seen_isbns = set()
+        allowed_columns = list_diff(Book.columns_list(), Book._restrict_in_creation_)
+        created_at = datetime.utcnow()
+
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                results[index] = {"index": index, "error": "book should be a JSON object"}
+
+        valid_rows = [index for index, result in enumerate(results) if result is None]
+        validated = Book._validator_.validate_many(
+            [{k: rows[index][k] for k in allowed_columns if k in rows[index]} for index in valid_rows],
+            Book._restrict_in_creation_
+        )
+
+        for index, result in zip(valid_rows, validated):
+            if result["errors"]:
+                results[index] = {"index": index, "error": result["errors"]}
+            elif result["data"]["ISBN"] in seen_isbns:
+                results[index] = {"index": index, "ISBN": result["data"]["ISBN"], "error": "ISBN is repeated in the request"}
+            else:
+                seen_isbns.add(result["data"]["ISBN"])
+                pending.append((index, {"book_id": uuid.uuid1().hex, **result["data"], "created_at": created_at}))
+
+        app.logger.debug('%s of %s books passed validation', len(pending), len(rows))
+
+        for start in range(0, len(pending), BULK_INSERT_CHUNK_SIZE):
+            chunk = pending[start:start + BULK_INSERT_CHUNK_SIZE]
+            try:
+                inserted = Book._insert_books([book for _, book in chunk])
+                Book._index_search([book["book_id"] for _, book in chunk if book["ISBN"] in inserted])
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error('Unknown error occurred while creating books in bulk')
+                app.logger.debug('Error details: %s', e)
+                for index, book in chunk:
+                    results[index] = {"index": index, "ISBN": book["ISBN"], "error": "failed to create book"}
+                continue
+
+            for index, book in chunk:
+                if book["ISBN"] in inserted:
+                    results[index] = {"index": index, "book_id": book["book_id"]}
+                else:
+                    results[index] = {"index": index, "ISBN": book["ISBN"], "error": "ISBN already exists"}
+
+            # the rows are committed, a failed index update must not report them as failed
+            try:
+                for _, book in chunk:
+                    if book["ISBN"] in inserted:
+                        suggest_index.add(book["book_id"], [book["title"], book["author"]], (0, 0), Book._suggestion(book))
+            except Exception as e:
+                app.logger.error('Updating the suggest index failed after creating books in bulk')
+                app.logger.debug('Error details: %s', e)
+
+        # Core inserts bypass the ORM flush hooks which keep the count cache fresh
+        countCache.invalidate(Book.__tablename__)
+
+        created = len([result for result in results if "book_id" in result])
+        app.logger.info(f'{created} of {len(rows)} books created in bulk')
+        return {"results": results, "created": created, "failed": len(rows) - created}
+
+    @staticmethod
+    def ingest_books(rows):
+        """
+        Create the fetched books whose ISBN is not in the table yet. Existing ISBNs are looked up in one
+        query for the whole batch, rows racing another worker are skipped by ON CONFLICT (ISBN) DO NOTHING
+
+        :param rows: [list] book info dicts
+
+        :return [dict] created, duplicates (ISBN already stored or repeated) and invalid counts, and
+                       failed, the number of rows which could not be inserted and are worth retrying
+        """
+        app.logger.info(f'Ingesting {len(rows)} fetched books')
+
+        isbns = list({row["ISBN"] for row in rows if isinstance(row, dict) and isinstance(row.get("ISBN"), str)})
+        try:
+            existing = set(db.session.execute(select(Book.ISBN).where(Book.ISBN.in_(isbns))).scalars()) if isbns else set()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error('Looking up existing ISBNs failed')
+            app.logger.debug('Error details: %s', e)
+            return {"created": 0, "duplicates": 0, "invalid": 0, "failed": len(rows)}
+
+        new_rows = [row for row in rows if not (isinstance(row, dict) and row.get("ISBN") in existing)]
+        results = Book.create_books(new_rows)["results"] if new_rows else []
+
+        errors = [result["error"] for result in results if "error" in result]
+        duplicates = len([error for error in errors if error in ["ISBN already exists", "ISBN is repeated in the request"]])
+        failed = len([error for error in errors if error == "failed to create book"])
+
+        app.logger.info(f'{len(results) - len(errors)} of {len(rows)} fetched books created, {len(existing)} already stored')
+        return {
+            "created": len(results) - len(errors),
+            "duplicates": len(rows) - len(new_rows) + duplicates,
+            "invalid": len(errors) - duplicates - failed,
+            "failed": failed,
+        }
+
+    @staticmethod
+    def _insert_books(books):
+        """
+        Insert a batch of validated books, skipping the ones whose ISBN already exists
+
+        :param books: [list] book column dicts
+
+        :return [set] ISBNs of the inserted books
+        """
+        if db.session.get_bind().dialect.name == "postgresql":
+            cursor = db.session.connection().connection.cursor()
+            if hasattr(cursor, "copy_expert"):
+                return Book._copy_books(cursor, books)
+
+            query = postgresql.insert(Book).values(books).on_conflict_do_nothing(index_elements=["ISBN"]).returning(Book.ISBN)
+            return set(db.session.execute(query).scalars())
+
+        existing = set(db.session.execute(select(Book.ISBN).where(Book.ISBN.in_([book["ISBN"] for book in books]))).scalars())
+        books = [book for book in books if book["ISBN"] not in existing]
+        if books:
+            db.session.execute(insert(Book), books)
+
+        return {book["ISBN"] for book in books}
+
+    @staticmethod
+    def _copy_books(cursor, books):
+        """
+        COPY a batch of books into a staging table and move them into books on Postgres
+
+        :param cursor: [object] psycopg2 cursor of the session's connection
+        :param books: [list] book column dicts
+
+        :return [set] ISBNs of the inserted books
+        """
+        columns = ["book_id", "ISBN", "title", "author", "created_at"]
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([[book[column] for column in columns] for book in books])
+        buffer.seek(0)
+
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS books_staging (LIKE books INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
+        cursor.copy_expert('COPY books_staging (book_id, "ISBN", title, author, created_at) FROM STDIN WITH (FORMAT csv)', buffer)
+        # named columns, books may have columns the staging table doesn't fill or that can't be written
+        cursor.execute(
+            'INSERT INTO books (book_id, "ISBN", title, author, created_at) SELECT book_id, "ISBN", title, author, created_at FROM books_staging '
+            'ON CONFLICT ("ISBN") DO NOTHING RETURNING "ISBN"'
+        )
+
+        return {row[0] for row in cursor.fetchall()}
+
+    @staticmethod
+    def get_books(book_id=None, return_as_object=False, page=None, offset=None, orderby=None, sortby=None, cursor=None, with_count="true", fields=None):
         """
         Get books info
 
@@ -79,6 +259,9 @@ class Book(BaseMixin, db.Model):
         :param return_as_object: [bool] do we need to return the list of objects or dictionary for rows?
         :param page: [int] page number
         :param offset: [int] page offset - number of rows to return
+        :param cursor: [str] keyset pagination cursor, empty for the first page; None to use page numbers
+        :param with_count: [str] "true" for an exact total count, "estimated" for an estimate, "false" to leave it out
+        :param fields: [list] only load and return these columns, None for all of them
 
         :return [list]
         """
@@ -88,14 +271,18 @@ class Book(BaseMixin, db.Model):
         begin_query = db.session.query(Book)
 
         app.logger.info('Book retrieval request received')
-        app.logger.debug(f'Request parameters - book_id: {book_id}, return_as_object: {return_as_object}, page: {page}, offset: {offset}, orderby: {orderby}, sortby: {sortby}')
+        app.logger.debug('Request parameters - book_id: %s, return_as_object: %s, page: %s, offset: %s, orderby: %s, sortby: %s', book_id, return_as_object, page, offset, orderby, sortby)
 
         try:
             if not book_id:
                 offset = int(offset)
                 page = int(page)-1
 
-                if orderby and sortby:
+                begin_query = Book.load_fields(begin_query, fields)
+
+                if cursor is not None:
+                    result, next_cursor = Book.keyset_paginate(begin_query, sortby or "title", orderby or 1, cursor, offset)
+                elif orderby and sortby:
                     if orderby == -1:
                         result = begin_query.order_by(getattr(Book, sortby).desc()).offset(page*offset).limit(offset).all()
                     elif orderby == 1:
@@ -103,29 +290,42 @@ class Book(BaseMixin, db.Model):
                 else:
                     result = begin_query.order_by(Book.title).offset(page*offset).limit(offset).all()
 
-                count = Book.query.count()
-                meta_data = {"book_count": count, "page_number": int(page) + 1, "page_offset": offset}
+                count = Book.count_rows(with_count)
+                if cursor is not None:
+                    meta_data = {"book_count": count, "page_offset": offset, "next_cursor": next_cursor}
+                else:
+                    meta_data = {"book_count": count, "page_number": int(page) + 1, "page_offset": offset}
+
+                if count is None:
+                    meta_data.pop("book_count")
 
-                app.logger.info(f'Retrieved {count} books')
+                app.logger.info(f'Retrieved {len(result)} books')
 
                 if result:
                     if return_as_object:
                         return result
                     else:
-                        return {"books": [row.to_dict() for row in result], **meta_data}
+                        return {"books": Book.to_dicts(result, fields=fields), **meta_data}
 
-            else:
+            elif return_as_object:
                 result = begin_query.filter(
                     Book.book_id == book_id
                     ).all()
 
                 if result:
                     app.logger.info(f'Retrieved book with book_id {book_id}')
-                    return result[0] if return_as_object else result[0].to_dict()
+                    return result[0]
+
+            else:
+                book = Book._get_cached_book("book_id", book_id, fields)
+
+                if book:
+                    app.logger.info(f'Retrieved book with book_id {book_id}')
+                    return book
 
         except Exception as e:
             app.logger.error('Book retrieval failed')
-            app.logger.debug(f'Error details: {e}, book_id: {book_id}, page: {page}, offset: {offset}')
+            app.logger.debug('Error details: %s, book_id: %s, page: %s, offset: %s', e, book_id, page, offset)
             return {"error" : "No book found"}
     
     @staticmethod
@@ -140,7 +340,7 @@ class Book(BaseMixin, db.Model):
         """
         app.logger.info(f'Update book request received for book id: {book_id}')
 
-        app.logger.debug(f'Request data: {data}')
+        app.logger.debug('Request data: %s', data)
     
         book = db.session.get(Book, book_id) 
         if not book:
@@ -152,12 +352,15 @@ class Book(BaseMixin, db.Model):
                 if hasattr(book, column):
                     setattr(book, column, data[column])
             book.updated_at = datetime.utcnow()
+            db.session.flush()
+            Book._index_search([book_id])
             db.session.commit()
             app.logger.info('Book successfully updated')
             return {'message': 'successfully updated book_id={}'.format(book_id)}
         except Exception as e:
+            db.session.rollback()
             app.logger.error('Book update failed')
-            app.logger.debug(f'Error details: {str(e)}')
+            app.logger.debug('Error details: %s', e)
             return {"error": "failed to update book"}
     
     @staticmethod
@@ -175,41 +378,383 @@ class Book(BaseMixin, db.Model):
 
         if book:
             try:
+                Book._unindex_search([book_id])
                 db.session.delete(book)
                 db.session.commit()
                 app.logger.info('Book successfully deleted')
                 return {"action": "deleted successfully"}
             except Exception as e:
+                db.session.rollback()
                 app.logger.error('Book deletion failed')
-                app.logger.debug(f'Error details: {e}')
+                app.logger.debug('Error details: %s', e)
                 return {"error": "Book deletion failed"}
         else:
             app.logger.warning(f'Book with id {book_id} not found')
             return {}
     
     @staticmethod
-    def get_book_by_isbn(isbn):
+    def get_book_by_isbn(isbn, fields=None):
         """
         Get a book's info by ISBN
 
         :param isbn: [str] Book's ISBN
+        :param fields: [list] only load and return these columns, None for all of them
 
         :return [dict]
         """
 
         app.logger.info('Book retrieval request received by ISBN')
-        app.logger.debug(f'Request parameters - ISBN: {isbn}')
+        app.logger.debug('Request parameters - ISBN: %s', isbn)
 
         try:
-            result = db.session.query(Book).filter(
-                Book.ISBN == isbn
-            ).all()
+            book = Book._get_cached_book("ISBN", isbn, fields)
 
-            if result:
+            if book:
                 app.logger.info(f'Retrieved book with ISBN {isbn}')
-                return result[0].to_dict()
+                return book
 
         except Exception as e:
             app.logger.error('Book retrieval failed')
-            app.logger.debug(f'Error details: {e}, ISBN: {isbn}')
+            app.logger.debug('Error details: %s, ISBN: %s', e, isbn)
             return {"error" : "No book found"}
+
+    @staticmethod
+    def get_books_by_keys(column, keys, fields=None):
+        """
+        Get many books by book_id or ISBN at once
+
+        :param column: [str] book_id or ISBN
+        :param keys: [list] book_ids or ISBNs
+        :param fields: [list] only return these columns, None for all of them
+
+        :return [dict] found books in the order of keys and the keys which were not found
+        """
+        app.logger.info(f'Multi-get request received for {len(keys)} books by {column}')
+
+        keys = list(dict.fromkeys(keys))
+
+        try:
+            found = Book._get_cached_books(column, keys, fields)
+        except Exception as e:
+            app.logger.error('Book retrieval failed')
+            app.logger.debug('Error details: %s, %s: %s', e, column, keys)
+            return {"error" : "No book found"}
+
+        app.logger.info(f'Retrieved {len(found)} of {len(keys)} books by {column}')
+        return {"books": [found[key] for key in keys if key in found], "missing": [key for key in keys if key not in found]}
+
+    @staticmethod
+    def search_books(q, cursor=None, offset=None, fields=None):
+        """
+        Full-text search of books by the words of their title and author, best matches first
+
+        :param q: [str] search terms, every one of them has to match
+        :param cursor: [str] next_cursor of the previous page, empty or None for the first page
+        :param offset: [int] page offset - number of rows to return
+        :param fields: [list] only return these columns, None for all of them
+
+        :return [dict] books of the page, page_offset and next_cursor (None on the last page)
+        """
+        terms = re.findall(r"\w+", q.lower())
+
+        app.logger.info('Book search request received')
+        app.logger.debug('Request parameters - q: %s, cursor: %s, offset: %s', q, cursor, offset)
+
+        try:
+            offset = int(offset or 20)
+            bound = None
+            if cursor:
+                values = decode_cursor(cursor)
+                # a cursor only continues the search it was returned by
+                if not values or len(values) != 3 or values[0] != " ".join(terms):
+                    return {"error": "Invalid pagination cursor"}
+                bound = {"score": float(values[1]), "book_id": values[2]}
+
+            rows = Book._search_page(terms, bound, offset + 1) if terms else []
+
+            next_cursor = None
+            if len(rows) > offset:
+                rows = rows[:offset]
+                next_cursor = encode_cursor([" ".join(terms), rows[-1].score, rows[-1].book_id])
+
+            query = db.session.query(Book).filter(Book.book_id.in_([row.book_id for row in rows]))
+            books = {book.book_id: book for book in Book.load_fields(query, fields).all()} if rows else {}
+
+            app.logger.info(f'Found {len(rows)} books matching the search')
+            return {
+                "books": Book.to_dicts([books[row.book_id] for row in rows if row.book_id in books], fields=fields),
+                "page_offset": offset,
+                "next_cursor": next_cursor,
+            }
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error('Book search failed')
+            app.logger.debug('Error details: %s, q: %s', e, q)
+            return {"error": "Book search failed"}
+
+    @staticmethod
+    def _search_page(terms, bound, limit):
+        """
+        Ids and scores of the books matching every term, by descending score then book_id, after the bound
+
+        :param terms: [list] lower case words
+        :param bound: [dict] score and book_id of the last book of the previous page, None for the first page
+        :param limit: [int] max rows
+
+        :return [list] rows with book_id and score
+        """
+        if db.session.get_bind().dialect.name == "postgresql":
+            matches = (
+                "SELECT book_id, CAST(ts_rank_cd(search_vector, query) AS DOUBLE PRECISION) AS score "
+                "FROM books, plainto_tsquery('english', :query) query WHERE search_vector @@ query"
+            )
+            query = " ".join(terms)
+        else:
+            # bm25 is lower for better matches, titles weigh twice as much as authors, book_id isn't indexed
+            matches = "SELECT book_id, -bm25(books_fts, 0.0, 2.0, 1.0) AS score FROM books_fts WHERE books_fts MATCH :query"
+            query = " AND ".join('"{}"'.format(term) for term in terms)
+
+        seek = "WHERE score < :score OR (score = :score AND book_id > :book_id)" if bound else ""
+        statement = text(f"SELECT book_id, score FROM ({matches}) AS matches {seek} ORDER BY score DESC, book_id LIMIT :limit")
+
+        return db.session.execute(statement, {"query": query, "limit": limit, **(bound or {})}).all()
+
+    @staticmethod
+    def suggest_books(prefix, limit=10, backend=SUGGEST_BACKEND):
+        """
+        Autocomplete: books with a word of their title or author starting with the prefix, most rated first
+
+        :param prefix: [str] typed text, case and repeated spaces are ignored
+        :param limit: [int] max number of suggestions
+        :param backend: [str] "database" or "memory" for the in-process suggest_index
+
+        :return [dict] suggestions with book_id, title and author
+        """
+        app.logger.debug('Suggestion request parameters - prefix: %s, limit: %s, backend: %s', prefix, limit, backend)
+
+        try:
+            if backend == "memory":
+                suggestions = [suggestion for _, suggestion in suggest_index.search(prefix, limit)]
+            else:
+                suggestions = [Book._suggestion(row._mapping) for row in Book._suggest_from_database(normalize(prefix), limit)]
+
+            app.logger.info(f'Suggested {len(suggestions)} books')
+            return {"suggestions": suggestions}
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error('Book suggestion failed')
+            app.logger.debug('Error details: %s, prefix: %s', e, prefix)
+            return {"error": "Book suggestion failed"}
+
+    @staticmethod
+    def _suggest_from_database(prefix, limit):
+        """
+        :param prefix: [str] normalized prefix
+
+        :return [list] rows with book_id, title and author, most rated first
+        """
+        if db.session.get_bind().dialect.name == "postgresql":
+            # the trigram indexes serve the ILIKE, the regular expression keeps the matches starting at a word
+            matches = "FROM books WHERE (title ILIKE :contains AND title ~* :word) OR (author ILIKE :contains AND author ~* :word)"
+            escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params = {"contains": f"%{escaped}%", "word": r"(^|\W)" + re.escape(prefix)}
+        else:
+            terms = re.findall(r"\w+", prefix)
+            if not terms:
+                return []
+            # a phrase whose last word is a prefix, of the unstemmed words: "runn" would miss the stem "run" of books_fts
+            matches = "FROM books_suggest_fts JOIN books ON books.book_id = books_suggest_fts.book_id WHERE books_suggest_fts MATCH :query"
+            params = {"query": '"{}"*'.format(" ".join(terms))}
+
+        statement = text(
+            f"SELECT matches.book_id, matches.title, matches.author FROM (SELECT books.book_id, books.title, books.author {matches}) AS matches "
+            "LEFT JOIN book_rating_stats stats ON stats.book_id = matches.book_id "
+            "ORDER BY COALESCE(stats.rating_count, 0) DESC, COALESCE(stats.rating_sum, 0) DESC, matches.title, matches.book_id LIMIT :limit"
+        )
+        return db.session.execute(statement, {**params, "limit": limit}).all()
+
+    @staticmethod
+    def _suggestion(book):
+        return {"book_id": book["book_id"], "title": book["title"], "author": book["author"]}
+
+    @staticmethod
+    def _index_search(book_ids):
+        """
+        Bring the SQLite full-text tables of the given books up to date, in the caller's transaction,
+        Postgres computes search_vector with the row
+
+        :param book_ids: [list] books table primary keys, of inserted or updated books
+        """
+        if book_ids and db.session.get_bind().dialect.name == "sqlite":
+            Book._unindex_search(book_ids)
+            for table in SQLITE_FTS_TABLES:
+                db.session.execute(text(f"INSERT INTO {table} (book_id, title, author) SELECT book_id, title, author FROM books WHERE book_id IN :book_ids").bindparams(bindparam("book_ids", expanding=True)), {"book_ids": book_ids})
+
+    @staticmethod
+    def _unindex_search(book_ids):
+        """
+        Remove books from the SQLite full-text tables before they are deleted, Postgres drops them with the row
+
+        :param book_ids: [list] books table primary keys
+        """
+        if book_ids and db.session.get_bind().dialect.name == "sqlite":
+            for table in SQLITE_FTS_TABLES:
+                db.session.execute(text(f"DELETE FROM {table} WHERE book_id IN :book_ids").bindparams(bindparam("book_ids", expanding=True)), {"book_ids": book_ids})
+
+    @staticmethod
+    def rebuild_search_index(connection):
+        """
+        Index every book again in the SQLite full-text tables, after rows were loaded without going through the model
+
+        :param connection: [object] sqlalchemy Connection
+        """
+        if connection.dialect.name == "sqlite":
+            for table in SQLITE_FTS_TABLES:
+                connection.execute(text(f"DELETE FROM {table}"))
+                connection.execute(text(f"INSERT INTO {table} (book_id, title, author) SELECT book_id, title, author FROM books"))
+
+    @staticmethod
+    def _get_cached_book(column, value, fields=None):
+        """
+        Read-through lookup of a serialized book and its ETag in book_cache
+
+        :param column: [str] book_id or ISBN
+        :param value: [str] value of the column
+        :param fields: [list] only return these columns, None for all of them
+
+        :return [dict] book as a taggedDict or None if not found
+        """
+        return Book._get_cached_books(column, [value], fields).get(value)
+
+    @staticmethod
+    def _get_cached_books(column, values, fields=None):
+        """
+        Read-through lookup of many serialized books in book_cache, the misses are loaded with
+        IN queries of at most MULTI_GET_CHUNK_SIZE values
+
+        :param column: [str] book_id or ISBN
+        :param values: [list] values of the column
+        :param fields: [list] only return these columns, None for all of them
+
+        :return [dict] value => book (a taggedDict when the cache is enabled) for the books found
+        """
+        found = {}
+        misses = []
+        for value in values:
+            entry = book_cache.get((column, value)) if book_cache.enabled else None
+            if entry is None:
+                misses.append(value)
+            else:
+                found[value] = entry
+
+        if found:
+            app.logger.debug('Book cache hit for %s %s values', len(found), column)
+
+        generation = book_cache.generation
+        for start in range(0, len(misses), MULTI_GET_CHUNK_SIZE):
+            query = db.session.query(Book).filter(getattr(Book, column).in_(misses[start:start + MULTI_GET_CHUNK_SIZE]))
+
+            if not book_cache.enabled:
+                for book in Book.load_fields(query, fields and fields + [column]).all():
+                    found[getattr(book, column)] = book.to_dict(fields=fields)
+                continue
+
+            entries = {}
+            for book in Book.to_dicts(query.all()):
+                entry = (book, body_etag(ujson.dumps(book)))
+                found[book[column]] = entries[("book_id", book["book_id"])] = entries[("ISBN", book["ISBN"])] = entry
+            book_cache.set_many(entries, generation)
+
+        if not book_cache.enabled:
+            return found
+
+        for value, (book, etag) in found.items():
+            if fields:
+                found[value] = taggedDict({k: v for k, v in book.items() if k in fields}, body_etag(etag + ",".join(sorted(set(fields)))))
+            else:
+                found[value] = taggedDict(book, etag)
+
+        return found
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_books(session, flush_context):
+    keys = session.info.setdefault("book_cache_keys", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Book):
+            state = inspect(obj)
+            isbns = list(state.attrs.ISBN.history.deleted)
+            if "ISBN" in state.dict:
+                isbns.append(state.dict["ISBN"])
+            else:
+                # the ISBN the book was cached under is unknown, drop everything
+                keys.add(None)
+            keys.add(("book_id", obj.book_id))
+            keys.update(("ISBN", isbn) for isbn in isbns)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_books(session):
+    keys = session.info.pop("book_cache_keys", set())
+    if None in keys:
+        book_cache.clear()
+    elif keys:
+        book_cache.invalidate(*keys)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_books(session):
+    session.info.pop("book_cache_keys", None)
+
+def _suggest_documents():
+    """
+    Every book with its (rating count, rating sum) popularity, read by suggest_index when it (re)loads
+    """
+    with app.app_context():
+        result = db.session.execute(
+            text(
+                "SELECT books.book_id, books.title, books.author, COALESCE(stats.rating_count, 0), COALESCE(stats.rating_sum, 0) "
+                "FROM books LEFT JOIN book_rating_stats stats ON stats.book_id = books.book_id"
+            ),
+            execution_options={"stream_results": True, "yield_per": EXPORT_CHUNK_SIZE}
+        )
+        for book_id, title, author, rating_count, rating_sum in result:
+            yield book_id, [title, author], (rating_count, rating_sum), {"book_id": book_id, "title": title, "author": author}
+
+# in-process autocomplete index of SUGGEST_BACKEND "memory", kept up to date by this process' commits
+suggest_index = prefixIndex(_suggest_documents, SUGGEST_RELOAD_INTERVAL, default_popularity=(0, 0))
+
+@event.listens_for(Session, "after_flush")
+def _collect_suggest_changes(session, flush_context):
+    changes = session.info.setdefault("suggest_changes", {})
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Book):
+            changes[("book", obj.book_id)] = {"book_id": obj.book_id, "title": obj.title, "author": obj.author}
+        elif getattr(obj, "__tablename__", None) == "book_rating_stats":
+            changes[("stats", obj.book_id)] = (obj.rating_count, obj.rating_sum)
+    for obj in session.deleted:
+        if isinstance(obj, Book):
+            changes[("book", obj.book_id)] = None
+
+@event.listens_for(Session, "after_commit")
+def _apply_suggest_changes(session):
+    for (kind, book_id), change in session.info.pop("suggest_changes", {}).items():
+        if kind == "stats":
+            suggest_index.set_popularity(book_id, change)
+        elif change is None:
+            suggest_index.remove(book_id)
+        else:
+            suggest_index.add(book_id, [change["title"], change["author"]], None, change)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_suggest_changes(session):
+    session.info.pop("suggest_changes", None)
+
+# The search document is not a mapped column, so it never shows up in to_dict or the exports.
+# The alembic migrations build the same objects on existing databases.
+event.listen(Book.__table__, "after_create", DDL(f"ALTER TABLE books ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({SEARCH_VECTOR}) STORED").execute_if(dialect="postgresql"))
+event.listen(Book.__table__, "after_create", DDL("CREATE INDEX ix_books_search_vector ON books USING GIN (search_vector)").execute_if(dialect="postgresql"))
+event.listen(Book.__table__, "after_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+event.listen(Book.__table__, "after_create", DDL("CREATE INDEX ix_books_title_trgm ON books USING GIN (title gin_trgm_ops)").execute_if(dialect="postgresql"))
+event.listen(Book.__table__, "after_create", DDL("CREATE INDEX ix_books_author_trgm ON books USING GIN (author gin_trgm_ops)").execute_if(dialect="postgresql"))
+event.listen(Book.__table__, "after_create", DDL("CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(book_id UNINDEXED, title, author, tokenize='porter unicode61')").execute_if(dialect="sqlite"))
+event.listen(Book.__table__, "after_create", DDL("CREATE VIRTUAL TABLE IF NOT EXISTS books_suggest_fts USING fts5(book_id UNINDEXED, title, author, tokenize='unicode61', prefix='2 3')").execute_if(dialect="sqlite"))
+event.listen(Book.__table__, "before_drop", DDL("DROP TABLE IF EXISTS books_fts").execute_if(dialect="sqlite"))
+event.listen(Book.__table__, "before_drop", DDL("DROP TABLE IF EXISTS books_suggest_fts").execute_if(dialect="sqlite"))
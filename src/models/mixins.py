@@ -2,11 +2,53 @@
 Mixins for model classes: BaseMixin
 """
 
+import csv
 import datetime
+import io
 
-from sqlalchemy.orm import class_mapper, ColumnProperty
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import class_mapper, load_only, selectinload, undefer, ColumnProperty
 from src.helpers import *
 from src.libs.validation_manager import validationManager
+from src.libs.count_cache import countCache
+
+def convert_value(key, value, ts_to_string=True, dt_to_string=True):
+  """
+  Convert a column value for to_dict
+  """
+  if ts_to_string and value and key in ["start", "end"]:
+    value = timestamp_to_string(value)
+
+  if dt_to_string and value and (isinstance(value, datetime.datetime) or isinstance(value, datetime.time)):
+    value = datetime_to_str(value, True)
+
+  if dt_to_string and value and (isinstance(value, datetime.date)):
+    value = datetime_to_str(value, False)
+
+  if dt_to_string and value and key in ["dates"] and isinstance(value, list):
+    value = [datetime_to_str(dates, False, True) for dates in value]
+
+  return value
+
+def column_converter(prop):
+  """
+  Pick the converter to_dict applies to a column, None when values are returned as they are
+  """
+  try:
+    python_type = prop.columns[0].type.python_type
+  except NotImplementedError:
+    python_type = None
+
+  if prop.key in ["start", "end", "dates"] or python_type is None:
+    return lambda value: convert_value(prop.key, value)
+  if python_type is datetime.datetime or python_type is datetime.time:
+    return lambda value: datetime_to_str(value, True)
+  if python_type is datetime.date:
+    return lambda value: datetime_to_str(value, False)
+  if python_type in [str, int, float, bool]:
+    return None
+
+  return lambda value: convert_value(prop.key, value)
 
 class BaseMixin(object):
 
@@ -15,7 +57,7 @@ class BaseMixin(object):
       return {}
 
     try:
-      result = validationManager.validate(self.to_dict(), self._validations_, skip, True)
+      result = self._validator_.validate(self.to_dict(), skip, True)
       if not result["errors"]:
         for  k, v in result.get("data").items():
           # reset the value with sanitized data
@@ -27,46 +69,237 @@ class BaseMixin(object):
       return {"errors": ["Data validation failed"]}
 
 
-  def to_dict(self, ts_to_string = True, dt_to_string= True, remove_null=True, hide_fields=[]):
+  def to_dict(self, ts_to_string = True, dt_to_string= True, remove_null=True, hide_fields=[], fields=None):
     """
     return model as python dictionary
 
     :param ts_to_string: [bool] convert timestamp to YYYY-MM-DD string
     :param dt_to_string: [bool] convert datetime object to "2016-10-21T23:46:50Z" format
     :param remove_null: [bool] remove key=>value pair, where value is empty
+    :param fields: [list] only return these columns, None for all of them
 
     :return [dict] cleaned dictionary of the model
     """
-    result = {}
+    return self.to_dicts([self], ts_to_string, dt_to_string, remove_null, hide_fields, fields)[0]
 
-    for prop in class_mapper(self.__class__).iterate_properties:
-      if isinstance(prop, ColumnProperty):
-        value = getattr(self, prop.key)
-        if remove_null:
-          if getattr(self, prop.key) == None:
+  @classmethod
+  def to_dicts(cls, rows, ts_to_string = True, dt_to_string= True, remove_null=True, hide_fields=[], fields=None):
+    """
+    return many rows of the model as python dictionaries, see to_dict
+
+    :param rows: [list] model objects
+
+    :return [list] cleaned dictionaries of the rows
+    """
+    plan = cls._serializer_plan()
+    if fields:
+      plan = [(key, convert) for key, convert in plan if key in fields]
+    fast = ts_to_string and dt_to_string
+    results = []
+
+    for row in rows:
+      result = {}
+      for key, convert in plan:
+        value = getattr(row, key)
+        if value is None:
+          if remove_null:
             continue
+        elif fast:
+          if convert is not None:
+            value = convert(value)
+        else:
+          value = convert_value(key, value, ts_to_string, dt_to_string)
+
+        if key not in hide_fields:
+          result[key] = value
+      results.append(result)
+
+    return results
+
+  @classmethod
+  def columns_list(cls):
+    return [key for key, _ in cls._serializer_plan()]
+
+  @classmethod
+  def load_fields(cls, query, fields):
+    """
+    Only select the given columns (plus the primary key) from the database
+
+    :param query: [object] query of the model
+    :param fields: [list] column names, None to load every column
+
+    :return [object] query
+    """
+    if not fields:
+      return query
+
+    return query.options(load_only(*[getattr(cls, field) for field in fields]))
+
+  @classmethod
+  def load_includes(cls, query, include):
+    """
+    Eager load the given relationships with one extra SELECT ... IN query each, instead of one query per row
+
+    :param query: [object] query of the model
+    :param include: [list] keys of the model's _includes_, None to load nothing
+
+    :return [object] query
+    """
+    if not include:
+      return query
+
+    return query.options(*[selectinload(getattr(cls, cls._includes_[name])) for name in include])
+
+  @classmethod
+  def _serializer_plan(cls):
+    """
+    Column keys of the model with the converter to apply to their values, built once per class
+
+    :return [list] (column key, converter or None) pairs
+    """
+    plan = cls.__dict__.get("_serializer_plan_")
+    if plan is None:
+      plan = []
+      for prop in class_mapper(cls).iterate_properties:
+        if isinstance(prop, ColumnProperty):
+          plan.append((prop.key, column_converter(prop)))
+      cls._serializer_plan_ = plan
+
+    return plan
+
+  @classmethod
+  def cursor_bound(cls, sortby, orderby, cursor):
+    """
+    Decode the keyset values of a pagination cursor, for the controllers to refuse a bad cursor before paginating
+
+    :param sortby: [str] name of the column the page is sorted on
+    :param orderby: [int] 1 for ascending, -1 for descending
+    :param cursor: [str] next_cursor of the previous page
+
+    :return [tuple] sort column value and primary key the page starts after, None if the cursor isn't a next_cursor of this sort
+    """
+    values = decode_cursor(cursor)
+    if not values or len(values) != 4 or values[0] != sortby or type(values[1]) is not int or values[1] != orderby:
+      return None
+
+    try:
+      return cls._cursor_value(getattr(cls, sortby), values[2]), cls._cursor_value(class_mapper(cls).primary_key[0], values[3])
+    except (TypeError, ValueError):
+      return None
+
+  @staticmethod
+  def _cursor_value(column, value):
+    python_type = column.type.python_type
+    if python_type is datetime.datetime and isinstance(value, str):
+      return datetime.datetime.fromisoformat(value)
+    if python_type is float and type(value) is int:
+      return float(value)
+    if type(value) is not python_type:
+      raise TypeError("Expected a {} cursor value".format(python_type.__name__))
+    return value
+
+  @classmethod
+  def keyset_paginate(cls, query, sortby, orderby, cursor, limit):
+    """
+    Page through a query by seeking on (sort column, primary key) instead of using OFFSET
+
+    :param query: [object] query to paginate
+    :param sortby: [str] name of the column to sort on
+    :param orderby: [int] 1 for ascending, -1 for descending
+    :param cursor: [str] next_cursor of the previous page, empty for the first page
+    :param limit: [int] number of rows to return
+
+    :return [tuple] rows of the page and the cursor of the next page (None on the last page)
+    """
+    sort_column = getattr(cls, sortby)
+    pk_column = class_mapper(cls).primary_key[0]
+    keyset = tuple_(sort_column, pk_column)
+
+    if cursor:
+      bound = cls.cursor_bound(sortby, orderby, cursor)
+      if bound is None:
+        raise ValueError("Invalid pagination cursor")
 
-        if ts_to_string and value and prop.key in ["start", "end"]:
-          value = timestamp_to_string(value)
+      bound = tuple_(*bound)
+      query = query.filter(keyset < bound if orderby == -1 else keyset > bound)
 
-        if dt_to_string and value and (isinstance(value, datetime.datetime) or isinstance(value, datetime.time)):
-          value = datetime_to_str(value, True)
+    # the next cursor is read from the sort column, load it even when fields= left it out
+    query = query.options(undefer(sort_column))
 
-        if dt_to_string and value and (isinstance(value, datetime.date)):
-          value = datetime_to_str(value, False)
+    if orderby == -1:
+      query = query.order_by(sort_column.desc(), pk_column.desc())
+    else:
+      query = query.order_by(sort_column.asc(), pk_column.asc())
 
-        if dt_to_string and value and prop.key in ["dates"] and isinstance(value, list):
-          value = [datetime_to_str(dates, False, True) for dates in value]
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+      rows = rows[:limit]
+      value = getattr(rows[-1], sortby)
+      if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+      next_cursor = encode_cursor([sortby, orderby, value, getattr(rows[-1], pk_column.key)])
+
+    return rows, next_cursor
+
+  @classmethod
+  def count_rows(cls, with_count="true", **filters):
+    """
+    Count the rows of the model's table, reusing a cached count when possible
+
+    :param with_count: [str] "true" for an exact count, "estimated" for the planner's estimate, "false" to skip counting
+    :param filters: [dict] column => value filters, e.g. status="unread"
+
+    :return [int] row count or None when counting is skipped
+    """
+    if with_count == "false":
+      return None
+
+    if with_count == "estimated" and not filters:
+      estimate = countCache.estimate(cls.query.session, cls.__tablename__)
+      if estimate is not None:
+        return estimate
+
+    count = countCache.get(cls.__tablename__, filters)
+    if count is None:
+      count = cls.query.filter_by(**filters).count()
+      countCache.set(cls.__tablename__, count, filters)
+
+    return count
+
+  @classmethod
+  def export_rows(cls, export_format="ndjson"):
+    """
+    Stream every row of the model's table from a server side cursor
+
+    :param export_format: [str] ndjson or csv
+
+    :return [generator] encoded chunks of EXPORT_CHUNK_SIZE rows
+    """
+    columns = cls.columns_list()
+    result = cls.query.session.execute(
+      select(*[getattr(cls, column) for column in columns]),
+      execution_options={"stream_results": True, "yield_per": EXPORT_CHUNK_SIZE}
+    )
 
-        if prop.key not in hide_fields:
-          result[prop.key] = value
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == "csv":
+      writer.writerow(columns)
 
-    return result
+    for rows in result.partitions():
+      for row in rows:
+        values = [datetime_to_str(value, True) if isinstance(value, datetime.datetime) else value for value in row]
+        if export_format == "csv":
+          writer.writerow(values)
+        else:
+          buffer.write(ujson.dumps({k: v for k, v in zip(columns, values) if v is not None}))
+          buffer.write("\n")
 
-  def columns_list(self):
-    columns = []
-    for prop in class_mapper(self.__class__).iterate_properties:
-      if isinstance(prop, ColumnProperty):
-        columns.append(prop.key)
+      yield buffer.getvalue()
+      buffer.seek(0)
+      buffer.truncate()
 
-    return columns
+    if export_format == "csv" and buffer.tell():
+      yield buffer.getvalue()
@@ -2,8 +2,12 @@ from datetime import datetime
 from src.app import db, app
 import uuid
 from src.models.mixins import BaseMixin
+from src.models.books import Book
+from src.models.book_ratings import BookRating
+from src.libs.validation_manager import validationManager
 from src.helpers import *
-from sqlalchemy import exc
+from sqlalchemy import exc, func
+from src.libs.count_cache import countCache
 
 class ReadingList(BaseMixin, db.Model):
     __tablename__ = "reading_lists"
@@ -20,13 +24,46 @@ class ReadingList(BaseMixin, db.Model):
         "book_id": {"type": "string", "required": True, "min_length": 32, "max_length": 32},
         "status":  {"type": "enum",   "required": True, "options": ["unread", "in_progress", "finished"]},
     }
+    _validator_ = validationManager.compile(_validations_, cache=True)
 
     _restrict_in_creation_  = ["list_id", "created_at", "updated_at"]
     _restrict_in_update_    = ["list_id", "book_id", "created_at", "updated_at"]
 
+    # serves status= filters, their created_at ordering and the per status summary
+    __table_args__ = (db.Index("ix_reading_lists_status_created_at", "status", "created_at"),)
+
     book = db.relationship("Book", backref=db.backref("reading_lists", cascade="all, delete-orphan"))
+    ratings = db.relationship("BookRating", viewonly=True, order_by="BookRating.created_at")
+
+    # include= values => relationships embedded in the response
+    _includes_ = {"book": "book", "rating": "ratings"}
 
     
+    @staticmethod
+    def embed_includes(rows, results, include):
+        """
+        Add the eager loaded related records to the serialized reading lists
+
+        :param rows: [list] ReadingList objects, loaded with load_includes
+        :param results: [list] dictionaries of the rows, in the same order
+        :param include: [list] "book" and/or "rating", None to embed nothing
+
+        :return [list] results
+        """
+        if not include:
+            return results
+
+        if "book" in include:
+            books = Book.to_dicts([row.book for row in rows])
+            for result, book in zip(results, books):
+                result["book"] = book
+
+        if "rating" in include:
+            for row, result in zip(rows, results):
+                result["ratings"] = BookRating.to_dicts(row.ratings)
+
+        return results
+
     @staticmethod
     def create_a_reading_list(data):
         """
@@ -36,7 +73,7 @@ class ReadingList(BaseMixin, db.Model):
         :return [dict]
         """
         app.logger.info('Create reading list request received')
-        app.logger.debug(f'Request data: {data}')
+        app.logger.debug('Request data: %s', data)
         
         new_reading_list = ReadingList()
         allowed_columns = list_diff(ReadingList().columns_list(), ReadingList()._restrict_in_creation_)
@@ -49,7 +86,7 @@ class ReadingList(BaseMixin, db.Model):
         result  = new_reading_list.validate_and_sanitize(ReadingList()._restrict_in_creation_)
         if result.get("errors"):
             app.logger.error('Reading list creation failed during validation')
-            app.logger.debug(f'Error details: {result["errors"]}')
+            app.logger.debug('Error details: %s', result["errors"])
             return {"error": result["errors"]}
 
         try:
@@ -62,16 +99,16 @@ class ReadingList(BaseMixin, db.Model):
             db.session.rollback()
             err = e.orig.diag.message_detail.rsplit(',', 1)[-1]
             app.logger.error('Reading list creation failed due to Integrity Error')
-            app.logger.debug(f'Error details: {err.replace(")", "")}')
+            app.logger.debug('Error details: %s', err.replace(")", ""))
             return {"error": err.replace(")", "")}
         except Exception as e:
             db.session.rollback()
             app.logger.error('Reading list creation failed due to Exception')
-            app.logger.debug(f'Error details: {str(e)}')
+            app.logger.debug('Error details: %s', e)
             return {"error": "failed to create reading list"}
     
     @staticmethod
-    def get_reading_lists(list_id=None, return_as_object=False, page=None, offset=None, orderby=None, sortby=None, status=None):
+    def get_reading_lists(list_id=None, return_as_object=False, page=None, offset=None, orderby=None, sortby=None, status=None, cursor=None, with_count="true", fields=None, include=None):
         """
         Get reading lists info
 
@@ -79,16 +116,22 @@ class ReadingList(BaseMixin, db.Model):
         :param return_as_object: [bool] do we need to return the list of objects or dictionary for rows?
         :param page: [int] page number
         :param offset: [int] page offset - number of rows to return
+        :param cursor: [str] keyset pagination cursor, empty for the first page; None to use page numbers
+        :param with_count: [str] "true" for an exact total count, "estimated" for an estimate, "false" to leave it out
+        :param fields: [list] only load and return these columns, None for all of them
+        :param include: [list] related records to embed, "book" and/or "rating"
 
         :return [list]
         """
 
         app.logger.info('Get reading list request received')
-        app.logger.debug(f'Request params: list_id={list_id}, return_as_object={return_as_object}, page={page}, offset={offset}, orderby={orderby}, sortby={sortby}, status={status}')
+        app.logger.debug('Request params: list_id=%s, return_as_object=%s, page=%s, offset=%s, orderby=%s, sortby=%s, status=%s', list_id, return_as_object, page, offset, orderby, sortby, status)
         
         page =  page or 1
         offset =  offset or 20
-        begin_query = db.session.query(ReadingList)
+        begin_query = ReadingList.load_includes(db.session.query(ReadingList), include)
+        # the book is looked up by book_id, load it even when fields= left it out
+        load_fields = fields + ["book_id"] if fields and include and "book" in include else fields
     
         try:
             if not list_id:
@@ -98,7 +141,11 @@ class ReadingList(BaseMixin, db.Model):
                 if status:
                     begin_query = begin_query.filter(ReadingList.status == status)
                 
-                if orderby and sortby:
+                begin_query = ReadingList.load_fields(begin_query, load_fields)
+
+                if cursor is not None:
+                    result, next_cursor = ReadingList.keyset_paginate(begin_query, sortby or "created_at", orderby or 1, cursor, offset)
+                elif orderby and sortby:
                     if orderby == -1:
                         result = begin_query.order_by(getattr(ReadingList, sortby).desc()).offset(page*offset).limit(offset).all()
                     elif orderby == 1:
@@ -106,27 +153,62 @@ class ReadingList(BaseMixin, db.Model):
                 else:
                     result = begin_query.order_by(ReadingList.created_at).offset(page*offset).limit(offset).all()
 
-                count = ReadingList.query.count()
-                meta_data = {"reading_list_count": count, "page_number": int(page) + 1, "page_offset": offset}
+                count = ReadingList.count_rows(with_count, **({"status": status} if status else {}))
+                if cursor is not None:
+                    meta_data = {"reading_list_count": count, "page_offset": offset, "next_cursor": next_cursor}
+                else:
+                    meta_data = {"reading_list_count": count, "page_number": int(page) + 1, "page_offset": offset}
+
+                if count is None:
+                    meta_data.pop("reading_list_count")
     
                 if result:
                     if return_as_object:
                         return result
                     else:
-                        return {"reading_lists": [row.to_dict() for row in result], **meta_data}
+                        return {"reading_lists": ReadingList.embed_includes(result, ReadingList.to_dicts(result, fields=fields), include), **meta_data}
 
             else:
-                result = begin_query.filter(
+                result = ReadingList.load_fields(begin_query, load_fields).filter(
                     ReadingList.list_id == list_id
                     ).all()
                 if result:
-                    return result[0] if return_as_object else result[0].to_dict()
+                    return result[0] if return_as_object else ReadingList.embed_includes(result, [result[0].to_dict(fields=fields)], include)[0]
 
         except Exception as e:
             app.logger.error('Getting reading list failed')
-            app.logger.debug(f'Error details: {str(e)}, list_id={list_id}, page={page}, offset={offset}')
+            app.logger.debug('Error details: %s, list_id=%s, page=%s, offset=%s', e, list_id, page, offset)
             return {"error" : "No reading list found"}
     
+    @staticmethod
+    def get_summary():
+        """
+        Count the reading lists per status
+
+        :return [dict] status => count for every known status, and their total
+        """
+        app.logger.info('Get reading list summary request received')
+
+        statuses = ReadingList._validations_["status"]["options"]
+        counts = {status: countCache.get(ReadingList.__tablename__, {"status": status}) for status in statuses}
+
+        try:
+            if None in counts.values():
+                app.logger.debug('Counting reading lists per status from database')
+                counts = dict.fromkeys(statuses, 0)
+                # the API only writes these statuses, any other one, e.g. written by hand, is left out like in the cached counts
+                counts.update(db.session.query(ReadingList.status, func.count()).filter(ReadingList.status.in_(statuses)).group_by(ReadingList.status).all())
+                # the same counts answer status= filtered list requests
+                for status in statuses:
+                    countCache.set(ReadingList.__tablename__, counts[status], {"status": status})
+
+            return {"summary": counts, "reading_list_count": sum(counts.values())}
+
+        except Exception as e:
+            app.logger.error('Getting reading list summary failed')
+            app.logger.debug('Error details: %s', e)
+            return {"error": "Reading list summary failed"}
+
     @staticmethod
     def update_a_reading_list(list_id, data):
         """
@@ -138,13 +220,21 @@ class ReadingList(BaseMixin, db.Model):
         :return [dict]
         """
         app.logger.info(f'Update reading list request received for list_id: {list_id}')
-        app.logger.debug(f'Request data: {data}')
+        app.logger.debug('Request data: %s', data)
 
         reading_list = db.session.get(ReadingList, list_id)
         if not reading_list:
             app.logger.error('Reading list not found')
             return {}
 
+        if "status" in data:
+            # the summary and status= filters only know the statuses of _validations_
+            result = ReadingList._validator_.validate({"status": data["status"]}, ["book_id"])
+            if result["errors"]:
+                app.logger.error('Validation failed for reading list update')
+                app.logger.debug('Error details: %s', result["errors"])
+                return {"error": result["errors"]}
+
         try:
             for column in data:
                 if hasattr(reading_list, column):
@@ -156,7 +246,7 @@ class ReadingList(BaseMixin, db.Model):
         except Exception as e:
             db.session.rollback()
             app.logger.error('Reading list update failed due to Exception')
-            app.logger.debug(f'Error details: {str(e)}')
+            app.logger.debug('Error details: %s', e)
             return {"error": "failed to update reading list"}
     
     @staticmethod
@@ -181,7 +271,7 @@ class ReadingList(BaseMixin, db.Model):
             except Exception as e:
                 db.session.rollback()
                 app.logger.error('Reading list deletion failed')
-                app.logger.debug(f'Error details: {str(e)}')
+                app.logger.debug('Error details: %s', e)
                 return {"error": "Reading list deletion failed"}
         else:
             app.logger.warning(f'No reading list found with list_id: {list_id}')
@@ -0,0 +1,113 @@
+"""
+Upload queue consumer: ingestionWorker
+
+Long polls the queue the /v1/books/upload endpoint sends to, fetches the requested
+books of every received message concurrently and stores the ones whose ISBN is new.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from src.app import app
+from src.models.books import Book
+from src.helpers import *
+
+class ingestionWorker:
+
+    def __init__(self, client, queue_url, books_source, concurrency=WORKER_CONCURRENCY, wait_time=WORKER_WAIT_TIME, visibility_timeout=WORKER_VISIBILITY_TIMEOUT):
+        """
+        :param client: [object] SQS client or localQueue
+        :param queue_url: [str] url of the upload queue
+        :param books_source: [function] (keyword, number_of_books) => iterable of book rows
+        :param concurrency: [int] messages fetched at the same time
+        :param wait_time: [int] seconds a receive call waits for messages
+        :param visibility_timeout: [int] seconds a received message is hidden, it is received again if not processed by then
+        """
+        self.client = client
+        self.queue_url = queue_url
+        self.books_source = books_source
+        self.wait_time = wait_time
+        self.visibility_timeout = visibility_timeout
+        self.executor = ThreadPoolExecutor(concurrency, thread_name_prefix="ingestion")
+
+    def run(self, stop=None):
+        """
+        Process messages until stop is set
+
+        :param stop: [object] threading.Event, None to run forever
+        """
+        app.logger.info(f'Ingestion worker polling {self.queue_url}')
+        while not (stop and stop.is_set()):
+            try:
+                self.poll()
+            except Exception as e:
+                app.logger.error('Polling the upload queue failed')
+                app.logger.debug('Error details: %s', e)
+                if stop:
+                    stop.wait(1)
+
+        self.executor.shutdown()
+
+    def poll(self):
+        """
+        Receive up to 10 messages and process them
+
+        :return [dict] counts of the processed batch, None when no message was received
+        """
+        response = self.client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=10,
+            WaitTimeSeconds=self.wait_time,
+            VisibilityTimeout=self.visibility_timeout,
+        )
+        messages = response.get("Messages") or []
+        return self.process(messages) if messages else None
+
+    def process(self, messages):
+        """
+        Fetch the books of the messages concurrently and ingest them as one batch. Messages are deleted
+        once their books are stored, the others become visible again after the visibility timeout
+
+        :param messages: [list] received messages
+
+        :return [dict] counts of the batch
+        """
+        fetches = [self.executor.submit(self._fetch, message) for message in messages]
+
+        rows = []
+        fetched = []
+        for message, fetch in zip(messages, fetches):
+            try:
+                rows.extend(fetch.result())
+                fetched.append(message)
+            except Exception as e:
+                app.logger.error(f'Fetching books for message {message["MessageId"]} failed')
+                app.logger.debug('Error details: %s, body=%s', e, message["Body"])
+
+        result = Book.ingest_books(rows) if rows else {"created": 0, "duplicates": 0, "invalid": 0, "failed": 0}
+        if fetched and not result["failed"]:
+            self.client.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{"Id": str(index), "ReceiptHandle": message["ReceiptHandle"]} for index, message in enumerate(fetched)]
+            )
+
+        app.logger.info(f'Processed {len(fetched)} of {len(messages)} upload messages: {result}')
+        return {"messages": len(messages), "processed": len(fetched) if not result["failed"] else 0, "fetched": len(rows), **result}
+
+    def _fetch(self, message):
+        """
+        :return [list] book rows requested by the message
+        """
+        try:
+            body = json.loads(message["Body"])
+            number_of_books = min(int(body.get("number_of_books") or 0), UPLOAD_MAX_BOOKS)
+            keyword = body.get("keyword")
+        except (ValueError, TypeError, AttributeError):
+            keyword, number_of_books = None, 0
+
+        # retrying a malformed message can't help, it is deleted with the batch
+        if not keyword or number_of_books <= 0:
+            app.logger.warning(f'Ignoring upload message {message["MessageId"]} without keyword or number_of_books')
+            return []
+
+        return list(self.books_source(keyword, number_of_books))
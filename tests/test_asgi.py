@@ -0,0 +1,110 @@
+from unittest import TestCase
+import asyncio
+import json
+import threading
+import pytest
+
+from sqlalchemy import event
+
+pytest.importorskip("aiosqlite")
+
+from src.libs.asgi_bridge import asgiBridge
+
+async def call(bridge, method, path, body=b"", headers=()):
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "method": method, "path": path, "query_string": query.encode(), "http_version": "1.1",
+        "scheme": "http", "server": ("testserver", 80), "client": ("127.0.0.1", 50000),
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+    }
+    messages = [{"type": "http.request", "body": body[:10], "more_body": True}, {"type": "http.request", "body": body[10:], "more_body": False}]
+
+    async def receive():
+        return messages.pop(0)
+
+    sent = []
+    async def send(message):
+        sent.append(message)
+
+    await bridge(scope, receive, send)
+    return sent[0]["status"], dict(sent[0]["headers"]), [message.get("body", b"") for message in sent[1:]]
+
+class TestAsgiBridge(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_class(self, app, db):
+        self.app = app
+        self.db = db
+
+    def test_serves_the_app_with_an_async_engine(self):
+        bridge = asgiBridge(self.app, self.db, "sqlite+aiosqlite:///:memory:", max_body_size=1000)
+        # statements in flight, most statements in flight
+        in_flight = [0, 0]
+
+        @event.listens_for(bridge.engine.sync_engine, "before_cursor_execute")
+        def start(*args):
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+
+        @event.listens_for(bridge.engine.sync_engine, "after_cursor_execute")
+        def stop(*args):
+            in_flight[0] -= 1
+
+        async def scenario():
+            # the tables only exist in the async engine's database
+            async with bridge.engine.begin() as connection:
+                await connection.run_sync(self.db.metadata.create_all)
+
+            book = json.dumps({"ISBN": "9780000000991", "title": "Async Title", "author": "Async Author"}).encode()
+            status, _, body = await call(bridge, "POST", "/v1/books", book, [("content-type", "application/json")])
+            self.assertEqual(status, 201)
+            book_id = json.loads(b"".join(body))["book_id"]
+
+            status, headers, body = await call(bridge, "GET", f"/v1/books/{book_id}")
+            self.assertEqual((status, json.loads(b"".join(body))["title"]), (200, "Async Title"))
+            status, _, _ = await call(bridge, "GET", f"/v1/books/{book_id}", headers=[("if-none-match", headers[b"etag"].decode())])
+            self.assertEqual(status, 304)
+
+            # requests wait for the database at the same time
+            in_flight[1] = 0
+            pages = await asyncio.gather(*[call(bridge, "GET", "/v1/books?cursor=&with_count=false") for _ in range(20)])
+            self.assertTrue(all(json.loads(b"".join(body))["books"][0]["book_id"] == book_id for _, _, body in pages))
+            self.assertGreater(in_flight[1], 1)
+
+            status, headers, body = await call(bridge, "GET", "/v1/books/export")
+            self.assertNotIn(b"content-length", headers)
+            self.assertIn(book_id, b"".join(body).decode())
+
+            status, _, body = await call(bridge, "POST", "/v1/books/bulk", b"[" + b",".join([book] * 100) + b"]", [("content-type", "application/json")])
+            self.assertEqual((status, json.loads(b"".join(body))["code"]), (413, "REQUEST_TOO_LARGE"))
+
+            status, _, _ = await call(bridge, "DELETE", f"/v1/books/{book_id}")
+            self.assertEqual(status, 200)
+
+            # the pool requests check connections out of
+            status, _, body = await call(bridge, "GET", "/v1/_internal/pool")
+            self.assertEqual(json.loads(b"".join(body))["pool"], type(bridge.engine.pool).__name__)
+            await bridge.engine.dispose()
+
+        asyncio.run(scenario())
+
+    def test_runs_startup_tasks_off_the_event_loop(self):
+        threads = []
+        def failing():
+            raise RuntimeError("unavailable")
+        bridge = asgiBridge(self.app, self.db, "sqlite+aiosqlite:///:memory:", on_startup=[lambda: threads.append(threading.get_ident()), failing])
+
+        async def scenario():
+            messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+            sent = []
+            async def receive():
+                return messages.pop(0)
+            async def send(message):
+                sent.append(message["type"])
+
+            await bridge({"type": "lifespan"}, receive, send)
+            return sent
+
+        # a failed task doesn't stop the server from starting
+        self.assertEqual(asyncio.run(scenario()), ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
@@ -1,6 +1,7 @@
 from unittest import TestCase
 import pytest
 import json
+from unittest.mock import patch
 
 from src.models.book_ratings import BookRating
 from src.models.books import Book
@@ -75,6 +76,40 @@ class TestBookRatingOperations(TestCase):
         self.assertIn('ratings', json.loads(response.data))
         self.assertGreaterEqual(len(json.loads(response.data)['ratings']), 0)
 
+    def test_export_ratings(self):
+        self.test_create_rating()
+        response = self.app.test_client().get("/v1/ratings/export?format=csv")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.rating_id, response.data.decode())
+
+    def test_get_book_rating_stats(self):
+        self.test_create_rating()
+        response = self.app.test_client().get(f"/v1/books/{self.new_book['book_id']}/stats")
+        self.assertEqual(response.status_code, 200)
+        stats = json.loads(response.data)
+        self.assertEqual((stats["rating_count"], stats["rating_sum"], stats["rating_avg"]), (1, 4, 4.0))
+        self.assertEqual((stats["rating_min"], stats["rating_max"], stats["histogram"]["4"]), (4, 4, 1))
+
+        self.app.test_client().patch(f"/v1/ratings/{self.rating_id}", data=json.dumps({"rating": 2}), content_type='application/json')
+        stats = json.loads(self.app.test_client().get(f"/v1/books/{self.new_book['book_id']}/stats").data)
+        self.assertEqual((stats["rating_count"], stats["rating_sum"], stats["histogram"]["4"], stats["histogram"]["2"]), (1, 2, 0, 1))
+
+        response = self.app.test_client().patch(f"/v1/ratings/{self.rating_id}", data=json.dumps({"rating": 9}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        self.app.test_client().delete(f"/v1/ratings/{self.rating_id}")
+        stats = json.loads(self.app.test_client().get(f"/v1/books/{self.new_book['book_id']}/stats").data)
+        self.assertEqual((stats["rating_count"], stats["rating_avg"], stats["rating_min"]), (0, None, None))
+
+        response = self.app.test_client().get("/v1/books/non_existent_book_id/stats")
+        self.assertEqual(response.status_code, 404)
+
+        # a failed lookup is an error response, not stats a client could revalidate and keep
+        with patch.object(self.db.session, "get", side_effect=RuntimeError("database failure")):
+            response = self.app.test_client().get(f"/v1/books/{self.new_book['book_id']}/stats")
+        self.assertEqual((response.status_code, json.loads(response.data)["code"]), (500, "RATING_STATS_FAILED"))
+        self.assertNotIn("ETag", response.headers)
+
     def tearDown(self):
         with self.app_context:
             self.db.session.rollback()
@@ -1,8 +1,14 @@
 from unittest import TestCase
 import pytest
 import json
+from datetime import datetime
+from unittest.mock import patch
 
-from src.models.books import Book
+from src.models.books import Book, suggest_index
+from src.helpers import encode_cursor
+from src.controllers.books import upload_producer
+from src.libs.queues import queue_client
+from src.config.config import SQS_QUEUE_URL
 
 class TestBookOperations(TestCase):
     @pytest.fixture(autouse=True)
@@ -96,6 +102,325 @@ class TestBookOperations(TestCase):
         response = self.app.test_client().get("/v1/books")
         self.assertEqual(response.status_code, 200)
 
+    def test_get_books_with_cursor(self):
+        isbns = ["9780000000011", "9780000000012", "9780000000013"]
+        for i, isbn in enumerate(isbns):
+            Book.create_a_book({"ISBN": isbn, "title": f"Cursor Title {i}", "author": "Some Author"})
+
+        titles = []
+        next_cursor = ""
+        while next_cursor is not None:
+            response = self.app.test_client().get(f"/v1/books?page_offset=2&cursor={next_cursor}")
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data)
+            self.assertLessEqual(len(data["books"]), 2)
+            titles += [book["title"] for book in data["books"]]
+            next_cursor = data["next_cursor"]
+
+        self.assertEqual(titles, sorted(titles))
+        self.assertEqual([t for t in titles if t.startswith("Cursor Title")], ["Cursor Title 0", "Cursor Title 1", "Cursor Title 2"])
+
+        response = self.app.test_client().get("/v1/books?orderby=-1&sortby=createdAt&page_offset=1&cursor=")
+        first_page = json.loads(response.data)
+        response = self.app.test_client().get(f"/v1/books?orderby=-1&sortby=createdAt&page_offset=1&cursor={first_page['next_cursor']}")
+        self.assertNotEqual(json.loads(response.data)["books"][0]["book_id"], first_page["books"][0]["book_id"])
+
+        # a cursor of another sort is refused instead of seeking on the wrong column
+        response = self.app.test_client().get(f"/v1/books?page_offset=1&cursor={first_page['next_cursor']}")
+        self.assertEqual(response.status_code, 400)
+        response = self.app.test_client().get(f"/v1/books?orderby=1&sortby=createdAt&page_offset=1&cursor={first_page['next_cursor']}")
+        self.assertEqual(response.status_code, 400)
+
+        # and so is a cursor of the right sort whose values can't be sought on
+        for values in [["created_at", -1, "notadate", "x"], ["created_at", -1, "2023-07-17T14:32:01", ["x"]], ["created_at", -1, "2023-07-17T14:32:01"]]:
+            response = self.app.test_client().get(f"/v1/books?orderby=-1&sortby=createdAt&page_offset=1&cursor={encode_cursor(values)}")
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("cursor", response.data.decode())
+
+        for isbn in isbns:
+            self.db.session.delete(Book.query.filter_by(ISBN=isbn).first())
+        self.db.session.commit()
+
+    def test_get_books_with_invalid_cursor(self):
+        response = self.app.test_client().get("/v1/books?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_books_count(self):
+        response = self.app.test_client().get("/v1/books?page_offset=1")
+        book_count = json.loads(response.data).get("book_count", 0)
+
+        response = self.app.test_client().post(
+            "/v1/books",
+            data=json.dumps(self.new_book),
+            content_type='application/json'
+        )
+        response = self.app.test_client().get("/v1/books?page_offset=1")
+        self.assertEqual(json.loads(response.data)["book_count"], book_count + 1)
+
+        response = self.app.test_client().get("/v1/books?page_offset=1&with_count=estimated")
+        self.assertEqual(json.loads(response.data)["book_count"], book_count + 1)
+
+        response = self.app.test_client().get("/v1/books?page_offset=1&with_count=false")
+        self.assertNotIn("book_count", json.loads(response.data))
+
+        response = self.app.test_client().get("/v1/books?with_count=maybe")
+        self.assertEqual(response.status_code, 400)
+
+    def test_create_books_in_bulk(self):
+        books = [
+            self.new_book,
+            {"ISBN": "9780000000021", "title": "Bulk Title", "author": "Bulk Author"},
+            {"ISBN": "9780000000021", "title": "Bulk Title Again", "author": "Bulk Author"},
+            {"ISBN": "123", "title": "Bad ISBN", "author": "Bulk Author"},
+        ]
+        self.app.test_client().post("/v1/books", data=json.dumps(self.new_book), content_type='application/json')
+
+        response = self.app.test_client().post("/v1/books/bulk", data=json.dumps(books), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        data = json.loads(response.data)
+        self.assertEqual((data["created"], data["failed"]), (1, 3))
+        self.assertEqual(data["results"][0]["error"], "ISBN already exists")
+        self.assertIn("book_id", data["results"][1])
+        self.assertEqual(data["results"][2]["error"], "ISBN is repeated in the request")
+        self.assertIn("ISBN should be between 13 and 13 characters", data["results"][3]["error"])
+
+        ndjson = "\n".join(json.dumps({**book, "ISBN": f"978000000003{i}"}) for i, book in enumerate(books[1:3]))
+        response = self.app.test_client().post("/v1/books/bulk", data=ndjson, content_type='application/x-ndjson')
+        self.assertEqual(json.loads(response.data)["created"], 2)
+
+        for isbn in ["9780000000021", "9780000000030", "9780000000031"]:
+            self.db.session.delete(Book.query.filter_by(ISBN=isbn).first())
+        self.db.session.commit()
+
+    def test_create_books_in_bulk_when_the_suggest_index_fails(self):
+        # the books are committed before the index is updated, they are reported as created
+        with patch.object(suggest_index, "add", side_effect=RuntimeError("index failure")):
+            result = Book.create_books([{"ISBN": "9780000000022", "title": "Indexed Later", "author": "Bulk Author"}])
+        self.assertEqual((result["created"], result["failed"]), (1, 0))
+        self.assertIn("book_id", result["results"][0])
+
+        self.db.session.delete(Book.query.filter_by(ISBN="9780000000022").first())
+        self.db.session.commit()
+
+    def test_create_books_in_bulk_with_invalid_body(self):
+        response = self.app.test_client().post("/v1/books/bulk", data=json.dumps(self.new_book), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_books(self):
+        response = self.app.test_client().post("/v1/books", data=json.dumps(self.new_book), content_type='application/json')
+        book_id = json.loads(response.data)['book_id']
+
+        response = self.app.test_client().get("/v1/books/export")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        books = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertIn(book_id, [book["book_id"] for book in books])
+
+        response = self.app.test_client().get("/v1/books/export?format=csv")
+        lines = response.data.decode().splitlines()
+        self.assertEqual(lines[0], "book_id,ISBN,title,author,created_at,updated_at")
+        self.assertEqual(len(lines), len(books) + 1)
+
+        response = self.app.test_client().get("/v1/books/export?format=xml")
+        self.assertEqual(response.status_code, 400)
+
+    def test_book_to_dicts(self):
+        book = Book(book_id="a" * 32, ISBN="9783161484100", title="Some Title", author="Some Author", created_at=datetime(2023, 7, 17, 14, 32, 1))
+        self.assertEqual(Book.columns_list(), ["book_id", "ISBN", "title", "author", "created_at", "updated_at"])
+        self.assertEqual(Book.to_dicts([book]), [book.to_dict()])
+        self.assertEqual(book.to_dict(), {"book_id": "a" * 32, "ISBN": "9783161484100", "title": "Some Title", "author": "Some Author", "created_at": "2023-07-17T14:32:01Z"})
+        self.assertEqual(book.to_dict(dt_to_string=False, remove_null=False, hide_fields=["ISBN"])["created_at"], datetime(2023, 7, 17, 14, 32, 1))
+        self.assertIsNone(book.to_dict(remove_null=False)["updated_at"])
+
+    def test_get_books_with_fields(self):
+        response = self.app.test_client().post("/v1/books", data=json.dumps(self.new_book), content_type='application/json')
+        book_id = json.loads(response.data)['book_id']
+
+        response = self.app.test_client().get("/v1/books?fields=book_id,title&cursor=")
+        self.assertEqual(response.status_code, 200)
+        for book in json.loads(response.data)["books"]:
+            self.assertEqual(list(book), ["book_id", "title"])
+
+        response = self.app.test_client().get(f"/v1/books/{book_id}?fields=title")
+        self.assertEqual(json.loads(response.data), {"title": self.new_book["title"]})
+
+        response = self.app.test_client().get(f"/v1/books/isbn/{self.new_book['ISBN']}?fields=ISBN,author")
+        self.assertEqual(json.loads(response.data), {"ISBN": self.new_book["ISBN"], "author": self.new_book["author"]})
+
+        response = self.app.test_client().get("/v1/books?fields=book_id,password")
+        self.assertEqual(response.status_code, 400)
+
+    def test_book_cache(self):
+        response = self.app.test_client().post("/v1/books", data=json.dumps(self.new_book), content_type='application/json')
+        book_id = json.loads(response.data)['book_id']
+
+        stats = json.loads(self.app.test_client().get("/v1/_internal/cache").data)["book_cache"]
+        self.app.test_client().get(f"/v1/books/{book_id}")
+        self.app.test_client().get(f"/v1/books/isbn/{self.new_book['ISBN']}")
+        response = self.app.test_client().get(f"/v1/books/{book_id}?fields=title")
+        self.assertEqual(json.loads(response.data), {"title": self.new_book["title"]})
+        # the same body has the same ETag whatever the order of the fields
+        etags = [self.app.test_client().get(f"/v1/books/{book_id}?fields={fields}").headers["ETag"] for fields in ["title,author", "author,title"]]
+        self.assertEqual(etags[0], etags[1])
+
+        new_stats = json.loads(self.app.test_client().get("/v1/_internal/cache").data)["book_cache"]
+        self.assertEqual(new_stats["misses"], stats["misses"] + 1)
+        self.assertEqual(new_stats["hits"], stats["hits"] + 4)
+
+        self.app.test_client().patch(f"/v1/books/{book_id}", data=json.dumps({"ISBN": "9780000000041"}), content_type='application/json')
+        response = self.app.test_client().get(f"/v1/books/isbn/{self.new_book['ISBN']}")
+        self.assertEqual(response.status_code, 404)
+        response = self.app.test_client().get(f"/v1/books/{book_id}")
+        self.assertEqual(json.loads(response.data)["ISBN"], "9780000000041")
+
+        self.app.test_client().delete(f"/v1/books/{book_id}")
+        response = self.app.test_client().get("/v1/books/isbn/9780000000041")
+        self.assertEqual(response.status_code, 404)
+
+    def test_get_book_not_modified(self):
+        response = self.app.test_client().post("/v1/books", data=json.dumps(self.new_book), content_type='application/json')
+        book_id = json.loads(response.data)['book_id']
+
+        response = self.app.test_client().get(f"/v1/books/{book_id}")
+        etag = response.headers["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+
+        response = self.app.test_client().get(f"/v1/books/{book_id}", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+
+        self.app.test_client().patch(f"/v1/books/{book_id}", data=json.dumps({"title": "Updated Title"}), content_type='application/json')
+        response = self.app.test_client().get(f"/v1/books/{book_id}", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+        response = self.app.test_client().get("/v1/books")
+        self.assertTrue(response.headers["ETag"].startswith("W/"))
+        response = self.app.test_client().get("/v1/books", headers={"If-None-Match": response.headers["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+    def test_get_books_by_ids_and_isbns(self):
+        books = [{"ISBN": f"978000000005{i}", "title": f"Multi Get Title {i}", "author": "Some Author"} for i in range(3)]
+        response = self.app.test_client().post("/v1/books/bulk", data=json.dumps(books), content_type='application/json')
+        book_ids = [result["book_id"] for result in json.loads(response.data)["results"]]
+        self.app.test_client().get(f"/v1/books/{book_ids[1]}")
+
+        response = self.app.test_client().get(f"/v1/books?ids={book_ids[2]},missing_id,{book_ids[0]},{book_ids[1]}&fields=book_id,title")
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual([book["book_id"] for book in data["books"]], [book_ids[2], book_ids[0], book_ids[1]])
+        self.assertEqual(list(data["books"][0]), ["book_id", "title"])
+        self.assertEqual(data["missing"], ["missing_id"])
+
+        response = self.app.test_client().post(
+            "/v1/books/isbn/batch",
+            data=json.dumps({"isbns": ["9780000000052", "9780000000059", "9780000000050"]}),
+            content_type='application/json'
+        )
+        data = json.loads(response.data)
+        self.assertEqual([book["title"] for book in data["books"]], ["Multi Get Title 2", "Multi Get Title 0"])
+        self.assertEqual(data["missing"], ["9780000000059"])
+
+        response = self.app.test_client().post("/v1/books/isbn/batch", data=json.dumps({"isbns": []}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        for book_id in book_ids:
+            self.app.test_client().delete(f"/v1/books/{book_id}")
+
+    def test_search_books(self):
+        books = [
+            {"ISBN": "9780000000060", "title": "The Silent Harbor", "author": "Anna Murphy"},
+            {"ISBN": "9780000000061", "title": "Harbors of Dublin", "author": "Declan Harbor"},
+            {"ISBN": "9780000000062", "title": "Silent Spring", "author": "Rachel Carson"},
+        ]
+        response = self.app.test_client().post("/v1/books/bulk", data=json.dumps(books), content_type='application/json')
+        book_ids = [result["book_id"] for result in json.loads(response.data)["results"]]
+
+        # ranked, title and author words both match, words are stemmed
+        response = self.app.test_client().get("/v1/books/search?q=harbor&page_offset=1&fields=book_id,title")
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data["books"], [{"book_id": book_ids[1], "title": "Harbors of Dublin"}])
+
+        harbor_cursor = data["next_cursor"]
+        response = self.app.test_client().get(f"/v1/books/search?q=harbor&page_offset=1&cursor={harbor_cursor}")
+        data = json.loads(response.data)
+        self.assertEqual([book["title"] for book in data["books"]], ["The Silent Harbor"])
+        self.assertIsNone(data["next_cursor"])
+
+        response = self.app.test_client().get("/v1/books/search?q=Silent+MURPHY")
+        self.assertEqual([book["book_id"] for book in json.loads(response.data)["books"]], [book_ids[0]])
+
+        # kept in sync by updates and deletes
+        self.app.test_client().patch(f"/v1/books/{book_ids[2]}", data=json.dumps({"title": "Quiet Spring"}), content_type='application/json')
+        response = self.app.test_client().get("/v1/books/search?q=silent")
+        self.assertEqual([book["book_id"] for book in json.loads(response.data)["books"]], [book_ids[0]])
+        self.app.test_client().delete(f"/v1/books/{book_ids[0]}")
+        response = self.app.test_client().get("/v1/books/search?q=silent")
+        self.assertEqual(json.loads(response.data)["books"], [])
+
+        self.assertEqual(self.app.test_client().get("/v1/books/search?q=").status_code, 400)
+        # a cursor only continues its own search
+        self.assertEqual(self.app.test_client().get(f"/v1/books/search?q=spring&cursor={harbor_cursor}").status_code, 400)
+
+        for book_id in book_ids[1:]:
+            self.app.test_client().delete(f"/v1/books/{book_id}")
+
+    def test_suggest_books(self):
+        books = [
+            {"ISBN": "9780000000070", "title": "The Lighthouse Keeper", "author": "Anna Murphy"},
+            {"ISBN": "9780000000071", "title": "Lighthouses of Dublin", "author": "Declan Light"},
+        ]
+        response = self.app.test_client().post("/v1/books/bulk", data=json.dumps(books), content_type='application/json')
+        book_ids = [result["book_id"] for result in json.loads(response.data)["results"]]
+        self.assertEqual(Book.suggest_books("light", 10, "memory")["suggestions"][0]["title"], "Lighthouses of Dublin")
+
+        # a rating makes the keeper the most popular match
+        response = self.app.test_client().post("/v1/readinglists", data=json.dumps({"book_id": book_ids[0], "status": "finished"}), content_type='application/json')
+        list_id = json.loads(response.data)["list_id"]
+        response = self.app.test_client().post("/v1/ratings", data=json.dumps({"book_id": book_ids[0], "list_id": list_id, "rating": 4}), content_type='application/json')
+        rating_id = json.loads(response.data)["rating_id"]
+
+        for backend in ["database", "memory"]:
+            self.assertEqual([book["book_id"] for book in Book.suggest_books("LIGHT", 10, backend)["suggestions"]], book_ids)
+            self.assertEqual([book["book_id"] for book in Book.suggest_books("the light", 10, backend)["suggestions"]], book_ids[:1])
+            self.assertEqual(Book.suggest_books("ighthouse", 10, backend)["suggestions"], [])
+
+        response = self.app.test_client().get("/v1/books/suggest?prefix=lighthouses+o&limit=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)["suggestions"], [{"book_id": book_ids[1], "title": "Lighthouses of Dublin", "author": "Declan Light"}])
+        self.assertEqual(self.app.test_client().get("/v1/books/suggest?prefix=+").status_code, 400)
+        self.assertEqual(self.app.test_client().get("/v1/books/suggest?prefix=light&limit=0").status_code, 400)
+
+        # every prefix of a word whose stem is shorter still matches, while it is typed
+        self.app.test_client().patch(f"/v1/books/{book_ids[1]}", data=json.dumps({"title": "Running Lighthouses"}), content_type='application/json')
+        for backend in ["database", "memory"]:
+            for length in range(1, len("running") + 1):
+                self.assertEqual([book["book_id"] for book in Book.suggest_books("running"[:length], 10, backend)["suggestions"]], book_ids[1:], "running"[:length])
+
+        # the in-process index follows updates and deletes
+        self.app.test_client().patch(f"/v1/books/{book_ids[0]}", data=json.dumps({"title": "The Keeper"}), content_type='application/json')
+        self.app.test_client().delete(f"/v1/ratings/{rating_id}")
+        self.app.test_client().delete(f"/v1/reading_lists/{list_id}")
+        self.app.test_client().delete(f"/v1/books/{book_ids[1]}")
+        self.assertEqual(Book.suggest_books("light", 10, "memory")["suggestions"], [])
+        self.assertEqual(Book.suggest_books("the k", 10, "memory")["suggestions"][0]["book_id"], book_ids[0])
+
+        self.app.test_client().delete(f"/v1/books/{book_ids[0]}")
+
+    def test_upload_books(self):
+        response = self.app.test_client().post(
+            "v1/books/upload",
+            data=json.dumps({"number_of_books": 20, "keyword": "python"}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(upload_producer.flush(5))
+
+        message = queue_client().receive_message(SQS_QUEUE_URL, MaxNumberOfMessages=10)["Messages"][0]
+        self.assertEqual(json.loads(message["Body"]), {"number_of_books": 20, "keyword": "python"})
+        queue_client().delete_message(SQS_QUEUE_URL, message["ReceiptHandle"])
+
     def tearDown(self):
         with self.app_context:
             self.db.session.rollback()
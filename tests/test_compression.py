@@ -0,0 +1,72 @@
+from unittest import TestCase
+import gzip
+import json
+import zlib
+import pytest
+
+from src.models.books import Book
+from src.libs.compression import compress_chunks, negotiate
+from src.controllers.compression import compressed_cache
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+class TestCompression(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_class(self, app, db):
+        self.app = app
+        self.db = db
+
+    def test_compresses_list_pages(self):
+        books = [{"ISBN": f"97800000010{i:02d}", "title": f"Compressible Title {i}", "author": "Some Author"} for i in range(20)]
+        self.app.test_client().post("/v1/books/bulk", data=json.dumps(books), content_type='application/json')
+
+        plain = self.app.test_client().get("/v1/books?limit=20")
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertIn("Accept-Encoding", plain.headers["Vary"])
+
+        hits = compressed_cache.hits
+        for _ in range(2):
+            response = self.app.test_client().get("/v1/books?limit=20", headers={"Accept-Encoding": "gzip, deflate"})
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertEqual(int(response.headers["Content-Length"]), len(response.data))
+            self.assertLess(len(response.data), len(plain.data))
+            self.assertEqual(gzip.decompress(response.data), plain.data)
+        # the second response reused the body compressed for the first one
+        self.assertEqual(compressed_cache.hits, hits + 1)
+
+        # still revalidated with the ETag of the compressed response
+        response = self.app.test_client().get("/v1/books?limit=20", headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+
+        # below COMPRESSION_MIN_SIZE
+        response = self.app.test_client().get("/v1/books/missing_book_id", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+
+        # streamed exports are compressed chunk by chunk
+        response = self.app.test_client().get("/v1/books/export", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Length", response.headers)
+        self.assertIn(b"Compressible Title 19", gzip.decompress(response.data))
+
+        for book in books:
+            self.db.session.delete(Book.query.filter_by(ISBN=book["ISBN"]).first())
+        self.db.session.commit()
+
+    def test_negotiate_and_compress_chunks(self):
+        def accept(header):
+            return parse_accept_header(header, Accept)
+
+        self.assertEqual(negotiate(accept("gzip, br"), ["br", "gzip"]), "br")
+        self.assertEqual(negotiate(accept("gzip;q=1.0, br;q=0.5"), ["br", "gzip"]), "gzip")
+        self.assertEqual(negotiate(accept("*"), ["gzip"]), "gzip")
+        self.assertIsNone(negotiate(accept("gzip;q=0, deflate"), ["gzip"]))
+        self.assertIsNone(negotiate(accept(""), ["gzip"]))
+
+        # every chunk can be decoded as soon as it arrives
+        decompressor = zlib.decompressobj(31)
+        chunks = compress_chunks(iter([b"first line\n", b"", b"second line\n"]), "gzip", 6)
+        self.assertEqual(decompressor.decompress(next(chunks)), b"first line\n")
+        self.assertEqual(decompressor.decompress(next(chunks)), b"second line\n")
+        self.assertEqual(decompressor.decompress(b"".join(chunks)), b"")
+        self.assertTrue(decompressor.eof)
@@ -0,0 +1,41 @@
+from unittest import TestCase
+import os
+
+from src.libs.google_books import googleBooksClient
+from src.libs.google_books_stub import googleBooksStub
+from src.models.books import Book
+
+RECORDINGS = os.path.join(os.path.dirname(__file__), "fixtures", "google_books_volumes.json")
+
+class TestGoogleBooksClient(TestCase):
+    def setUp(self):
+        self.stub = googleBooksStub.from_file(RECORDINGS).start()
+        self.client = googleBooksClient(self.stub.url, concurrency=4, backoff=0)
+
+    def test_fetch_all_pages(self):
+        books = list(self.client.fetch("python", 500))
+
+        # 110 recorded volumes, 9 without an ISBN-13 and 2 repeated on the third page
+        self.assertEqual(len(books), 101)
+        self.assertEqual(len({book["ISBN"] for book in books}), 101)
+        self.assertEqual(books[0]["ISBN"], "9780001000018")
+        self.assertFalse([result for result in Book._validator_.validate_many(books, Book._restrict_in_creation_) if result["errors"]])
+        # 3 pages with results, then at most a window of pages requested ahead past the last one
+        self.assertLessEqual(self.client.requests, 3 + self.client.concurrency)
+
+    def test_fetch_stops_when_enough_books_were_found(self):
+        self.assertEqual(len(list(self.client.fetch("python", 10))), 10)
+        self.assertEqual(self.client.requests, 1)
+
+        self.assertEqual(len(list(self.client.fetch("flask", 10))), 10)
+        self.assertEqual(list(self.client.fetch("unknown", 10)), [])
+
+    def test_fetch_retries_failed_pages(self):
+        # one page at a time, so every other request fails and its retry succeeds
+        self.stub.fail_every = 2
+        client = googleBooksClient(self.stub.url, concurrency=1, backoff=0)
+        self.assertEqual(len(list(client.fetch("python", 500))), 101)
+        self.assertGreater(self.stub.requests, 4)
+
+    def tearDown(self):
+        self.stub.stop()
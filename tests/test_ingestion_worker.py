@@ -0,0 +1,85 @@
+from unittest import TestCase
+import pytest
+import json
+
+from src.models.books import Book
+from src.libs.queues import localQueue
+from src.libs.google_books import volume_to_book
+from src.workers.ingestion import ingestionWorker
+
+BOOKS = {
+    "python": [
+        {"ISBN": "9780000000001", "title": "Python One", "author": "Author One"},
+        {"ISBN": "9780000000002", "title": "Python Two", "author": "Author Two"},
+        {"ISBN": "9780000000003", "title": "", "author": "No Title"},
+    ],
+    "flask": [
+        {"ISBN": "9780000000002", "title": "Python Two", "author": "Author Two"},
+        {"ISBN": "9780000000004", "title": "Flask One", "author": "Author Four"},
+    ],
+}
+
+class TestIngestionWorker(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_class(self, app, db):
+        self.app = app
+        self.db = db
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.db.create_all()
+
+        self.existing_book = Book(ISBN="9780000000004", title="Flask One", author="Author Four")
+        self.db.session.add(self.existing_book)
+        self.db.session.commit()
+
+        self.queue = localQueue()
+        self.requests = []
+        self.worker = ingestionWorker(self.queue, "local", self.books_source, wait_time=0)
+
+    def books_source(self, keyword, number_of_books):
+        self.requests.append((keyword, number_of_books))
+        if keyword == "broken":
+            raise ConnectionError("books source is down")
+        return BOOKS[keyword][:number_of_books]
+
+    def send(self, body):
+        self.queue.send_message("local", json.dumps(body))
+
+    def test_ingests_new_isbns(self):
+        self.send({"number_of_books": 10, "keyword": "python"})
+        self.send({"number_of_books": 10, "keyword": "flask"})
+        self.send({"keyword": "no number"})
+
+        result = self.worker.poll()
+        self.assertEqual(result, {"messages": 3, "processed": 3, "fetched": 5, "created": 2, "duplicates": 2, "invalid": 1, "failed": 0})
+        self.assertEqual(sorted(self.requests), [("flask", 10), ("python", 10)])
+        self.assertEqual(Book.query.filter(Book.ISBN.in_(["9780000000001", "9780000000002"])).count(), 2)
+
+        # processed messages are deleted
+        self.assertIsNone(self.worker.poll())
+        self.assertEqual(self.queue._in_flight, {})
+
+    def test_keeps_messages_which_failed(self):
+        self.worker.visibility_timeout = 0
+        self.send({"number_of_books": 1, "keyword": "broken"})
+
+        self.assertEqual(self.worker.poll()["processed"], 0)
+        self.assertEqual(self.worker.poll()["messages"], 1)
+
+    def test_volume_to_book(self):
+        volume = {"volumeInfo": {
+            "title": "Fluent Python",
+            "authors": ["Luciano Ramalho"],
+            "industryIdentifiers": [{"type": "ISBN_10", "identifier": "1492056359"}, {"type": "ISBN_13", "identifier": "9781492056355"}],
+        }}
+        book = volume_to_book(volume)
+        self.assertEqual(book, {"ISBN": "9781492056355", "title": "Fluent Python", "author": "Luciano Ramalho"})
+        self.assertFalse(Book._validator_.validate(book, Book._restrict_in_creation_)["errors"])
+        self.assertIsNone(volume_to_book({"volumeInfo": {"title": "No ISBN", "authors": ["Someone"]}}))
+
+    def tearDown(self):
+        with self.app_context:
+            self.db.session.rollback()
+            Book.query.filter(Book.ISBN.like("978000000000%")).delete(synchronize_session=False)
+            self.db.session.commit()
+        self.app_context.pop()
@@ -0,0 +1,84 @@
+from unittest import TestCase
+import json
+import pytest
+
+from sqlalchemy import create_engine, text
+
+from benchmarks.seed import datasetGenerator, isbn13, manifest, seed
+from benchmarks.load import idPicker, loadDriver, parse_mix, percentiles
+
+def is_valid_isbn13(isbn):
+    return len(isbn) == 13 and isbn.isdigit() and sum(int(digit) * (3 if position % 2 else 1) for position, digit in enumerate(isbn)) % 10 == 0
+
+class TestSeed(TestCase):
+    def test_isbn13(self):
+        self.assertEqual(isbn13("978", 316148410), "9783161484100")
+        self.assertTrue(all(is_valid_isbn13(isbn13("979", number)) for number in range(0, 10 ** 9, 7654321)))
+
+    def test_seeds_skewed_dataset(self):
+        engine = create_engine("sqlite://")
+        generator = datasetGenerator(2000, lists_share=0.5, ratings_share=0.6, seed=7)
+        counts = seed(engine, generator, batch_size=500, report=lambda *args: None)
+
+        with engine.connect() as connection:
+            isbns = connection.execute(text('SELECT "ISBN" FROM books')).scalars().all()
+            listed = set(connection.execute(text("SELECT book_id FROM reading_lists")).scalars())
+            ratings = connection.execute(text("SELECT COUNT(*), SUM(rating) FROM book_ratings")).one()
+            stats = connection.execute(text("SELECT SUM(rating_count), SUM(rating_sum) FROM book_rating_stats")).one()
+
+        self.assertEqual(counts["books"], 2000)
+        self.assertEqual(counts["reading_lists"], 1000)
+        self.assertEqual(len(set(isbns)), 2000)
+        self.assertTrue(all(is_valid_isbn13(isbn) for isbn in isbns))
+        self.assertEqual(tuple(ratings), tuple(stats))
+
+        # the most popular books are nearly all on a reading list, the least popular ones rarely
+        self.assertGreater(len(listed & set(generator.book_ids[:200])), 190)
+        self.assertLess(len(listed & set(generator.book_ids[-200:])), 100)
+
+        ids = manifest(generator, counts, size=100)
+        self.assertEqual(ids["books"][0]["book_id"], generator.book_ids[0])
+        self.assertEqual(len(ids["reading_lists"]), 100)
+
+    def test_refuses_to_seed_a_populated_database(self):
+        engine = create_engine("sqlite://")
+        seed(engine, datasetGenerator(100, seed=1), report=lambda *args: None)
+
+        with self.assertRaises(ValueError):
+            seed(engine, datasetGenerator(100, seed=2), report=lambda *args: None)
+
+        counts = seed(engine, datasetGenerator(100, seed=2), truncate=True, report=lambda *args: None)
+        self.assertEqual(counts["books"], 100)
+
+class TestLoadDriver(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_class(self, app, db):
+        self.app = app
+        self.db = db
+
+    def test_reports_per_route(self):
+        client = self.app.test_client()
+        calls = []
+
+        def send(method, path, body):
+            calls.append(path)
+            response = client.open(path, method=method, data=json.dumps(body) if body else None, content_type="application/json")
+            return response.status_code, response.data
+
+        picker = idPicker({"books": [{"book_id": "a" * 32, "ISBN": "9783161484100"}]})
+        driver = loadDriver(send, parse_mix("get_book=3,get_reading_lists_summary=1"), picker, rps=200, duration=0.5, concurrency=1)
+        report = driver.run()
+
+        self.assertEqual(sorted(report["routes"]), ["get_book", "get_reading_lists_summary"])
+        self.assertEqual(report["total"]["requests"], len(calls))
+        self.assertEqual(report["routes"]["get_book"]["client_errors"], report["routes"]["get_book"]["requests"])
+        self.assertEqual(report["routes"]["get_reading_lists_summary"]["statuses"], {"200": report["routes"]["get_reading_lists_summary"]["requests"]})
+        self.assertEqual(report["total"]["errors"], 0)
+
+    def test_parse_mix_and_percentiles(self):
+        self.assertEqual(parse_mix("get_book=2,get_books"), {"get_book": 2.0, "get_books": 1.0})
+        with self.assertRaises(ValueError):
+            parse_mix("get_everything=1")
+
+        latencies = [number / 1000 for number in range(1, 101)]
+        self.assertEqual(percentiles(latencies), {"p50_ms": 50.0, "p95_ms": 95.0, "p99_ms": 99.0, "max_ms": 100.0})
@@ -0,0 +1,83 @@
+from unittest import TestCase
+import pytest
+import json
+import logging
+import os
+import queue
+import sys
+
+from src.libs.structured_logging import jsonFormatter, requestContextFilter, setup_logging, structuredQueueHandler
+
+class TestLogging(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_class(self, app, tmp_path):
+        self.app = app
+        self.tmp_path = tmp_path
+
+    def record(self, level=logging.INFO, msg="Request data: %s", args=({"ISBN": "9783161484100"},)):
+        return logging.LogRecord("book_status_api", level, __file__, 1, msg, args, None)
+
+    def test_request_id(self):
+        response = self.app.test_client().get("v1/", headers={"X-Request-ID": "abc123"})
+        self.assertEqual(response.headers["X-Request-ID"], "abc123")
+        self.assertEqual(len(self.app.test_client().get("v1/").headers["X-Request-ID"]), 32)
+
+    def test_json_records(self):
+        record = self.record()
+        with self.app.test_request_context("/v1/books", headers={"X-Request-ID": "abc123"}):
+            self.app.preprocess_request()
+            self.assertTrue(requestContextFilter().filter(record))
+
+        entry = json.loads(jsonFormatter().format(record))
+        self.assertEqual(entry["message"], "Request data: {'ISBN': '9783161484100'}")
+        self.assertEqual((entry["level"], entry["request_id"], entry["method"], entry["route"]), ("INFO", "abc123", "GET", "/v1/books"))
+
+    def test_exceptions_through_the_queue(self):
+        handler = structuredQueueHandler(queue.SimpleQueue())
+        logger = logging.getLogger("test_queued_exceptions")
+        logger.propagate = False
+        logger.addHandler(handler)
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            logger.exception("Request failed")
+        logger.removeHandler(handler)
+
+        entry = json.loads(jsonFormatter().format(handler.queue.get_nowait()))
+        self.assertEqual(entry["message"], "Request failed")
+        self.assertTrue(entry["exc_info"].startswith("Traceback"))
+        self.assertIn("RuntimeError: boom", entry["exc_info"])
+
+    def test_sampling(self):
+        never = requestContextFilter({"/v1/books": 0})
+        with self.app.test_request_context("/v1/books"):
+            self.app.preprocess_request()
+            self.assertFalse(never.filter(self.record()))
+            self.assertTrue(never.filter(self.record(logging.ERROR)))
+
+        with self.app.test_request_context("/v1/books/isbn/9783161484100"):
+            self.app.preprocess_request()
+            self.assertTrue(never.filter(self.record()))
+
+        # outside requests, e.g. in the ingestion worker
+        self.assertTrue(never.filter(self.record()))
+
+    def test_logs_from_a_forked_process(self):
+        logger = logging.getLogger("test_forked_logging")
+        logger.propagate = False
+        setup_logging(logger)
+        path = self.tmp_path / "child.log"
+
+        pid = os.fork()
+        if pid == 0:
+            with open(path, "w") as output:
+                os.dup2(output.fileno(), sys.stderr.fileno())
+                logger.info("Logged by the child")
+                # the child's own listener writes out the queued records
+                logger.handlers[0].listener.stop()
+                sys.stderr.flush()
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+        logger.handlers.clear()
+        self.assertEqual(json.loads(path.read_text())["message"], "Logged by the child")
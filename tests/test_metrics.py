@@ -0,0 +1,74 @@
+from unittest import TestCase
+import pytest
+import os
+import threading
+
+from src.libs.metrics import requestMetrics
+from src.controllers.metrics import request_metrics
+
+class TestRequestMetrics(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_class(self, app, db, tmp_path):
+        self.app = app
+        self.db = db
+        self.tmp_path = tmp_path
+
+    def test_get_metrics(self):
+        self.app.test_client().get("v1/books/missing_book_id")
+        self.app.test_client().get("v1/books/missing_book_id")
+
+        response = self.app.test_client().get("metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+
+        text = response.data.decode()
+        labels = 'route="/v1/books/<book_id>",method="GET",status="404"'
+        totals = request_metrics.totals()["/v1/books/<book_id>\tGET\t404"]
+        self.assertIn(f'http_requests_total{{{labels}}} {totals[0]}', text)
+        self.assertIn(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {totals[0]}', text)
+        self.assertIn(f'http_response_size_bytes_count{{{labels}}} {totals[0]}', text)
+        # the lookup ran a query
+        self.assertGreater(totals[6], 0)
+
+    def test_histograms(self):
+        metrics = requestMetrics()
+        metrics.observe("/v1/books", "GET", 200, 0.003, 1500, 0.001)
+        metrics.observe("/v1/books", "GET", 200, 0.2, 50, 0.1)
+
+        text = metrics.render()
+        self.assertIn('http_requests_total{route="/v1/books",method="GET",status="200"} 2', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="/v1/books",method="GET",status="200",le="0.005"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="/v1/books",method="GET",status="200",le="0.25"} 2', text)
+        self.assertIn('http_response_size_bytes_sum{route="/v1/books",method="GET",status="200"} 1550', text)
+        self.assertIn('http_response_size_bytes_bucket{route="/v1/books",method="GET",status="200",le="100"} 1', text)
+
+    def test_processes_share_a_directory(self):
+        metrics = requestMetrics(str(self.tmp_path))
+        metrics.observe("/v1/books", "GET", 200, 0.01, 100, 0)
+
+        pid = os.fork()
+        if pid == 0:
+            metrics.observe("/v1/books", "GET", 200, 0.01, 100, 0)
+            metrics.observe("/v1/books", "POST", 201, 0.01, 100, 0)
+            metrics.flush()
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+        totals = metrics.collect()
+        self.assertEqual(totals["/v1/books\tGET\t200"][0], 2)
+        self.assertEqual(totals["/v1/books\tPOST\t201"][0], 1)
+
+        # the save of the exited child is folded into one file by the next flush
+        metrics.flush()
+        self.assertEqual(sorted(os.listdir(self.tmp_path)), [".metrics.lock", f"metrics_{os.getpid()}.json", "metrics_exited.json"])
+        self.assertEqual(metrics.collect()["/v1/books\tGET\t200"][0], 2)
+
+    def test_keeps_the_totals_of_exited_threads(self):
+        metrics = requestMetrics()
+        for _ in range(3):
+            thread = threading.Thread(target=metrics.observe, args=("/v1/books", "GET", 200, 0.01, 100, 0))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(len(metrics._stores), 0)
+        self.assertEqual(metrics.totals()["/v1/books\tGET\t200"][0], 3)
@@ -0,0 +1,42 @@
+from unittest import TestCase
+import pytest
+import json
+
+from sqlalchemy import create_engine, exc, text
+from src.libs.pool_stats import poolStats, timedQueuePool
+
+class TestPoolStats(TestCase):
+    @pytest.fixture(autouse=True)
+    def setup_class(self, app, tmp_path):
+        self.app = app
+        self.engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=timedQueuePool, pool_size=1, max_overflow=1, pool_timeout=0.05)
+        poolStats.reset()
+
+    def test_pool_stats(self):
+        first = self.engine.connect()
+        second = self.engine.connect()
+        first.execute(text("SELECT 1"))
+
+        stats = poolStats.stats(self.engine.pool)
+        self.assertEqual((stats["size"], stats["checked_out"], stats["idle"], stats["overflow"]), (1, 2, 0, 1))
+
+        with self.assertRaises(exc.TimeoutError):
+            self.engine.connect()
+
+        first.close()
+        second.close()
+        stats = poolStats.stats(self.engine.pool)
+        self.assertEqual((stats["checked_out"], stats["idle"]), (0, 1))
+        self.assertEqual((stats["connects"], stats["checkouts"], stats["timeouts"]), (2, 2, 1))
+        self.assertEqual(stats["wait_seconds"]["count"], 3)
+        # the timed out checkout waited pool_timeout
+        self.assertGreaterEqual(stats["wait_seconds"]["sum"], 0.05)
+        self.assertEqual(stats["wait_seconds"]["buckets"][-1], {"le": "+Inf", "count": 3})
+
+    def test_get_pool_stats(self):
+        response = self.app.test_client().get("v1/_internal/pool")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("wait_seconds", json.loads(response.data))
+
+    def tearDown(self):
+        self.engine.dispose()
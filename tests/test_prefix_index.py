@@ -0,0 +1,101 @@
+from unittest import TestCase
+import threading
+import time
+
+from src.libs.prefix_index import prefixIndex
+
+BOOKS = [
+    ("1", ["The Silent River", "Anna Murphy"], (0, 0)),
+    ("2", ["Rivers of Dublin", "Declan River"], (0, 0)),
+    ("3", ["Silent Spring", "Rachel Carson"], (2, 9)),
+    ("4", ["Murphy's Law", "Arthur Bloch"], (1, 4)),
+]
+
+class TestPrefixIndex(TestCase):
+    def build(self, **kwargs):
+        index = prefixIndex(lambda: [(doc_id, texts, popularity, {"title": texts[0]}) for doc_id, texts, popularity in BOOKS], **kwargs)
+        index.ensure_loaded()
+        return index
+
+    def ids(self, index, prefix, k=10):
+        return [doc_id for doc_id, _ in index.search(prefix, k)]
+
+    def test_matches_word_prefixes_by_popularity(self):
+        index = self.build()
+
+        self.assertEqual(self.ids(index, "ri"), ["2", "1"])
+        self.assertEqual(self.ids(index, "  SILENT   ri"), ["1"])
+        self.assertEqual(self.ids(index, "silent"), ["3", "1"])
+        self.assertEqual(self.ids(index, "murphy"), ["4", "1"])
+        self.assertEqual(self.ids(index, "murphy", k=1), ["4"])
+        self.assertEqual(self.ids(index, "ilent"), [])
+        self.assertEqual(index.search("silent")[0][1], {"title": "Silent Spring"})
+
+    def test_incremental_updates(self):
+        index = self.build(scan_limit=0)
+        self.assertEqual(self.ids(index, "s"), ["3", "4", "1"])
+        self.assertEqual(index.stats()["cached_prefixes"], 1)
+
+        index.set_popularity("1", (5, 20))
+        self.assertEqual(self.ids(index, "s"), ["1", "3", "4"])
+
+        index.add("1", ["Quiet Waters", "Anna Murphy"], None, {"title": "Quiet Waters"})
+        self.assertEqual(self.ids(index, "silent"), ["3"])
+        # the popularity is kept when only the texts change
+        self.assertEqual(self.ids(index, "murphy"), ["1", "4"])
+
+        index.add("5", ["Silent Night", "Someone"], (0, 0), {"title": "Silent Night"})
+        index.remove("3")
+        self.assertEqual(self.ids(index, "silent"), ["5"])
+        self.assertEqual(index.stats()["documents"], 4)
+
+    def test_new_documents_rank_with_loaded_ones(self):
+        index = self.build(default_popularity=(0, 0))
+        index.add("5", ["Silent Night", "Someone"], None, {"title": "Silent Night"})
+        index.add("6", ["Silent Hill", "Someone"], 1, {"title": "Silent Hill"})
+        self.assertEqual(self.ids(index, "silent"), ["3", "6", "5", "1"])
+
+    def test_keeps_cached_results_a_write_does_not_change(self):
+        index = self.build(scan_limit=0)
+        self.assertEqual(self.ids(index, "s", k=2), ["3", "4"])
+
+        # not popular enough to rank in the cached top 2
+        index.add("5", ["Silent Night", "Someone"], (0, 0), {"title": "Silent Night"})
+        self.assertEqual(index.stats()["cached_prefixes"], 1)
+        self.assertEqual(self.ids(index, "s", k=2), ["3", "4"])
+
+        index.set_popularity("5", (3, 12))
+        self.assertEqual(index.stats()["cached_prefixes"], 0)
+        self.assertEqual(self.ids(index, "s", k=2), ["5", "3"])
+
+        index.remove("3")
+        self.assertEqual(self.ids(index, "s", k=2), ["5", "4"])
+
+    def test_reloads_in_the_background(self):
+        gate = threading.Event()
+        loads = []
+
+        def loader():
+            loads.append(1)
+            if len(loads) > 1:
+                gate.wait(5)
+            return [(doc_id, texts, popularity, None) for doc_id, texts, popularity in BOOKS]
+
+        index = prefixIndex(loader, reload_interval=0.01)
+        index.ensure_loaded()
+        index.remove("3")
+        time.sleep(0.02)
+
+        # the stale index answers while it reloads, writes made meanwhile are applied to the reloaded content
+        self.assertEqual(self.ids(index, "silent"), ["1"])
+        index.remove("2")
+        gate.set()
+        for _ in range(100):
+            if not index._reloading:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(len(loads), 2)
+        index.reload_interval = 0
+        self.assertEqual(self.ids(index, "silent"), ["3", "1"])
+        self.assertEqual(self.ids(index, "dublin"), [])
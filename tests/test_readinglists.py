@@ -1,6 +1,7 @@
 from unittest import TestCase
 import pytest
 import json
+from sqlalchemy import event
 from src.models.reading_lists import ReadingList
 from src.models.books import Book
 
@@ -59,6 +60,91 @@ class TestReadingListOperations(TestCase):
         response = self.app.test_client().get("v1/reading_lists")
         self.assertEqual(response.status_code, 200)
 
+    def test_get_reading_lists_with_cursor(self):
+        self.test_create_a_reading_list()
+        response = self.app.test_client().get("v1/reading_lists?status=unread&page_offset=1&cursor=")
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(len(data["reading_lists"]), 1)
+        self.assertIn("next_cursor", data)
+
+    def test_get_reading_lists_count_by_status(self):
+        self.test_create_a_reading_list()
+        response = self.app.test_client().get("v1/reading_lists?status=finished")
+        self.assertEqual(json.loads(response.data), {"reading_lists": []})
+
+        response = self.app.test_client().get("v1/reading_lists?status=unread")
+        self.assertEqual(json.loads(response.data)["reading_list_count"], 1)
+
+        self.app.test_client().patch(
+            f"v1/reading_lists/{self.new_reading_list['list_id']}",
+            data=json.dumps({"status": "finished"}),
+            content_type='application/json'
+        )
+        response = self.app.test_client().get("v1/reading_lists?status=finished")
+        self.assertEqual(json.loads(response.data)["reading_list_count"], 1)
+
+    def test_get_reading_lists_summary(self):
+        self.test_create_a_reading_list()
+        response = self.app.test_client().get("v1/reading_lists/summary")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data), {"summary": {"unread": 1, "in_progress": 0, "finished": 0}, "reading_list_count": 1})
+
+        self.app.test_client().patch(
+            f"v1/reading_lists/{self.new_reading_list['list_id']}",
+            data=json.dumps({"status": "in_progress"}),
+            content_type='application/json'
+        )
+        response = self.app.test_client().get("v1/reading_lists/summary")
+        self.assertEqual(json.loads(response.data)["summary"], {"unread": 0, "in_progress": 1, "finished": 0})
+
+        # a status the API doesn't know is refused on update, and left out of the summary when written by hand
+        response = self.app.test_client().patch(
+            f"v1/reading_lists/{self.new_reading_list['list_id']}",
+            data=json.dumps({"status": "archived"}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        other_book = Book(ISBN="1234567890124", title="Other Book", author="Test Author")
+        self.db.session.add(other_book)
+        self.db.session.flush()
+        self.db.session.add(ReadingList(book_id=other_book.book_id, status="archived"))
+        self.db.session.commit()
+        response = self.app.test_client().get("v1/reading_lists/summary")
+        self.assertEqual(json.loads(response.data), {"summary": {"unread": 0, "in_progress": 1, "finished": 0}, "reading_list_count": 1})
+
+        self.db.session.delete(other_book)
+        self.db.session.commit()
+
+    def test_get_reading_lists_with_include(self):
+        self.test_create_a_reading_list()
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(self.db.engine, "before_cursor_execute", listener)
+        try:
+            response = self.app.test_client().get("v1/reading_lists?include=book,rating&with_count=false")
+        finally:
+            event.remove(self.db.engine, "before_cursor_execute", listener)
+
+        self.assertEqual(response.status_code, 200)
+        reading_list = json.loads(response.data)["reading_lists"][0]
+        self.assertEqual(reading_list["book"]["ISBN"], self.new_book.ISBN)
+        self.assertEqual(reading_list["ratings"], [])
+        # one query for the page, one for the books and one for the ratings
+        self.assertEqual(len(statements), 3)
+
+    def test_get_a_reading_list_with_include(self):
+        self.test_create_a_reading_list()
+        response = self.app.test_client().get(f"v1/reading_lists/{self.new_reading_list['list_id']}?fields=status&include=book")
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data["status"], "unread")
+        self.assertNotIn("book_id", data)
+        self.assertEqual(data["book"]["title"], "Test Book")
+
+        response = self.app.test_client().get(f"v1/reading_lists/{self.new_reading_list['list_id']}?include=author")
+        self.assertEqual(response.status_code, 400)
+
     def test_get_invalid_reading_list(self):
         response = self.app.test_client().get("v1/reading_lists/non_existent_list_id")
         self.assertEqual(response.status_code, 404)
@@ -0,0 +1,61 @@
+from unittest import TestCase
+import json
+import threading
+
+from src.libs.queues import localQueue
+from src.libs.sqs_producer import sqsProducer
+
+class flakyQueue(localQueue):
+    """
+    Fails every first attempt of a batch, like a throttled SQS endpoint
+    """
+    def __init__(self):
+        super().__init__()
+        self.attempts = 0
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.attempts += 1
+        if self.attempts % 2:
+            raise ConnectionError("throttled")
+        return super().send_message_batch(QueueUrl, Entries)
+
+class TestSqsProducer(TestCase):
+    def test_batches_messages(self):
+        client = localQueue()
+        producer = sqsProducer(lambda: client, "local", batch_size=10, flush_interval=0.05)
+
+        for number in range(25):
+            self.assertTrue(producer.send(json.dumps({"number": number})))
+        self.assertTrue(producer.flush(5))
+
+        self.assertEqual(client.batches, 3)
+        self.assertEqual(producer.stats(), {"pending": 0, "sent": 25, "failed": 0, "batches": 3})
+
+        received = client.receive_message("local", MaxNumberOfMessages=30)["Messages"]
+        self.assertEqual([json.loads(message["Body"])["number"] for message in received], list(range(25)))
+
+    def test_flushes_on_time(self):
+        client = localQueue()
+        producer = sqsProducer(lambda: client, "local", batch_size=10, flush_interval=0.05)
+
+        producer.send("one")
+        self.assertEqual(client.receive_message("local", WaitTimeSeconds=2)["Messages"][0]["Body"], "one")
+
+    def test_retries_failed_batches(self):
+        client = flakyQueue()
+        producer = sqsProducer(lambda: client, "local", batch_size=10, flush_interval=0.01)
+
+        producer.send("one")
+        self.assertTrue(producer.flush(5))
+        self.assertEqual(producer.stats()["sent"], 1)
+        self.assertEqual(client.attempts, 2)
+
+    def test_rejects_when_full(self):
+        # the sender thread waits for its client, so nothing is taken off the buffer
+        connected = threading.Event()
+        producer = sqsProducer(lambda: connected.wait() and localQueue(), "local", max_pending=1)
+
+        self.assertTrue(producer.send("one"))
+        self.assertFalse(producer.send("two"))
+        connected.set()
+        self.assertTrue(producer.flush(5))
@@ -0,0 +1,39 @@
+from unittest import TestCase
+
+from src.libs.validation_manager import validationManager
+from src.models.books import Book
+from src.models.reading_lists import ReadingList
+
+class TestValidationManager(TestCase):
+    def test_compile_is_cached_per_schema(self):
+        self.assertIs(validationManager.compile(Book._validations_), Book._validator_)
+        self.assertIsNot(validationManager.compile(dict(Book._validations_)), Book._validator_)
+
+        # ad-hoc schemas are not kept
+        compiled = len(validationManager._compiled)
+        validationManager.validate({"ISBN": "1"}, {"ISBN": {"type": "isbn", "required": False}})
+        self.assertEqual(len(validationManager._compiled), compiled)
+
+    def test_validate(self):
+        result = Book._validator_.validate({"ISBN": " 9783161484100 ", "title": "", "author": "Some Author"}, Book._restrict_in_creation_)
+        self.assertEqual(result["errors"], "title should be between 1 and 100 characters")
+        self.assertEqual(result["data"]["ISBN"], "9783161484100")
+
+        result = ReadingList._validator_.validate({"status": "unknown_status"}, join_msg=False)
+        self.assertEqual(result["errors"], [
+            "status must be one of these ['unread', 'in_progress', 'finished']",
+            "Missing required fields: book_id",
+        ])
+
+        result = Book._validator_.validate({"book_id": "abc"}, Book._restrict_in_creation_)
+        self.assertEqual(result["errors"], "No valid input data supplied")
+
+        result = validationManager.compile({"ISBN": {"type": "isbn", "required": False}}).validate({"ISBN": "1"})
+        self.assertEqual(result["errors"], "Invalid type for ISBN")
+
+    def test_validate_many(self):
+        results = Book._validator_.validate_many([
+            {"ISBN": "9783161484100", "title": "Some Title", "author": "Some Author"},
+            {"ISBN": "9783161484100", "title": "Some Title"},
+        ])
+        self.assertEqual([result["errors"] for result in results], ["", "Missing required fields: author"])
@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+
+import signal
+import threading
+
+from src.app import app
+from src.config.config import SQS_QUEUE_URL
+from src.libs.google_books import fetch_google_books
+from src.libs.queues import queue_client
+from src.workers.ingestion import ingestionWorker
+
+if __name__ == "__main__":
+  stop = threading.Event()
+  signal.signal(signal.SIGTERM, lambda *args: stop.set())
+  signal.signal(signal.SIGINT, lambda *args: stop.set())
+
+  with app.app_context():
+    ingestionWorker(queue_client(), SQS_QUEUE_URL, fetch_google_books).run(stop)